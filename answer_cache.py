@@ -0,0 +1,201 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+from settings import get_setting
+
+# --- CEVAP ÖNBELLEĞİ (SEMANTİK) ---
+# "staj ne zaman", "Staj ne zaman?" ve "stajlar ne zaman yapılır" gibi tekrar eden sorular
+# sorgu zenginleştirme + arama + hakem + cevap hattını her seferinde çalıştırmasın diye.
+#   1. Normalize edilmiş soru birebir eşleşirse  -> "exact"
+#   2. Soru embedding'i kayıtlı bir soruya eşik üstü benzerse -> "semantic"
+# Kayıtların ömrü (TTL) ve sayısı sınırlıdır. Belge eklenince/silinince korpus sürümü artar,
+# eski sürümle üretilmiş cevaplar geçersiz olur. SQLite dosyası app ve ingest_worker
+# süreçleri arasında paylaşılır (korpus sürümü de burada tutulur).
+
+def normalize_question(text):
+    text = text.replace("I", "ı").replace("İ", "i").lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+class AnswerCache:
+    def __init__(self, path, ttl_seconds=24 * 3600, max_entries=2000, similarity_threshold=0.95):
+        if path != ":memory:":
+            folder = os.path.dirname(path)
+            if folder: os.makedirs(folder, exist_ok=True)
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_entries = int(max_entries)
+        self.similarity_threshold = float(similarity_threshold)
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS answers (
+                question TEXT PRIMARY KEY,      -- normalize edilmiş soru
+                embedding BLOB,                 -- float32, normalize (birim) vektör
+                result TEXT NOT NULL,           -- JSON: answer, sources
+                corpus_version INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+        self._conn.commit()
+
+    # --- Korpus sürümü ---
+    def corpus_version(self):
+        with self._lock:
+            return self._corpus_version()
+
+    def _corpus_version(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'corpus_version'").fetchone()
+        return row[0] if row else 0
+
+    def bump_corpus_version(self):
+        """Belge eklendi/silindi: tüm cevaplar geçersiz olur."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO meta (name, value) VALUES ('corpus_version', 1) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + 1"
+            )
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+            return self._corpus_version()
+
+    # --- Okuma / yazma ---
+    def get_exact(self, question):
+        """
+        Sadece normalize soru eşleşmesi: (sonuç, "exact") veya (None, None). Embedding gerektirmez;
+        çağıran taraf soruyu ancak burada bulamazsa embed edip get() ile anlamsal arama yapar.
+        Iska sayılmaz (sayım get() içinde yapılır).
+        """
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            row = self._exact_row(key, self._corpus_version(), now - self.ttl_seconds)
+            if row is None: return None, None
+            return self._hit(key, row, "exact", now)
+
+    def get(self, question, embedding=None):
+        """(sonuç, "exact" | "semantic") veya (None, None) döndürür."""
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            version = self._corpus_version()
+            min_created = now - self.ttl_seconds
+            row = self._exact_row(key, version, min_created)
+            kind = "exact" if row else None
+
+            if row is None and embedding is not None and self.similarity_threshold < 1.0:
+                rows = self._conn.execute(
+                    "SELECT question, embedding, result FROM answers WHERE corpus_version = ? AND created_at >= ? AND embedding IS NOT NULL",
+                    (version, min_created)
+                ).fetchall()
+                query = self._unit(embedding)
+                candidates = [r for r in rows if len(r[1]) == query.nbytes]
+                if candidates:
+                    matrix = np.frombuffer(b"".join(r[1] for r in candidates), dtype=np.float32).reshape(len(candidates), -1)
+                    similarities = matrix @ query
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.similarity_threshold:
+                        key, row, kind = candidates[best][0], (candidates[best][2],), "semantic"
+
+            if row is None:
+                self.misses += 1
+                return None, None
+            return self._hit(key, row, kind, now)
+
+    def _exact_row(self, key, version, min_created):
+        return self._conn.execute(
+            "SELECT result FROM answers WHERE question = ? AND corpus_version = ? AND created_at >= ?",
+            (key, version, min_created)
+        ).fetchone()
+
+    def _hit(self, key, row, kind, now):
+        self._conn.execute("UPDATE answers SET last_access = ? WHERE question = ?", (now, key))
+        self._conn.commit()
+        if kind == "exact": self.hits_exact += 1
+        else: self.hits_semantic += 1
+        return json.loads(row[0]), kind
+
+    def put(self, question, result, embedding=None, corpus_version=None):
+        """
+        corpus_version: cevap üretilmeye BAŞLANDIĞINDAKİ sürüm. Bu arada sürüm
+        arttıysa cevap eski korpusla üretilmiştir ve kaydedilmez.
+        """
+        key = normalize_question(question)
+        if not key: return
+        blob = self._unit(embedding).tobytes() if embedding is not None else None
+        now = time.time()
+        with self._lock:
+            version = self._corpus_version()
+            if corpus_version is not None and corpus_version != version: return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (question, embedding, result, corpus_version, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, blob, json.dumps(result, ensure_ascii=False), version, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,))
+        count = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        if count > self.max_entries:
+            # En uzun süredir kullanılmayanlar silinir (LRU)
+            self._conn.execute(
+                "DELETE FROM answers WHERE question IN (SELECT question FROM answers ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits_exact + self.hits_semantic + self.misses
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            return {
+                "hits_exact": self.hits_exact,
+                "hits_semantic": self.hits_semantic,
+                "misses": self.misses,
+                "hit_rate": (self.hits_exact + self.hits_semantic) / lookups if lookups else 0.0,
+                "entries": entries,
+                "corpus_version": self._corpus_version(),
+            }
+
+# --- SÜREÇ GENELİ ÖRNEK ---
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_answer_cache():
+    """ANSWER_CACHE_ENABLED=false ise None."""
+    global _cache
+    if not get_setting("ANSWER_CACHE_ENABLED", True, bool): return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnswerCache(
+                get_setting("ANSWER_CACHE_PATH", os.path.join(".cache", "answer_cache.sqlite3")),
+                ttl_seconds=get_setting("ANSWER_CACHE_TTL_HOURS", 24, float) * 3600,
+                max_entries=get_setting("ANSWER_CACHE_MAX_ENTRIES", 2000, int),
+                similarity_threshold=get_setting("ANSWER_CACHE_SIMILARITY", 0.95, float)
+            )
+        return _cache
+
+def bump_corpus_version():
+    """process_pdfs ve delete_document_cloud çağırır. Önbellek kapalıysa bir şey yapmaz."""
+    try:
+        cache = get_answer_cache()
+        if cache: return cache.bump_corpus_version()
+    except Exception as e:
+        print(f"Korpus Sürümü Hatası: {e}")
+
+def answer_cache_stats():
+    with _cache_lock:
+        return _cache.stats() if _cache else None
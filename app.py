@@ -5,6 +5,10 @@ import time
 import pandas as pd
 import os
 import asyncio 
+import subprocess
+import sys
+import threading
+import itertools
 from supabase import create_client
 
 # --- KRİTİK HATA DÜZELTİCİ ---
@@ -20,8 +24,17 @@ st.set_page_config(page_title="Mevzuat Asistanı", page_icon="🎓", layout="wid
 try:
     from langchain_pinecone import PineconeVectorStore
     from langchain_community.embeddings import HuggingFaceEmbeddings
-    from data_ingestion import process_pdfs, delete_document_cloud, connect_to_existing_index
-    from generation import generate_answer 
+    from data_ingestion import process_pdfs, delete_document_cloud, connect_to_existing_index, rebuild_keyword_index
+    from generation import generate_answer_stream
+    from embedding_cache import wrap_embeddings, embedding_cache_stats
+    from llm_gateway import llm_stats
+    from answer_cache import get_answer_cache
+    from reranker import get_reranker
+    from tracing import stage_stats
+    from log_analytics import LogAnalytics
+    from log_writer import get_log_writer, log_writer_stats
+    import job_queue
+    from settings import get_setting
 except ImportError as e:
     st.error(f"Kritik Başlatma Hatası: {e}")
     st.stop()
@@ -66,34 +79,78 @@ supabase = get_supabase_client()
 def get_tr_time():
     return datetime.datetime.now(pytz.timezone('Europe/Istanbul'))
 
-def daktilo_efekti(metin):
-    alan = st.empty()
-    gecici = ""
-    for h in metin:
-        gecici += h
-        alan.markdown(gecici + "▌")
-        time.sleep(0.003)
-    alan.markdown(gecici)
-
 # --- LOGLAMA SİSTEMİ ---
-def log_kaydet(kullanici, soru, cevap):
+def log_kaydet(kullanici, soru, cevap, iz=None):
+    # Kayıt arka plandaki yazıcının kuyruğuna bırakılır (toplu insert, hata olursa spool); cevap beklemez
+    # iz: aşama span'ları ve olaylar (tracing.py); "iz" sütunu yoksa yazıcı izsiz kaydeder
+    kayit = {"kullanici_adi": kullanici, "soru": soru, "cevap": cevap}
+    if iz: kayit["iz"] = iz
     try:
-        supabase.table("sorgu_loglari").insert({
-            "kullanici_adi": kullanici,
-            "soru": soru,
-            "cevap": cevap
-        }).execute()
+        get_log_writer(supabase).write(kayit)
     except Exception as e:
         print(f"Log Hatası: {e}")
 
 # --- ANALİZ SİSTEMİ ---
+# Sayımlar sunucu tarafındaki özet tablolardan gelir (bkz. log_analytics.py); sonuçlar kısa süre önbellekte
+ANALIZ_ONBELLEK_SN = get_setting("ANALYTICS_CACHE_SECONDS", 30, int)
+SON_SORU_SAYFA = 5
+AKTIF_OGRENCI_GUN = get_setting("ACTIVE_USER_DAYS", 30, int)
+
+@st.cache_data(ttl=ANALIZ_ONBELLEK_SN, show_spinner=False)
 def admin_analiz_getir():
     try:
-        response = supabase.table("sorgu_loglari").select("*").execute()
-        df = pd.DataFrame(response.data)
-        return df
-    except:
-        return pd.DataFrame()
+        analiz = LogAnalytics(supabase)
+        return {"ozet": analiz.summary(AKTIF_OGRENCI_GUN), "gunluk": analiz.daily_volume(14), "populer": analiz.top_questions(5)}
+    except Exception as e:
+        print(f"Analiz Hatası: {e}")
+        return None
+
+@st.cache_data(ttl=ANALIZ_ONBELLEK_SN, show_spinner=False)
+def son_sorulari_getir(sayfa):
+    try:
+        return LogAnalytics(supabase).recent(sayfa, SON_SORU_SAYFA)
+    except Exception as e:
+        print(f"Son Sorular Hatası: {e}")
+        return []
+
+# --- ARKA PLAN YÜKLEME İŞLERİ ---
+def isci_baslat():
+    """Canlı bir işçi yoksa ingest_worker.py'yi ayrı süreç olarak başlatır (kuyruk bitince kapanır)."""
+    if job_queue.live_worker_count() > 0: return
+    try:
+        subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingest_worker.py"), "--once"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), start_new_session=True
+        )
+    except Exception as e:
+        print(f"İşçi Başlatma Hatası: {e}")
+
+ASAMA_ETIKETI = {"expand": "Zenginleştirme", "search_raw": "Arama (ham)", "search_clean": "Arama (temiz)", "search_keyword": "Arama (BM25)", "search_article": "Arama (madde)",
+                 "mmr": "MMR", "retrieval": "Erişim", "rerank": "Hakem", "context": "Bağlam", "first_token": "İlk token", "answer": "Cevap",
+                 "route": "Yönlendirme", "pages": "Okuma + Parçalama", "file": "Dosya", "upload_wait": "Yükleme bekleme", "total": "Toplam"}
+
+DURUM_ETIKETI = {"queued": "⏳ Sırada", "running": "⚙️ İşleniyor", "done": "✅ Tamamlandı", "failed": "❌ Hata"}
+
+def is_durumlarini_goster():
+    isler = job_queue.list_jobs(limit=5)
+    if not isler: return
+    st.caption("📥 YÜKLEME İŞLERİ")
+    for job in isler:
+        with st.expander(f"{DURUM_ETIKETI.get(job['status'], job['status'])} · {len(job['files'])} dosya", expanded=job["status"] == "running"):
+            for f in job["files"]:
+                toplam = max(f["pages_total"], 1)
+                st.progress(min(f["pages_done"] / toplam, 1.0), text=f"{f['file_name']} ({f['pages_done']}/{f['pages_total']} sayfa) · {DURUM_ETIKETI.get(f['status'], f['status'])}")
+                if f["error"]: st.caption(f"❌ {f['error']}")
+            for mesaj in job["messages"][:3]: st.caption(mesaj["text"])
+            if job["message"]: st.caption(job["message"])
+            if job["status"] == "failed" and st.button("🔁 Tekrar Dene", key=f"retry_{job['id']}"):
+                job_queue.retry_job(job["id"])
+                isci_baslat()
+                st.rerun()
+
+# Streamlit destekliyorsa iş listesi sayfayı kilitlemeden kendi kendine yenilenir
+if hasattr(st, "fragment"):
+    is_durumlarini_goster = st.fragment(run_every=get_setting("JOB_POLL_SECONDS", 3, float))(is_durumlarini_goster)
 
 # --- BULUT BAĞLANTISI (CPU FIX EKLENDİ) ---
 @st.cache_resource
@@ -101,10 +158,10 @@ def get_cloud_db():
     try:
         os.environ['PINECONE_API_KEY'] = st.secrets["PINECONE_API_KEY"]
         # Cloud hatasını önlemek için CPU zorlaması
-        embedding_model = HuggingFaceEmbeddings(
+        embedding_model = wrap_embeddings(HuggingFaceEmbeddings(
             model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
             model_kwargs={'device': 'cpu'}
-        )
+        ))
         index_name = "mevzuat-asistani"
         vector_store = PineconeVectorStore.from_existing_index(index_name=index_name, embedding=embedding_model)
         return vector_store
@@ -112,6 +169,17 @@ def get_cloud_db():
         print(f"Pinecone Hatası: {e}")
         return None
 
+# --- RERANKER ISITMA ---
+# Cross-encoder modeli ilk soruda değil, uygulama açılırken arka planda bir kez yüklenir
+@st.cache_resource
+def reranker_isit():
+    primary = get_reranker().primary
+    if primary is not None:
+        threading.Thread(target=lambda: primary.available, daemon=True, name="reranker-warmup").start()
+    return True
+
+reranker_isit()
+
 # --- STATE AYARLARI ---
 if "messages" not in st.session_state:
     st.session_state.messages = [{"role": "assistant", "content": "Merhaba! Mevzuatlar hakkında size nasıl yardımcı olabilirim?"}]
@@ -185,19 +253,73 @@ with st.sidebar:
         # Analiz
         if st.session_state.analiz_acik:
             st.markdown('<div class="stats-box">', unsafe_allow_html=True)
-            df_log = admin_analiz_getir()
+            analiz = admin_analiz_getir()
             
-            if not df_log.empty:
-                toplam_soru = len(df_log)
-                aktif_kullanici = df_log['kullanici_adi'].nunique()
-                
-                st.write(f"🔹 **Toplam Soru:** {toplam_soru}")
-                st.write(f"🔹 **Aktif Öğrenci:** {aktif_kullanici}")
+            if analiz and analiz["ozet"]["total_questions"]:
+                ozet = analiz["ozet"]
+                st.write(f"🔹 **Toplam Soru:** {ozet['total_questions']}")
+                if ozet["active_users"] is not None: st.write(f"🔹 **Aktif Öğrenci (son {ozet['active_days']} gün):** {ozet['active_users']}")
+                if analiz["gunluk"]:
+                    st.caption("Günlük Soru Sayısı (son 14 gün):")
+                    st.bar_chart(pd.DataFrame(analiz["gunluk"]).set_index("gun")["soru_sayisi"], height=150)
+                if analiz["populer"]:
+                    st.caption("En Çok Sorulanlar:")
+                    st.dataframe(pd.DataFrame(analiz["populer"])[["soru", "adet"]], hide_index=True)
                 st.markdown("---")
-                st.caption("Son 5 Soru:")
-                st.dataframe(df_log[['kullanici_adi', 'soru']].tail(5), hide_index=True)
+
+                # Son sorular: sadece gösterilen sayfa çekilir
+                if "analiz_sayfa" not in st.session_state: st.session_state.analiz_sayfa = 0
+                son_sorular = son_sorulari_getir(st.session_state.analiz_sayfa)
+                st.caption(f"Son Sorular (sayfa {st.session_state.analiz_sayfa + 1}):")
+                if son_sorular: st.dataframe(pd.DataFrame(son_sorular)[["kullanici_adi", "soru"]], hide_index=True)
+                onceki, sonraki = st.columns(2)
+                if onceki.button("◀", key="analiz_onceki", disabled=st.session_state.analiz_sayfa == 0):
+                    st.session_state.analiz_sayfa -= 1
+                    st.rerun()
+                if sonraki.button("▶", key="analiz_sonraki", disabled=len(son_sorular) < SON_SORU_SAYFA):
+                    st.session_state.analiz_sayfa += 1
+                    st.rerun()
             else:
                 st.write("Henüz veri yok.")
+
+            # Embedding önbelleği (bu süreç başladığından beri)
+            for model_adi, istatistik in embedding_cache_stats().items():
+                toplam = istatistik["hits"] + istatistik["misses"]
+                if toplam:
+                    st.caption(f"🧠 Embedding önbelleği ({model_adi.split('/')[-1]}): %{istatistik['hit_rate'] * 100:.0f} isabet, {toplam} istek")
+
+            # Cevap önbelleği (isabetler bu süreç başladığından beri)
+            cevap_onbellegi = get_answer_cache()
+            if cevap_onbellegi:
+                o = cevap_onbellegi.stats()
+                toplam = o["hits_exact"] + o["hits_semantic"] + o["misses"]
+                st.caption(f"💾 Cevap önbelleği: %{o['hit_rate'] * 100:.0f} isabet ({o['hits_exact']} birebir, {o['hits_semantic']} anlamsal / {toplam} soru) · {o['entries']} kayıt · korpus v{o['corpus_version']}")
+
+            # Log yazıcısı (kuyruk, toplu yazım, Supabase'e ulaşılamadığında biriken kayıtlar)
+            log_istatistik = log_writer_stats()
+            if log_istatistik:
+                st.caption(f"📝 Log yazıcısı: {log_istatistik['written']} kayıt / {log_istatistik['batches']} toplu yazım · kuyrukta {log_istatistik['queued']} · bekleyen (spool) {log_istatistik['spool_pending']}")
+
+            # LLM çağrıları (çağrı noktası bazında, bu süreç başladığından beri)
+            llm_istatistik = llm_stats()
+            if llm_istatistik:
+                st.caption("🤖 LLM Çağrıları:")
+                st.dataframe(pd.DataFrame([
+                    {"Nokta": site, "Çağrı": s["calls"], "Hata": s["errors"], "Tekrar": s["retries"],
+                     "Token (giriş/çıkış)": f"{s['input_tokens']}/{s['output_tokens']}",
+                     "p50 ms": round(s["p50_ms"]), "p95 ms": round(s["p95_ms"])}
+                    for site, s in llm_istatistik.items()
+                ]), hide_index=True)
+
+            # Aşama süreleri (izlerden; son TRACE_STATS_WINDOW soru/yükleme, app + işçi süreçleri)
+            for tur, baslik in (("answer", "⏱️ Cevap Aşamaları:"), ("ingest", "📥 Yükleme Aşamaları:")):
+                asamalar = stage_stats(tur)
+                if asamalar:
+                    st.caption(baslik)
+                    st.dataframe(pd.DataFrame([
+                        {"Aşama": ASAMA_ETIKETI.get(ad, ad), "Adet": a["count"], "p50 ms": round(a["p50_ms"]), "p95 ms": round(a["p95_ms"])}
+                        for ad, a in asamalar.items()
+                    ]), hide_index=True)
             st.markdown('</div>', unsafe_allow_html=True)
         
         st.divider()
@@ -221,23 +343,45 @@ with st.sidebar:
         # --- 3. İŞLEME BUTONU (SADE VE OTOMATİK) ---
         if st.button("Veritabanına Belge Ekle", type="primary"):
             if uploaded_files:
-                durum = st.status("Sistem güncelleniyor...", expanded=True)
-                
-                # use_vision_mode göndermiyoruz (veya False gönderiyoruz).
-                # Böylece karar tamamen arka plandaki "Dedektif"e kalıyor.
-                st.session_state.vector_db = process_pdfs(uploaded_files)
-                
-                durum.update(label=" Belgeler Eklendi!", state="complete")
-                
-                st.toast("İşlem tamamlandı, liste yenileniyor...", icon="🎉")
+                if get_setting("INGEST_MODE", "queue") == "queue":
+                    # Dosyalar kuyruğa yazılır, işleme arka plandaki işçide yapılır (panel kilitlenmez)
+                    job_queue.enqueue_job(
+                        [(f.name, f.getvalue()) for f in uploaded_files],
+                        created_by=st.session_state.username
+                    )
+                    isci_baslat()
+                    st.toast("Belgeler sıraya alındı, arka planda işleniyor...", icon="📥")
+                else:
+                    durum = st.status("Sistem güncelleniyor...", expanded=True)
+                    
+                    # use_vision_mode göndermiyoruz (veya False gönderiyoruz).
+                    # Böylece karar tamamen arka plandaki "Dedektif"e kalıyor.
+                    st.session_state.vector_db = process_pdfs(uploaded_files)
+                    
+                    durum.update(label=" Belgeler Eklendi!", state="complete")
+                    
+                    st.toast("İşlem tamamlandı, liste yenileniyor...", icon="🎉")
                 
                 # --- 4. TEMİZLİK VE YENİLEME ---
                 st.session_state.uploader_key += 1 # Sayacı arttır (Kutuyu temizler)
-                import time
                 time.sleep(1) # Kullanıcı toast mesajını görsün
                 st.rerun()    # Sayfayı yenile
             else:
                 st.warning("Lütfen önce bir dosya seçin.")
+
+        # --- 5. ARKA PLAN İŞLERİNİN DURUMU ---
+        is_durumlarini_goster()
+        if not hasattr(st, "fragment") and job_queue.has_active_jobs():
+            if st.button("🔄 Durumu Yenile"): st.rerun()
+
+        # Anahtar kelime (BM25) indeksi boşsa veya sonradan açıldıysa mevcut parçalardan doldurulur
+        if get_setting("HYBRID_SEARCH", True, bool) and st.button("🔎 Anahtar Kelime İndeksini Yenile"):
+            with st.spinner("Parçalar Pinecone'dan okunuyor..."):
+                try:
+                    belge_sayisi, parca_sayisi = rebuild_keyword_index()
+                    st.toast(f"{belge_sayisi} belge, {parca_sayisi} parça indekslendi.", icon="🔎")
+                except Exception as e:
+                    st.error(f"İndeks Hatası: {e}")
         
         st.markdown("<br>", unsafe_allow_html=True)
         st.caption("📚 SİSTEMDEKİ BELGELER (YÖNET)")
@@ -357,55 +501,52 @@ if prompt := st.chat_input("Sorunuzu yazın..."):
         if "vector_store" not in st.session_state or st.session_state.vector_store is None:
              st.warning("⚠️ Veritabanı bağlantısı yok. Lütfen sayfayı yenileyin.")
         else:
-            with st.spinner("Düşünülüyor..."):
-                try:
-                    # --- RETRY MEKANİZMASI ---
-                    sonuc = None
-                    max_deneme = 3
-                    
-                    for deneme in range(max_deneme):
-                        try:
-                            sonuc = generate_answer(prompt, st.session_state.vector_store, st.session_state.chat_history)
-                            break 
-                        except Exception as e:
-                            hata_mesaji = str(e)
-                            if "504" in hata_mesaji or "503" in hata_mesaji or "Deadline Exceeded" in hata_mesaji:
-                                if deneme < max_deneme - 1:
-                                    time.sleep(2)
-                                    continue 
-                            raise e
+            try:
+                # Geçici hatalar (503/504) her LLM çağrısında ayrı ayrı llm_gateway'de tekrar denenir
+                tokenler, sonuc = generate_answer_stream(prompt, st.session_state.vector_store, st.session_state.chat_history)
+                # Spinner sadece ilk token gelene kadar (arama + hakem) görünür, sonra cevap akar
+                with st.spinner("Düşünülüyor..."):
+                    ilk_token = next(tokenler, "")
+                akis = itertools.chain([ilk_token], tokenler)
+                if hasattr(st, "write_stream"): st.write_stream(akis)
+                else: st.markdown("".join(akis))
+
+                if sonuc:
+                    answer_text = sonuc["answer"]
+                    sources = sonuc["sources"]
+
+                    # Negatif cevap kontrolü
+                    negative_keywords = ["bilgi bulunamadı", "bilgi yer almıyor", "bilgim yok", "dokümanlarda bu bilgi yok"]
+                    if any(keyword in answer_text.lower() for keyword in negative_keywords):
+                        sources = [] 
+
+                    # Kaynakları HTML Bloğu (gizlenebilir)
+                    sources_html = ""
+                    if sources: 
+                        # <details> etiketi varsayılan olarak kapalı. Kullanıcı isterse açacak.
+                        sources_html += '''
+                        <br>
+                        <details style="border: 1px solid #334155; border-radius: 8px; padding: 10px; background-color: #1e293b;">
+                            <summary style="cursor: pointer; font-weight: bold; color: #60a5fa;">📚 REFERANSLAR (Görmek için tıklayın)</summary>
+                            <div style="margin-top: 10px;">
+                        '''
+                        for src in sources:
+                            clean_src = src.split(" (Sayfa")[0]
+                            sources_html += f'<div class="source-item" style="margin-bottom: 5px; font-size: 0.9em;">📄 {src}</div>'
+                        sources_html += '</div></details>'
                     
-                    if sonuc:
-                        answer_text = sonuc["answer"]
-                        sources = sonuc["sources"]
-
-                        # Negatif cevap kontrolü
-                        negative_keywords = ["bilgi bulunamadı", "bilgi yer almıyor", "bilgim yok", "dokümanlarda bu bilgi yok"]
-                        if any(keyword in answer_text.lower() for keyword in negative_keywords):
-                            sources = [] 
-
-                        # Kaynakları HTML Bloğu (gizlenebilir)
-                        sources_html = ""
-                        if sources: 
-                            # <details> etiketi varsayılan olarak kapalı. Kullanıcı isterse açacak.
-                            sources_html += '''
-                            <br>
-                            <details style="border: 1px solid #334155; border-radius: 8px; padding: 10px; background-color: #1e293b;">
-                                <summary style="cursor: pointer; font-weight: bold; color: #60a5fa;">📚 REFERANSLAR (Görmek için tıklayın)</summary>
-                                <div style="margin-top: 10px;">
-                            '''
-                            for src in sources:
-                                clean_src = src.split(" (Sayfa")[0]
-                                sources_html += f'<div class="source-item" style="margin-bottom: 5px; font-size: 0.9em;">📄 {src}</div>'
-                            sources_html += '</div></details>'
-                        
-                        final_content = answer_text + sources_html
-                        
-                        st.markdown(final_content, unsafe_allow_html=True)
-                        st.session_state.messages.append({"role": "assistant", "content": final_content})
-
-                        # LOGLAMA 
-                        log_kaydet(st.session_state.username, prompt, answer_text)
+                    # Cevap akarken yazıldı; kaynaklar akış bitince eklenir
+                    final_content = answer_text + sources_html
+                    if sources_html: st.markdown(sources_html, unsafe_allow_html=True)
+                    st.session_state.messages.append({"role": "assistant", "content": final_content})
 
-                except Exception as e:
-                    st.error(f"😔 Bir bağlantı sorunu oluştu (Hata: {str(e)}). Lütfen tekrar deneyin.")
\ No newline at end of file
+                    # Aşama süreleri (sadece yöneticiye)
+                    sureler = sonuc.get("timings") or {}
+                    if st.session_state.role == "admin" and sureler:
+                        st.caption("⏱️ " + " · ".join(f"{etiket} {sureler[k]:.0f} ms" for k, etiket in ASAMA_ETIKETI.items() if k in sureler))
+
+                    # LOGLAMA 
+                    log_kaydet(st.session_state.username, prompt, answer_text, sonuc.get("trace"))
+
+            except Exception as e:
+                st.error(f"😔 Bir bağlantı sorunu oluştu (Hata: {str(e)}). Lütfen tekrar deneyin.")
\ No newline at end of file
@@ -0,0 +1,3 @@
+# --- ÇEVRİMDIŞI BENCHMARK PAKETİ ---
+# Kullanım:  python -m bench.run_bench --docs 12 --questions 40
+# Gemini, Pinecone ve Supabase yerine deterministik sahteleri (bench/fakes.py) kullanır.
@@ -0,0 +1,92 @@
+import random
+import fitz  # PyMuPDF
+from query_expansion import fold
+
+# --- SENTETİK YÖNETMELİK KORPUSU ---
+# Üç tür PDF üretilir (yönlendirmenin üç yolu da ölçülsün diye):
+#   "text"        : tek sütun, metin katmanlı
+#   "multicolumn" : iki sütunlu sayfalar (sütun histogramı Vision'a yönlendirebilir)
+#   "scanned"     : metin katmanı olmayan, sayfa görüntüsünden oluşan (Vision'a gider)
+# Her madde benzersiz bir sayısal bilgi içerir; soru seti bu bilgileri sorar ve
+# beklenen (dosya, madde) etiketini taşır -> recall@k.
+
+TOPICS = ["Staj", "Lisansüstü Eğitim", "Sınav", "Yatay Geçiş", "Çift Anadal", "Burs", "Disiplin", "Kayıt Dondurma",
+          "Yandal", "Hazırlık Sınıfı", "Mazeret", "Diploma"]
+SUBJECTS = [
+    ("en az devam oranı", "yüzde"), ("azami öğrenim süresi", "yarıyıl"), ("başvuru süresi", "gün"),
+    ("asgari not ortalaması", "puan"), ("dönemlik kredi yükü", "AKTS"), ("itiraz süresi", "iş günü"),
+    ("kontenjan sınırı", "öğrenci"), ("muafiyet sınırı", "ders"), ("sınav süresi", "dakika"),
+]
+FILLER = [
+    "Bu hükümler ilgili yönetim kurulu kararıyla uygulanır.",
+    "Öğrencinin başvurusu ilgili birim tarafından değerlendirilir.",
+    "Kararlar öğrenci bilgi sistemi üzerinden duyurulur.",
+    "Süreler akademik takvimde ilan edilen tarihlere göre hesaplanır.",
+    "Belirtilen koşulları sağlamayan başvurular işleme alınmaz.",
+]
+
+def _article(topic, number, subject, unit, value, rng):
+    filler = " ".join(rng.sample(FILLER, 3))
+    return (f"MADDE {number} – (1) {topic} sürecinde {subject} {value} {unit} olarak belirlenmiştir. "
+            f"(2) {filler}")
+
+def _html(title, articles):
+    body = "".join(f"<p style='margin-bottom:6px'>{a}</p>" for a in articles)
+    return f"<h3>{title}</h3>{body}" if title else body
+
+def _text_pdf(title, articles, per_page):
+    doc = fitz.open()
+    for start in range(0, len(articles), per_page):
+        page = doc.new_page()
+        page.insert_htmlbox(fitz.Rect(50, 50, 545, 790), _html(title if start == 0 else "", articles[start : start + per_page]))
+    return doc
+
+def _multicolumn_pdf(title, articles, per_page):
+    doc = fitz.open()
+    for start in range(0, len(articles), per_page):
+        chunk = articles[start : start + per_page]
+        half = (len(chunk) + 1) // 2
+        page = doc.new_page()
+        page.insert_htmlbox(fitz.Rect(40, 40, 290, 800), _html(title if start == 0 else "", chunk[:half]), css="* {font-size: 9px;}")
+        page.insert_htmlbox(fitz.Rect(305, 40, 555, 800), _html("", chunk[half:]), css="* {font-size: 9px;}")
+    return doc
+
+def _scanned_pdf(title, articles, per_page):
+    source = _text_pdf(title, articles, per_page)
+    doc = fitz.open()
+    for page in source:
+        pix = page.get_pixmap(dpi=100, colorspace=fitz.csGRAY)
+        scanned = doc.new_page(width=page.rect.width, height=page.rect.height)
+        scanned.insert_image(scanned.rect, stream=pix.tobytes("jpeg", jpg_quality=70))
+    source.close()
+    return doc
+
+BUILDERS = {"text": _text_pdf, "multicolumn": _multicolumn_pdf, "scanned": _scanned_pdf}
+
+def generate_corpus(docs=12, articles_per_doc=24, articles_per_page=6, kinds=("text", "text", "multicolumn", "scanned"), seed=7):
+    """
+    ([(dosya_adı, pdf_bytes, tür)], [{"question", "source", "article", "kind"}]) döndürür.
+    Taranmış belgelerin metni Vision sahtesiyle okunamadığı için soru setine girmez.
+    """
+    rng = random.Random(seed)
+    files, questions = [], []
+    for d in range(docs):
+        kind = kinds[d % len(kinds)]
+        topic = TOPICS[d % len(TOPICS)]
+        name = f"{kind}_{d:02d}_{fold(topic).replace(' ', '_')}.pdf"
+        articles = []
+        for number in range(1, articles_per_doc + 1):
+            subject, unit = SUBJECTS[(number + d) % len(SUBJECTS)]
+            value = rng.randint(2, 400)
+            articles.append(_article(topic, number, subject, unit, value, rng))
+            if kind != "scanned":
+                questions.append({
+                    "question": f"{topic} sürecinde {subject} kaç {unit}? (Madde {number})" if number % 5 == 0
+                                else f"{topic} için {subject} nedir?",
+                    "source": name, "article": str(number), "kind": kind,
+                })
+        pdf = BUILDERS[kind](f"{topic} Yönetmeliği", articles, articles_per_page)
+        files.append((name, pdf.tobytes(), kind))
+        pdf.close()
+    rng.shuffle(questions)
+    return files, questions
@@ -0,0 +1,298 @@
+import collections
+import hashlib
+import os
+import re
+import time
+import numpy as np
+from query_expansion import tokenize
+
+# --- DETERMİNİSTİK SAHTELER ---
+# Ağ servisleri yerine aynı arayüzü veren, gecikmesi ayarlanabilir sahte bileşenler:
+#   FakeEmbeddings   : özellik hashleme (terim kökleri -> sabit boyutlu vektör), gerçek benzerlik verir
+#   FakeChatModel    : invoke / stream; prompt türüne göre (hakem, başlık, temizleyici, cevap) cevap üretir
+#   FakeVisionModel  : generate_content; sabit gecikmeyle sabit metin
+#   InMemorySupabase : table(...).select/insert/upsert/delete/eq/gte/in_/execute + storage
+# install_fakes() ayarları geçici klasöre yönlendirir ve sahteleri gateway'e / data_ingestion'a takar.
+
+class FakeEmbeddings:
+    """Kelime kökleri hashlenerek işaretli kovalara sayılır; birim vektör döner."""
+    def __init__(self, dimension=256, latency=0.0):
+        self.dimension = dimension
+        self.latency = latency
+        self.calls = 0
+
+    def _vector(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for _, stem in tokenize(text):
+            digest = hashlib.blake2b(stem.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = float(np.linalg.norm(vector))
+        if norm == 0: vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.latency: time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+class FakeMessage:
+    def __init__(self, content, input_tokens=0, output_tokens=0):
+        self.content = content
+        self.usage_metadata = {"input_tokens": input_tokens, "output_tokens": output_tokens}
+
+def _tokens(text):
+    return max(1, len(text) // 4)
+
+class FakeChatModel:
+    """
+    latency: tam cevap (invoke) ve ilk token (stream) öncesi bekleme.
+    token_latency: akışta token başına bekleme.
+    """
+    def __init__(self, latency=0.3, token_latency=0.01):
+        self.latency = latency
+        self.token_latency = token_latency
+
+    def _reply(self, prompt):
+        if "selected_indices" in prompt:
+            count = len(re.findall(r"\[ID: \d+\]", prompt))
+            return '{"selected_indices": %s}' % list(range(min(count, 5)))
+        if "Optimize Edilmiş Sorgu" in prompt:
+            match = re.search(r'Orijinal Soru: "(.*)"', prompt)
+            return match.group(1) if match else ""
+        if "RESMİ BAŞLIĞINI" in prompt:
+            match = re.search(r"DOSYA ADI: (.*)", prompt)
+            name = os.path.splitext(match.group(1).strip())[0] if match else "Belge"
+            return f"{name.replace('_', ' ').title()} Yönetmeliği"
+        # Cevap: bağlamdaki ilk madde cümlesi + dosya adı
+        match = re.search(r"--- KAYNAK: (\S+) \(Sayfa [^)]*\) ---\n(.{0,300})", prompt)
+        if not match: return "Belgelerde bu konu hakkında bilgi bulunmamaktadır."
+        return f"{match.group(2).split('. ')[0].strip()}. ({match.group(1)})"
+
+    def invoke(self, prompt):
+        if self.latency: time.sleep(self.latency)
+        reply = self._reply(prompt)
+        return FakeMessage(reply, _tokens(prompt), _tokens(reply))
+
+    def stream(self, prompt):
+        if self.latency: time.sleep(self.latency)
+        reply = self._reply(prompt)
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            if self.token_latency: time.sleep(self.token_latency)
+            text = word if i == len(words) - 1 else word + " "
+            # Kullanım bilgisi Gemini'deki gibi son parçada gelir
+            yield FakeMessage(text, _tokens(prompt) if i == len(words) - 1 else 0, _tokens(reply) if i == len(words) - 1 else 0)
+
+class FakeVisionResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+class FakeVisionModel:
+    """Taranmış sayfayı okuyamaz; sabit gecikmeyle sabit bir madde metni döndürür."""
+    def __init__(self, latency=1.0):
+        self.latency = latency
+        self.calls = 0
+
+    def generate_content(self, parts):
+        self.calls += 1
+        if self.latency: time.sleep(self.latency)
+        return FakeVisionResponse(f"MADDE 900 – (1) Taranmış sayfa metni {self.calls}. Görsel içerik Vision ile okunmuştur.")
+
+# --- SUPABASE (BELLEK İÇİ) ---
+PRIMARY_KEYS = {"dokumanlar": "dosya_adi", "belge_manifestleri": "dosya_adi"}
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+class _Query:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self._op = "select"
+        self._payload = None
+        self._filters = []
+        self._order = None
+        self._range = None
+        self._count = None
+        self._head = False
+
+    def select(self, columns="*", count=None, head=False):
+        self._op, self._columns, self._count, self._head = "select", columns, count, head
+        return self
+
+    def insert(self, rows): return self._write("insert", rows)
+    def upsert(self, rows, **kwargs): return self._write("upsert", rows)
+    def update(self, values): return self._write("update", values)
+
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    def _write(self, op, payload):
+        self._op, self._payload = op, payload
+        return self
+
+    def eq(self, column, value):
+        self._filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gte(self, column, value):
+        self._filters.append(lambda row: row.get(column) is not None and row.get(column) >= value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self._filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def order(self, column, desc=False):
+        self._order = (column, desc)
+        return self
+
+    def limit(self, count):
+        self._range = (0, count - 1)
+        return self
+
+    def range(self, start, end):
+        self._range = (start, end)
+        return self
+
+    def _matches(self, row):
+        return all(f(row) for f in self._filters)
+
+    def execute(self):
+        rows = self.db.tables[self.table]
+        if self._op in ("insert", "upsert"):
+            payload = self._payload if isinstance(self._payload, list) else [self._payload]
+            key = PRIMARY_KEYS.get(self.table, "id")
+            for record in payload:
+                record = dict(record)
+                existing = next((r for r in rows if key in record and r.get(key) == record[key]), None) if self._op == "upsert" else None
+                if existing is not None: existing.update(record)
+                else:
+                    record.setdefault("id", len(rows) + 1)
+                    rows.append(record)
+            return FakeResponse(payload)
+        if self._op == "update":
+            changed = [r for r in rows if self._matches(r)]
+            for r in changed: r.update(self._payload)
+            return FakeResponse(changed)
+        if self._op == "delete":
+            removed = [r for r in rows if self._matches(r)]
+            self.db.tables[self.table] = [r for r in rows if not self._matches(r)]
+            return FakeResponse(removed)
+
+        selected = [r for r in rows if self._matches(r)]
+        if self._order:
+            column, desc = self._order
+            selected.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        total = len(selected)
+        if self._range: selected = selected[self._range[0] : self._range[1] + 1]
+        if self._columns != "*":
+            columns = [c.strip() for c in self._columns.split(",")]
+            selected = [{c: r.get(c) for c in columns} for r in selected]
+        if self._head: selected = []
+        return FakeResponse([dict(r) for r in selected], total if self._count else None)
+
+class _Bucket:
+    def __init__(self, files):
+        self.files = files
+
+    def upload(self, path, file, file_options=None):
+        self.files[path] = file
+        return {"path": path}
+
+    def remove(self, paths):
+        for path in paths: self.files.pop(path, None)
+        return [{"name": p} for p in paths]
+
+    def get_public_url(self, path):
+        return f"memory://{path}"
+
+class _Storage:
+    def __init__(self):
+        self.buckets = collections.defaultdict(dict)
+
+    def from_(self, bucket):
+        return _Bucket(self.buckets[bucket])
+
+class InMemorySupabase:
+    def __init__(self):
+        self.tables = collections.defaultdict(list)
+        self.storage = _Storage()
+
+    def table(self, name):
+        return _Query(self, name)
+
+# --- KURULUM ---
+class MemoryFile:
+    """Streamlit UploadedFile yerine (name + getvalue)."""
+    def __init__(self, name, data):
+        self.name = name
+        self._data = data
+
+    def getvalue(self):
+        return self._data
+
+class BenchReporter:
+    """process_pdfs mesajlarını toplar, ekrana basmaz."""
+    def __init__(self):
+        self.messages = []
+
+    def message(self, level, text): self.messages.append((level, text))
+    def start_file(self, file_name, total_pages): pass
+    def page_done(self, fraction): pass
+    def upload_status(self, text): pass
+    def upload_progress(self, fraction): pass
+    def close(self): pass
+
+def install_fakes(workdir, chat_latency=0.3, token_latency=0.01, vision_latency=1.0, embed_latency=0.05, settings=None):
+    """
+    Tüm kalıcı dosyaları workdir altına yönlendirir, sahteleri takar.
+    Modüller bu fonksiyondan SONRA kullanılmalıdır (singleton'lar ayarları ilk kullanımda okur).
+    (supabase, chat, vision, embeddings) döndürür.
+    """
+    defaults = {
+        "VECTOR_BACKEND": "local",
+        "LOCAL_VECTOR_PATH": os.path.join(workdir, "vectors"),
+        "MANIFEST_BACKEND": "local",
+        "MANIFEST_PATH": os.path.join(workdir, "manifests.sqlite3"),
+        "BM25_INDEX_PATH": os.path.join(workdir, "bm25.sqlite3"),
+        "CORPUS_VOCABULARY_PATH": os.path.join(workdir, "corpus_vocabulary.json"),
+        "ANSWER_CACHE_PATH": os.path.join(workdir, "answer_cache.sqlite3"),
+        "ANSWER_CACHE_ENABLED": "false",
+        "EMBEDDING_CACHE_DIR": os.path.join(workdir, "embeddings"),
+        "VISION_CACHE_PATH": os.path.join(workdir, "vision_cache.sqlite3"),
+        "TRACE_EXPORT_PATH": os.path.join(workdir, "traces.jsonl"),
+        "RERANKER": "llm", # Cross-encoder modeli indirilmeden ölçülebilsin
+        "LLM_MAX_RETRIES": "0",
+    }
+    defaults.update(settings or {})
+    for name, value in defaults.items(): os.environ.setdefault(name, str(value))
+
+    import streamlit as st
+    st.secrets = {"GOOGLE_API_KEY": "bench", "SUPABASE_URL": "memory://", "SUPABASE_KEY": "bench", "PINECONE_API_KEY": "bench"}
+
+    import data_ingestion
+    import llm_gateway
+    from embedding_cache import wrap_embeddings
+
+    supabase = InMemorySupabase()
+    chat = FakeChatModel(chat_latency, token_latency)
+    vision = FakeVisionModel(vision_latency)
+    embeddings = FakeEmbeddings(latency=embed_latency)
+    embedding_model = wrap_embeddings(embeddings)
+
+    gateway = llm_gateway.get_gateway()
+    gateway.chat_client = lambda model=llm_gateway.DEFAULT_MODEL, temperature=0.0: chat
+    gateway.vision_model = lambda model=llm_gateway.DEFAULT_MODEL: vision
+    data_ingestion.create_client = lambda url, key: supabase
+    data_ingestion.get_embedding_model = lambda: embedding_model
+    return supabase, chat, vision, embeddings
@@ -0,0 +1,156 @@
+import argparse
+import json
+import resource
+import sys
+import tempfile
+import time
+import fitz  # PyMuPDF
+from bench.corpus import generate_corpus
+from bench.fakes import BenchReporter, MemoryFile, install_fakes
+
+# --- UÇTAN UCA ÇEVRİMDIŞI BENCHMARK ---
+# Gemini / Pinecone / Supabase yerine deterministik sahtelerle (bench/fakes.py):
+#   1. Sentetik korpus (metin, çok sütunlu, taranmış) process_pdfs ile yüklenir -> sayfa/sn, parça/sn
+#   2. Etiketli soru seti generate_answer ile cevaplanır -> aşama gecikmeleri (p50/p95), soru/sn
+#   3. Aynı sorular retrieve_documents ile aranır -> recall@k (beklenen dosya + madde)
+#   4. Tepe bellek (RSS) ve gateway istatistikleri
+# Gecikmeler sahte olduğundan mutlak değerler değil, sürümler arası fark anlamlıdır.
+
+def percentile(values, p):
+    if not values: return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+def stage_summary(samples):
+    """{aşama: [ms, ...]} -> {aşama: {"p50", "p95", "max", "n"}}"""
+    return {
+        stage: {"p50": percentile(v, 50), "p95": percentile(v, 95), "max": max(v), "n": len(v)}
+        for stage, v in sorted(samples.items())
+    }
+
+def peak_rss_mb():
+    # Linux'ta ru_maxrss KB, macOS'ta bayt cinsindendir
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def is_hit(doc, expected):
+    return (doc.metadata.get("source") == expected["source"]
+            and str(doc.metadata.get("article", "")) == expected["article"])
+
+def bench_ingestion(files):
+    import data_ingestion
+    reporter = BenchReporter()
+    started = time.perf_counter()
+    vector_store = data_ingestion.process_pdfs([MemoryFile(name, data) for name, data, _ in files], reporter=reporter)
+    elapsed = time.perf_counter() - started
+
+    pages = 0
+    for _, data, _ in files:
+        with fitz.open(stream=data, filetype="pdf") as doc: pages += len(doc)
+    chunks = data_ingestion.get_pinecone_index().describe_index_stats()["total_vector_count"]
+    errors = [text for level, text in reporter.messages if level == "error"]
+    # Vision hataları sayfa bazında metin katmanına düşer (rapora yansımaz); benchmark'ta hata sayılır
+    from llm_gateway import llm_stats
+    vision_errors = llm_stats().get("vision", {}).get("errors", 0)
+    if vision_errors: errors.append(f"Vision: {vision_errors} çağrı başarısız")
+    return vector_store, {
+        "files": len(files), "pages": pages, "chunks": chunks, "seconds": elapsed,
+        "pages_per_s": pages / elapsed if elapsed else 0.0,
+        "chunks_per_s": chunks / elapsed if elapsed else 0.0,
+        "errors": errors,
+    }
+
+def bench_answers(vector_store, questions):
+    from generation import generate_answer
+    samples = {}
+    failures = 0
+    started = time.perf_counter()
+    for item in questions:
+        result = generate_answer(item["question"], vector_store, [])
+        if result.get("error"): failures += 1
+        for stage, ms in (result.get("timings") or {}).items(): samples.setdefault(stage, []).append(ms)
+    elapsed = time.perf_counter() - started
+    return {
+        "questions": len(questions), "seconds": elapsed, "failures": failures,
+        "questions_per_s": len(questions) / elapsed if elapsed else 0.0,
+        "stages": stage_summary(samples),
+    }
+
+def bench_recall(vector_store, questions, ks):
+    from generation import retrieve_documents
+    from llm_gateway import get_gateway
+    gateway = get_gateway()
+    hits = {k: 0 for k in ks}
+    for item in questions:
+        _, docs = retrieve_documents(item["question"], vector_store, gateway, {})
+        rank = next((i for i, doc in enumerate(docs) if is_hit(doc, item)), None)
+        for k in ks:
+            if rank is not None and rank < k: hits[k] += 1
+    return {f"recall@{k}": hits[k] / len(questions) if questions else 0.0 for k in ks}
+
+def print_report(report):
+    ingest = report["ingestion"]
+    print("\n=== YÜKLEME ===")
+    print(f"{ingest['files']} dosya, {ingest['pages']} sayfa, {ingest['chunks']} parça, {ingest['seconds']:.2f} sn")
+    print(f"{ingest['pages_per_s']:.1f} sayfa/sn, {ingest['chunks_per_s']:.1f} parça/sn")
+
+    answers = report["answers"]
+    print("\n=== CEVAPLAMA ===")
+    print(f"{answers['questions']} soru, {answers['seconds']:.2f} sn, {answers['questions_per_s']:.2f} soru/sn, {answers['failures']} hata")
+    print(f"{'aşama':<16}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'n':>6}")
+    for stage, s in answers["stages"].items():
+        print(f"{stage:<16}{s['p50']:>10.1f}{s['p95']:>10.1f}{s['max']:>10.1f}{s['n']:>6}")
+
+    print("\n=== ERİŞİM ===")
+    print(", ".join(f"{name}: {value:.2f}" for name, value in report["recall"].items()))
+
+    print("\n=== KAYNAKLAR ===")
+    print(f"Tepe RSS: {report['peak_rss_mb']:.0f} MB")
+    for site, s in report["llm"].items():
+        print(f"LLM {site}: {s.get('calls', 0)} çağrı, p50 {s.get('p50_ms', 0):.0f} ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mevzuat Asistanı çevrimdışı benchmark")
+    parser.add_argument("--docs", type=int, default=12, help="Üretilecek PDF sayısı")
+    parser.add_argument("--articles", type=int, default=24, help="Belge başına madde sayısı")
+    parser.add_argument("--questions", type=int, default=40, help="Cevaplanacak soru sayısı (recall tüm sette ölçülür)")
+    parser.add_argument("--chat-latency", type=float, default=0.3, help="Sahte LLM çağrısı gecikmesi (sn)")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Akışta token başına gecikme (sn)")
+    parser.add_argument("--vision-latency", type=float, default=1.0, help="Sahte Vision çağrısı gecikmesi (sn)")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Embedding batch gecikmesi (sn)")
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10, 25], help="recall@k değerleri")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Raporu JSON olarak bu dosyaya da yaz")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="mevzuat_bench_") as workdir:
+        install_fakes(
+            workdir, chat_latency=args.chat_latency, token_latency=args.token_latency,
+            vision_latency=args.vision_latency, embed_latency=args.embed_latency
+        )
+        files, questions = generate_corpus(args.docs, args.articles, seed=args.seed)
+        print(f"Korpus: {len(files)} PDF, {len(questions)} etiketli soru")
+
+        vector_store, ingestion = bench_ingestion(files)
+        if vector_store is None or ingestion["errors"]:
+            print("Yükleme başarısız, benchmark durduruldu.")
+            for error in ingestion["errors"]: print(f"  HATA: {error}")
+            return 1
+
+        from llm_gateway import llm_stats
+        report = {
+            "ingestion": ingestion,
+            "answers": bench_answers(vector_store, questions[: args.questions]),
+            "recall": bench_recall(vector_store, questions, args.k),
+            "peak_rss_mb": peak_rss_mb(),
+            "llm": llm_stats(),
+        }
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import collections
+import json
+import math
+import os
+import sqlite3
+import threading
+from langchain_core.documents import Document
+from query_expansion import STOPWORDS, tokenize
+from settings import get_setting
+
+# --- ANAHTAR KELİME (BM25) İNDEKSİ ---
+# "Madde 14", "AA katsayısı", "65 puan" gibi birebir token'a dayanan sorular yoğun (dense)
+# vektörlerde sık kaçar. Bu indeks aynı parçaları Türkçe normalizasyon + ek atma
+# (query_expansion.tokenize) ile terimlere ayırır ve BM25 ile skorlar.
+#   - process_pdfs parçaları yüklerken ekler; dosya bitince eski parçalar çıkarılır (retain).
+#   - delete_document_cloud belgenin tüm parçalarını siler.
+#   - Sonuçlar generation.py'de yoğun arama sonuçlarıyla RRF (reciprocal rank fusion) ile birleşir.
+# SQLite (WAL) dosyası app ve ingest_worker süreçleri arasında paylaşılır.
+
+def index_terms(text):
+    """Metni BM25 terimlerine çevirir: katlanmış kökler, stopword'ler hariç, sayılar dahil."""
+    return [s for surface, s in tokenize(text) if s and s not in STOPWORDS]
+
+class BM25Index:
+    def __init__(self, path, k1=1.2, b=0.75, text_key="text"):
+        if path != ":memory:":
+            folder = os.path.dirname(path)
+            if folder: os.makedirs(folder, exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self.text_key = text_key
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        if path != ":memory:": self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                length INTEGER NOT NULL,        -- terim sayısı (BM25 belge uzunluğu)
+                metadata TEXT NOT NULL          -- JSON, parça metni text_key altında
+            );
+            CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, chunk_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_chunk ON postings (chunk_id);
+        """)
+        self._conn.commit()
+
+    # --- Yazma ---
+    def add(self, items):
+        """items: [(chunk_id, Document)]. Aynı ID varsa yeniden yazılır."""
+        with self._lock:
+            for chunk_id, doc in items:
+                terms = collections.Counter(index_terms(doc.page_content))
+                metadata = dict(doc.metadata)
+                metadata[self.text_key] = doc.page_content
+                self._delete_chunks([chunk_id])
+                self._conn.execute(
+                    "INSERT INTO chunks (chunk_id, source, length, metadata) VALUES (?, ?, ?, ?)",
+                    (chunk_id, metadata.get("source", ""), sum(terms.values()), json.dumps(metadata, ensure_ascii=False))
+                )
+                self._conn.executemany(
+                    "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                    [(term, chunk_id, tf) for term, tf in terms.items()]
+                )
+            self._conn.commit()
+
+    def retain(self, source, keep_ids):
+        """Kaynağın keep_ids dışındaki parçalarını siler (dosya yeniden yüklendikten sonra)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT chunk_id FROM chunks WHERE source = ?", (source,)).fetchall()
+            stale = [r[0] for r in rows if r[0] not in keep_ids]
+            self._delete_chunks(stale)
+            self._conn.commit()
+            return len(stale)
+
+    def remove_source(self, source):
+        return self.retain(source, frozenset())
+
+    def _delete_chunks(self, chunk_ids):
+        for i in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[i : i + 500]
+            marks = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({marks})", batch)
+            self._conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({marks})", batch)
+
+    # --- Arama ---
+    def search(self, query, k=20):
+        """BM25 skoruna göre en iyi k parça (Document, metadata["bm25_score"])."""
+        terms = list(dict.fromkeys(index_terms(query))) # Tekrar eden terimler bir kez sayılır
+        if not terms: return []
+        with self._lock:
+            total, total_length = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks").fetchone()
+            if not total: return []
+            avg_length = total_length / total
+            scores = collections.defaultdict(float)
+            lengths = {}
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.chunk_id, p.tf, c.length FROM postings p JOIN chunks c ON c.chunk_id = p.chunk_id WHERE p.term = ?",
+                    (term,)
+                ).fetchall()
+                if not rows: continue
+                idf = math.log(1 + (total - len(rows) + 0.5) / (len(rows) + 0.5))
+                for chunk_id, tf, length in rows:
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            best = sorted(scores.items(), key=lambda item: -item[1])[:k]
+            if not best: return []
+            marks = ",".join("?" * len(best))
+            metadata = dict(self._conn.execute(
+                f"SELECT chunk_id, metadata FROM chunks WHERE chunk_id IN ({marks})", [c for c, _ in best]
+            ).fetchall())
+
+        docs = []
+        for chunk_id, score in best:
+            meta = json.loads(metadata[chunk_id])
+            text = meta.pop(self.text_key, "")
+            meta["bm25_score"] = score
+            docs.append(Document(id=chunk_id, page_content=text, metadata=meta))
+        return docs
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM chunks LIMIT 1").fetchone() is None
+
+    def stats(self):
+        with self._lock:
+            chunks, sources = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT source) FROM chunks").fetchone()
+            return {"chunks": chunks, "sources": sources}
+
+# --- SIRALAMA BİRLEŞTİRME ---
+def _doc_key(doc):
+    chunk_id = doc.metadata.get("chunk_id") or getattr(doc, "id", None)
+    if chunk_id: return chunk_id
+    return (doc.metadata.get("source", ""), doc.metadata.get("page", ""), doc.page_content[:500])
+
+def reciprocal_rank_fusion(result_lists, k=60, limit=None):
+    """
+    RRF: her listedeki sıra r için 1 / (k + r) toplanır. Skorlar farklı ölçeklerde olsa da
+    (kosinüs, BM25) birleşim sıraya dayandığı için ayar gerektirmez. Tekrarlar birleşir.
+    """
+    scores = collections.defaultdict(float)
+    docs = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = _doc_key(doc)
+            scores[key] += 1.0 / (k + rank + 1)
+            docs.setdefault(key, doc)
+    fused = sorted(scores, key=lambda key: -scores[key])
+    if limit: fused = fused[:limit]
+    return [docs[key] for key in fused]
+
+# --- SÜREÇ GENELİ ÖRNEK ---
+_index = None
+_index_lock = threading.Lock()
+
+def get_bm25_index():
+    """HYBRID_SEARCH=false ise None."""
+    global _index
+    if not get_setting("HYBRID_SEARCH", True, bool): return None
+    with _index_lock:
+        if _index is None:
+            _index = BM25Index(get_setting("BM25_INDEX_PATH", os.path.join(".cache", "bm25.sqlite3")))
+        return _index
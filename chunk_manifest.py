@@ -0,0 +1,235 @@
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+from answer_cache import get_answer_cache
+from settings import get_setting
+
+# --- BELGE PARÇA MANİFESTİ ---
+# Her belge için Pinecone'daki geçerli vektör ID'lerinin listesi (belge -> ID'ler).
+#   - Silme: filtreli silme yerine ID listesiyle, 1000'lik paketler halinde.
+#   - Değiştirme (atomik): yeni parçalar yazılır -> manifest yeni sürüme geçer -> eski ID'ler silinir.
+#     Sorgu tarafı sadece manifestteki ID'leri gösterdiği için kullanıcı hiçbir anda
+#     yarım silinmiş ya da iki kez indekslenmiş bir belge görmez.
+#   - pending: silinmesi gerekip henüz silinemeyen ID'ler (hata olursa bir sonraki yüklemede tekrar denenir).
+#   - Manifest öncesi yüklenmiş (chunk_id'siz) kayıtlar sadece sürüm 0'da (LEGACY_VERSION) görünür.
+#     Eski bir belge tekrar yüklenirken manifest sürüm 0 ile açılır; geçişte sürüm 1'e çıkınca
+#     eski kayıtlar, silinmeleri beklenmeden sorgulardan kalkar.
+#
+# Varsayılan depo yereldir (SQLite, MANIFEST_PATH). Uygulama ve yükleme işçisi farklı
+# makinelerde çalışıyorsa manifest Supabase'te paylaşılır; tablo elle oluşturulmalıdır.
+#
+# Supabase tablosu (MANIFEST_BACKEND = "supabase"):
+#   create table belge_manifestleri (
+#       dosya_adi text primary key,
+#       surum integer not null default 1,
+#       parca_idleri jsonb not null default '[]',
+#       bekleyen_silmeler jsonb not null default '[]',
+#       silindi boolean not null default false,
+#       guncellendi timestamptz default now()
+#   );
+
+Manifest = collections.namedtuple("Manifest", ["source", "version", "ids", "pending", "deleted"])
+
+TABLE_NAME = "belge_manifestleri"
+LEGACY_VERSION = 0 # chunk_id'siz eski kayıtların hâlâ geçerli olduğu sürüm
+
+class SupabaseManifestStore:
+    def __init__(self, client):
+        self.client = client
+
+    def versions(self, sources):
+        """{kaynak: (sürüm, silindi)} — sorgu başına çağrılır, ID listelerini çekmez."""
+        if not sources: return {}
+        rows = self.client.table(TABLE_NAME).select("dosya_adi, surum, silindi").in_("dosya_adi", list(sources)).execute().data
+        return {r["dosya_adi"]: (r["surum"], r["silindi"]) for r in rows}
+
+    def get(self, source):
+        rows = self.client.table(TABLE_NAME).select("*").eq("dosya_adi", source).execute().data
+        if not rows: return None
+        r = rows[0]
+        return Manifest(source, r["surum"], frozenset(r["parca_idleri"] or []), frozenset(r["bekleyen_silmeler"] or []), r["silindi"])
+
+    def put(self, source, ids, pending=(), deleted=False, version=None):
+        """Manifesti yeni sürüme geçirir (tek yazan: yükleme işçisi). Yeni sürüm numarasını döndürür."""
+        if version is None:
+            current = self.get(source)
+            version = current.version + 1 if current else 1
+        self.client.table(TABLE_NAME).upsert({
+            "dosya_adi": source,
+            "surum": version,
+            "parca_idleri": sorted(ids),
+            "bekleyen_silmeler": sorted(pending),
+            "silindi": deleted,
+        }).execute()
+        return version
+
+    def remove(self, source):
+        self.client.table(TABLE_NAME).delete().eq("dosya_adi", source).execute()
+
+class LocalManifestStore:
+    """Tek makinelik kurulumlar için SQLite manifest deposu (MANIFEST_BACKEND = "local", varsayılan)."""
+    def __init__(self, path):
+        folder = os.path.dirname(path)
+        if folder: os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS manifests (
+                source TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                ids TEXT NOT NULL,
+                pending TEXT NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def versions(self, sources):
+        sources = list(sources)
+        if not sources: return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT source, version, deleted FROM manifests WHERE source IN ({','.join('?' * len(sources))})", sources
+            ).fetchall()
+        return {source: (version, bool(deleted)) for source, version, deleted in rows}
+
+    def get(self, source):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, ids, pending, deleted FROM manifests WHERE source = ?", (source,)
+            ).fetchone()
+        if row is None: return None
+        return Manifest(source, row[0], frozenset(json.loads(row[1])), frozenset(json.loads(row[2])), bool(row[3]))
+
+    def put(self, source, ids, pending=(), deleted=False, version=None):
+        with self._lock:
+            if version is None:
+                row = self._conn.execute("SELECT version FROM manifests WHERE source = ?", (source,)).fetchone()
+                version = row[0] + 1 if row else 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO manifests (source, version, ids, pending, deleted, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (source, version, json.dumps(sorted(ids)), json.dumps(sorted(pending)), int(deleted), time.time())
+            )
+            self._conn.commit()
+        return version
+
+    def remove(self, source):
+        with self._lock:
+            self._conn.execute("DELETE FROM manifests WHERE source = ?", (source,))
+            self._conn.commit()
+
+# --- SORGU TARAFI: GÖRÜNÜRLÜK FİLTRESİ ---
+class VisibilityFilter:
+    """
+    Arama sonuçlarından, kaynağının güncel manifestinde olmayan parçaları çıkarır.
+    (kaynak, sürüm) bilgisi ttl_seconds boyunca bellekte tutulur; korpus sürümü değişince
+    (yükleme / silme) hemen yenilenir. ID listeleri sadece sürüm değişince çekilir.
+    """
+    def __init__(self, store, ttl_seconds=30.0, corpus_version=None, clock=time.monotonic):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.corpus_version = corpus_version # () -> sürüm; None ise sadece süre dolunca yenilenir
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._ids = {} # kaynak -> (sürüm, ID kümesi)
+        self._versions = {} # kaynak -> ((sürüm, silindi) veya None, okunma zamanı)
+        self._corpus = None
+
+    def _current_corpus(self):
+        if self.corpus_version is None: return None
+        try: return self.corpus_version()
+        except Exception as e:
+            print(f"Korpus Sürümü Okuma Hatası: {e}")
+            return None
+
+    def versions(self, sources):
+        """store.versions'ın önbellekli hali. Manifesti olmayan kaynaklar da (None olarak) önbelleğe girer."""
+        now, corpus = self.clock(), self._current_corpus()
+        with self._lock:
+            if corpus != self._corpus:
+                self._corpus = corpus
+                self._versions.clear()
+            known = {}
+            for source in sources:
+                entry = self._versions.get(source)
+                if entry is not None and now - entry[1] < self.ttl_seconds: known[source] = entry[0]
+        missing = [source for source in sources if source not in known]
+        if missing:
+            fetched = self.store.versions(missing)
+            with self._lock:
+                for source in missing:
+                    known[source] = fetched.get(source)
+                    self._versions[source] = (known[source], now)
+        return {source: value for source, value in known.items() if value is not None}
+
+    def filter(self, docs):
+        sources = {doc.metadata.get("source") for doc in docs if doc.metadata.get("source")}
+        try:
+            versions = self.versions(sources)
+            visible, legacy_sources = {}, set()
+            for source, (version, deleted) in versions.items():
+                if deleted:
+                    visible[source] = frozenset()
+                    continue
+                if version == LEGACY_VERSION: legacy_sources.add(source)
+                with self._lock:
+                    cached = self._ids.get(source)
+                if cached is None or cached[0] != version:
+                    manifest = self.store.get(source)
+                    if manifest is None: continue
+                    cached = (manifest.version, frozenset() if manifest.deleted else manifest.ids)
+                    with self._lock: self._ids[source] = cached
+                visible[source] = cached[1]
+        except Exception as e:
+            print(f"Manifest Okuma Hatası: {e}")
+            return docs
+
+        # Manifesti olmayan belgeler ve geçişi henüz yapılmamış belgelerin chunk_id'siz eski kayıtları gösterilir
+        kept = []
+        for doc in docs:
+            source, chunk_id = doc.metadata.get("source"), doc.metadata.get("chunk_id")
+            if source not in visible or chunk_id in visible[source] or (chunk_id is None and source in legacy_sources):
+                kept.append(doc)
+        return kept
+
+# --- SÜREÇ GENELİ ÖRNEKLER ---
+_store = None
+_visibility = None
+_lock = threading.Lock()
+
+def get_manifest_store(supabase=None):
+    global _store
+    with _lock:
+        if _store is None:
+            if get_setting("MANIFEST_BACKEND", "local") != "supabase":
+                _store = LocalManifestStore(get_setting("MANIFEST_PATH", os.path.join(".cache", "manifests.sqlite3")))
+            else:
+                if supabase is None:
+                    import streamlit as st
+                    from supabase import create_client
+                    supabase = create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
+                _store = SupabaseManifestStore(supabase)
+        return _store
+
+def _corpus_version():
+    # Yükleme / silme sonrası artan sayaç (answer_cache meta tablosu, süreçler arası ortak)
+    cache = get_answer_cache()
+    return cache.corpus_version() if cache else None
+
+def filter_visible(docs):
+    """Sorgu sonuçlarını manifestteki güncel sürüme göre süzer."""
+    global _visibility
+    if not docs: return docs
+    try:
+        store = get_manifest_store()
+    except Exception as e:
+        print(f"Manifest Bağlantı Hatası: {e}")
+        return docs
+    with _lock:
+        if _visibility is None:
+            _visibility = VisibilityFilter(store, get_setting("MANIFEST_CACHE_SECONDS", 30, float), _corpus_version)
+    return _visibility.filter(docs)
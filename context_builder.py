@@ -0,0 +1,122 @@
+import collections
+import os
+import re
+from settings import get_setting
+
+# --- BAĞLAM OLUŞTURUCU (TOKEN BÜTÇELİ) ---
+# Eski yol: hakemin seçtiği her parça bağlama olduğu gibi eklenir; her parça kendi
+# "BELGE: ... SAYFA: ..." başlığını tekrarlar, komşu parçalarla 300 karaktere kadar örtüşür
+# ve toplam boyut sınırsızdır.
+# Yeni yol:
+#   1. Parçalar rerank skoruna göre sıralanır, bütçeye sığdığı sürece alınır.
+#   2. Aynı belgenin parçaları bir araya toplanır, sayfa sırasına dizilir.
+#   3. Örtüşen/komşu parçalar örtüşen metin bir kez yazılacak şekilde birleştirilir.
+#   4. Belge başlığı (KAYNAK) belge başına bir kez yazılır.
+
+# LegalChunker başlığı: BELGE / SAYFA / BÖLÜM / MADDE satırları ve "---" ayracı
+HEADER_RE = re.compile(
+    r"^BELGE:[^\n]*\n(?:SAYFA:[^\n]*\n)?(?:BÖLÜM:[^\n]*\n)?((?:GEÇİCİ |EK )?MADDE[^\n]*\n)?(?:-{3,}\n)?"
+)
+
+Block = collections.namedtuple("Block", ["page", "page_end", "text"])
+
+def _tokens(chars, chars_per_token):
+    return int(chars / chars_per_token) + 1
+
+def estimate_tokens(text, chars_per_token=3.5):
+    """Yaklaşık token sayısı (Türkçe metinde Gemini için ~3.5 karakter/token)."""
+    return _tokens(len(text), chars_per_token)
+
+def strip_header(text):
+    """Parça başlığını siler; madde satırı metin zaten o maddeyle başlamıyorsa korunur."""
+    match = HEADER_RE.match(text)
+    if not match: return text
+    body = text[match.end():]
+    article_line = match.group(1)
+    if article_line:
+        label = article_line.split("(")[0].split("[")[0].strip()
+        if not body.lstrip().upper().startswith(label.upper()): body = article_line.strip() + " " + body
+    return body
+
+def _normalize(text):
+    return " ".join(text.split())
+
+def merge_overlap(first, second, min_overlap=20, max_overlap=600):
+    """
+    first'ün sonu second'ın başıyla örtüşüyorsa birleşik metni, değilse None döndürür.
+    Biri diğerini tamamen içeriyorsa uzun olan döner.
+    """
+    if second in first: return first
+    if first in second: return second
+    for size in range(min(len(first), len(second), max_overlap), min_overlap - 1, -1):
+        if first.endswith(second[:size]): return first + second[size:]
+    return None
+
+def _page_range(doc):
+    page = doc.metadata.get("page")
+    page = int(page) if page is not None else 0
+    page_end = doc.metadata.get("page_end")
+    return page, int(page_end) if page_end is not None else page
+
+def merge_blocks(blocks):
+    """Aynı belgenin blokları: sayfa sırasına dizilir, örtüşenler tek metne iner."""
+    merged = []
+    for block in sorted(blocks, key=lambda b: (b.page, b.page_end)):
+        for i, other in enumerate(merged):
+            # Sadece aynı/komşu sayfalardaki bloklar örtüşebilir
+            if block.page > other.page_end + 1 or other.page > block.page_end + 1: continue
+            text = merge_overlap(other.text, block.text) or merge_overlap(block.text, other.text)
+            if text is not None:
+                merged[i] = Block(min(other.page, block.page), max(other.page_end, block.page_end), text)
+                break
+        else:
+            merged.append(block)
+    return merged
+
+def _render_group(source, blocks):
+    blocks = merge_blocks(blocks)
+    # Sayfa numaraları metadata'da zaten 1 tabanlı (data_ingestion: "page": i + 1)
+    pages = ", ".join(str(b.page) if b.page == b.page_end else f"{b.page}-{b.page_end}" for b in blocks)
+    body = "\n...\n".join(b.text for b in blocks)
+    return f"\n--- KAYNAK: {source} (Sayfa {pages}) ---\n{body}\n"
+
+def build_context(docs, token_budget=None, chars_per_token=None, min_tokens=150):
+    """
+    (bağlam_metni, kaynak_dosya_adları) döndürür. docs rerank sırasıyla gelir; metadata'da
+    rerank_score varsa ona göre sıralanır. Bütçeye sığmayan ilk parça kısaltılarak eklenir
+    (kalan bütçe min_tokens'tan azsa atlanır), sonrakiler denenmeye devam eder.
+    Bütçe, belge başına tutulan karakter toplamlarıyla izlenir: her parçada sadece kendi
+    belgesinin bölümü yeniden hesaplanır, bağlam metni en sonda bir kez oluşturulur.
+    """
+    token_budget = token_budget or get_setting("CONTEXT_TOKEN_BUDGET", 6000, int)
+    chars_per_token = chars_per_token or get_setting("CONTEXT_CHARS_PER_TOKEN", 3.5, float)
+    ranked = sorted(enumerate(docs), key=lambda item: (-(item[1].metadata.get("rerank_score") or 0.0), item[0]))
+
+    groups = {}
+    group_chars = {} # kaynak -> o belgenin bağlamdaki bölümünün karakter sayısı
+    total_chars = 0
+    order = [] # Belgeler en iyi parçalarının sırasıyla
+    for _, doc in ranked:
+        source = os.path.basename(doc.metadata.get("source", "Bilinmiyor"))
+        page, page_end = _page_range(doc)
+        text = _normalize(strip_header(doc.page_content))
+        if not text: continue
+
+        blocks = groups.get(source, []) + [Block(page, page_end, text)]
+        chars = len(_render_group(source, blocks))
+        new_total = total_chars - group_chars.get(source, 0) + chars
+        if _tokens(new_total, chars_per_token) > token_budget:
+            # Sığmıyor: kalan bütçe kadarını al
+            remaining = token_budget - _tokens(total_chars, chars_per_token) - 30 # başlık payı
+            if remaining < min_tokens: continue
+            blocks[-1] = Block(page, page_end, text[: int(remaining * chars_per_token)].rsplit(" ", 1)[0] + " ...")
+            chars = len(_render_group(source, blocks))
+            new_total = total_chars - group_chars.get(source, 0) + chars
+            # Yeni kaynak başlığı / blok ayracı payı aştırdıysa kısaltılmış parça da eklenmez
+            if _tokens(new_total, chars_per_token) > token_budget: continue
+        groups[source] = blocks
+        group_chars[source] = chars
+        total_chars = new_total
+        if source not in order: order.append(source)
+
+    return "".join(_render_group(source, groups[source]) for source in order), order
@@ -2,55 +2,110 @@ import time
 import os
 import fitz  # PyMuPDF
 import streamlit as st
-from PIL import Image
-import google.generativeai as genai
-from langchain_pinecone import PineconeVectorStore
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from supabase import create_client
-from pinecone import Pinecone
-import io
 import collections
-from langchain_google_genai import ChatGoogleGenerativeAI
+import numpy as np
+import hashlib
+import functools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from rate_limit import TokenBucket, call_with_retry
+from settings import get_setting
+from vision_cache import VisionCache, get_vision_cache
+from ingestion_pipeline import UploadPipeline
+from embedding_cache import wrap_embeddings
+from legal_chunker import LegalChunker
+from chunk_manifest import LEGACY_VERSION, get_manifest_store
+from llm_gateway import get_gateway
+from answer_cache import bump_corpus_version
+from query_expansion import TermCollector, get_corpus_vocabulary
+from bm25_index import get_bm25_index
+from context_builder import strip_header
+from local_vector_store import LocalVectorStore, get_local_index, use_local_backend
+from tracing import bind, event, record_span, span, start_trace
+
+# --- 0. SERVİS İSTEMCİLERİ ---
+# SDK'lar (Gemini, Pinecone, Supabase) ilk kullanımda içe aktarılır (llm_gateway.py gibi):
+# yerel arka uçla (VECTOR_BACKEND = "local") ve benchmark sahteleriyle modül SDK'sız da yüklenir.
+def create_client(url, key):
+    from supabase import create_client as supabase_client
+    return supabase_client(url, key)
 
 # --- 1. GEMINI AYARLARI ---
-def configure_gemini():
-    if "GOOGLE_API_KEY" in st.secrets:
-        genai.configure(api_key=st.secrets["GOOGLE_API_KEY"])
-    else:
-        st.error("Google API Key bulunamadı!")
+# Gemini istemcileri llm_gateway.py'de (chat_client / vision_model) ilk kullanımda yapılandırılır.
+
+# --- 2. SAYFA BAZLI KARMAŞIKLIK ANALİZİ (YÖNLENDİRME) ---
+# Karar artık belge için değil, HER SAYFA için ayrı veriliyor:
+# 200 sayfalık metin yönetmeliğinin tek tablolu eki sadece o sayfalarda Vision'a gider.
+def classify_page(page, detect_tables=True):
+    """
+    Sayfanın Vision'a gidip gitmeyeceğine karar verir.
+    (vision_gerekli_mi, sebep) döndürür.
+    """
+    try:
+        page_area = max(page.rect.width * page.rect.height, 1.0)
+
+        # Tüm span'ları tek seferde topla, hesapları NumPy ile yap
+        spans = [
+            span
+            for block in page.get_text("dict")["blocks"] if "lines" in block
+            for line in block["lines"]
+            for span in line["spans"]
+        ]
+        text_lengths = np.fromiter((len(span["text"].strip()) for span in spans), dtype=np.int64, count=len(spans))
+        x_starts = np.fromiter((span["bbox"][0] for span in spans), dtype=np.float64, count=len(spans))
+        total_chars = int(text_lengths.sum())
+
+        # Resim kaplama oranı (taranmış sayfa tespiti)
+        image_area = 0.0
+        for info in page.get_image_info():
+            rect = fitz.Rect(info["bbox"]) & page.rect
+            if not rect.is_empty: image_area += rect.width * rect.height
+        image_coverage = min(image_area / page_area, 1.0)
+
+        if total_chars < 50:
+            if image_coverage < 0.05: return False, "Boş Sayfa"
+            return True, "Metin Bulunamadı (Resim PDF)"
+        if image_coverage > 0.5 and total_chars / page_area < 0.005:
+            return True, f"Taranmış Sayfa (%{int(image_coverage * 100)} resim)"
+
+        # Sütun histogramı: 20pt'lik kovalarda hizalanan span sayısı
+        meaningful_x = x_starts[text_lengths > 5]
+        if meaningful_x.size:
+            column_counts = np.bincount(np.round(meaningful_x / 20).astype(np.int64).clip(min=0))
+            significant_columns = int((column_counts >= 15).sum())
+            if significant_columns >= 3:
+                return True, f"Çoklu Sütun ({significant_columns} sütun)"
+
+        text_plain = page.get_text().lower()
+        if "q1" in text_plain and "çeyreklik" in text_plain:
+            return True, "Akademik Terim (Q1)"
+
+        # En pahalı kontrol en sonda: PyMuPDF tablo tespiti
+        if detect_tables and hasattr(page, "find_tables"):
+            tables = page.find_tables().tables
+            if tables:
+                return True, f"Tablo ({len(tables)} adet)"
+
+        return False, "Standart Metin"
+    except Exception as e:
+        print(f"Analiz Hatası: {e}")
+        return False, "Hata -> Standart"
+
+def route_pages(doc, force_vision=False):
+    """Her sayfa için (vision_gerekli_mi, sebep) listesi döndürür."""
+    if force_vision:
+        return [(True, "Manuel Vision Modu")] * len(doc)
+    detect_tables = get_setting("ROUTING_DETECT_TABLES", True, bool)
+    return [classify_page(page, detect_tables) for page in doc]
 
-# --- 2. SÜTUN HİZALAMA ANALİZİ (Aynen Kalıyor) ---
 def analyze_pdf_complexity(file_path):
+    """Geriye dönük uyumluluk: ilk 3 sayfadan biri Vision gerektiriyorsa belge karmaşıktır."""
     try:
         doc = fitz.open(file_path)
         if len(doc) == 0: return False, "Boş Dosya"
-        pages_to_check = min(len(doc), 3)
-        for i in range(pages_to_check):
-            page = doc[i]
-            text_dict = page.get_text("dict")
-            x_starts = []
-            for block in text_dict["blocks"]:
-                if "lines" in block:
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            if len(span["text"].strip()) > 5:
-                                x_starts.append(round(span["bbox"][0] / 20) * 20)
-            if not x_starts: return True, "Metin Bulunamadı (Resim PDF)"
-            counter = collections.Counter(x_starts)
-            most_common = counter.most_common()
-            significant_columns = 0
-            active_cols = []
-            for x_pos, count in most_common:
-                if count >= 15:
-                    significant_columns += 1
-                    active_cols.append(f"X={x_pos}")
-            if significant_columns >= 3:
-                return True, f"Çoklu Sütun ({significant_columns} sütun)"
-            text_plain = page.get_text().lower()
-            if "q1" in text_plain and "çeyreklik" in text_plain:
-                return True, "Akademik Terim (Q1)"
+        for i in range(min(len(doc), 3)):
+            needs_vision, reason = classify_page(doc[i])
+            if needs_vision: return True, reason
         return False, "Standart Metin"
     except Exception as e:
         print(f"Analiz Hatası: {e}")
@@ -60,11 +115,6 @@ def analyze_pdf_complexity(file_path):
 def detect_document_title(text_preview, filename):
     try:
         if "GOOGLE_API_KEY" not in st.secrets: return filename
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            google_api_key=st.secrets["GOOGLE_API_KEY"],
-            temperature=0.0
-        )
         prompt = f"""
         GÖREV: Bu resmi belgenin RESMİ BAŞLIĞINI tespit et.
         DOSYA ADI: {filename}
@@ -73,202 +123,794 @@ def detect_document_title(text_preview, filename):
         
         Sadece başlığı yaz, yorum yapma.
         """
-        title = llm.invoke(prompt).content.strip()
+        title = get_gateway().invoke(prompt, site="title", temperature=0.0).strip()
         if len(title) > 150: return filename
         return title
     except: return filename
 
 # --- 4. VISION MODU İLE  İŞLEME ---
-def process_single_page_vision(page, page_num):
-    """
-    Tek bir sayfayı Gemini Vision ile okur ve metni döndürür.
-    """
-    configure_gemini()
-    try:
-        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        
-        img_byte_arr = io.BytesIO()
-        img.save(img_byte_arr, format='JPEG')
-        image_bytes = img_byte_arr.getvalue()
+VISION_MODEL = "gemini-2.5-flash"
+VISION_PROMPT_VERSION = "v1" # Prompt değişirse arttır (önbellek anahtarının parçası)
 
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        # PROMPT GÜNCELLENDİ: TABLO VE NOTLAR İÇİN DAHA SIKI
-        prompt = """
+# PROMPT GÜNCELLENDİ: TABLO VE NOTLAR İÇİN DAHA SIKI
+VISION_PROMPT = """
         Bu sayfayı Markdown formatına çevir.
         1. TABLOLARI bozmadan |...| formatında yaz.
         2. Tablo içindeki sayıları ve başlıkları (Tezsiz, Kredi, AKTS) eksiksiz al.
         3. Sayfanın altındaki dipnotları "DİPNOT:" diye belirt.
         """
-        
-        response = model.generate_content(
-            [prompt, {"mime_type": "image/jpeg", "data": image_bytes}]
-        )
-        return response.text if response.text else page.get_text()
-        
+
+# Sayfadan kırpılmış tablo/şekil bölgeleri için (sayfanın geri kalanı metin olarak okunur)
+VISION_REGION_PROMPT = """
+        Bu görüntü bir belge sayfasından kesilmiş TABLO veya ŞEKİL bölgesidir. Markdown formatına çevir.
+        1. TABLOLARI bozmadan |...| formatında yaz.
+        2. Tablo içindeki sayıları ve başlıkları (Tezsiz, Kredi, AKTS) eksiksiz al.
+        3. Bölgede olmayan bir şey ekleme, yorum yapma.
+        """
+
+# Parça türü -> (prompt, önbellek sürümü)
+VISION_PROMPTS = {
+    "page": (VISION_PROMPT, VISION_PROMPT_VERSION),
+    "region": (VISION_REGION_PROMPT, f"{VISION_PROMPT_VERSION}-region"),
+}
+
+def render_page_image(page, clip=None):
+    """
+    Sayfayı (veya clip bölgesini) doğrudan JPEG baytlarına çevirir; PIL'e kopyalama yok.
+    Varsayılan: 144 DPI (eski 2x matris), gri tonlama.
+    """
+    grayscale = get_setting("VISION_GRAYSCALE", True, bool)
+    pix = page.get_pixmap(
+        dpi=get_setting("VISION_DPI", 144, int),
+        clip=clip,
+        colorspace=fitz.csGRAY if grayscale else fitz.csRGB,
+        alpha=False
+    )
+    return pix.tobytes("jpeg", jpg_quality=get_setting("VISION_JPEG_QUALITY", 85, int))
+
+def _merge_rects(rects, padding=6):
+    """Kenar payı eklenmiş, üst üste binen dikdörtgenleri birleştirir."""
+    merged = []
+    for rect in rects:
+        rect = fitz.Rect(rect.x0 - padding, rect.y0 - padding, rect.x1 + padding, rect.y1 + padding)
+        changed = True
+        while changed:
+            changed = False
+            for other in merged:
+                if rect.intersects(other):
+                    merged.remove(other)
+                    rect |= other
+                    changed = True
+                    break
+        merged.append(rect)
+    return sorted(merged, key=lambda r: (r.y0, r.x0))
+
+def find_vision_regions(page):
+    """Sayfadaki tablo (find_tables) ve şekil (gömülü resim) bölgeleri."""
+    page_area = max(page.rect.width * page.rect.height, 1.0)
+    rects = []
+    if hasattr(page, "find_tables"):
+        rects.extend(fitz.Rect(table.bbox) for table in page.find_tables().tables)
+    for info in page.get_image_info():
+        rect = fitz.Rect(info["bbox"]) & page.rect
+        # Logo, imza gibi küçük resimler şekil sayılmaz
+        if not rect.is_empty and rect.width * rect.height / page_area > 0.02: rects.append(rect)
+    return [r & page.rect for r in _merge_rects(rects)]
+
+def _overlap_ratio(rect, region):
+    inter = rect & region
+    if inter.is_empty: return 0.0
+    return (inter.width * inter.height) / max(rect.width * rect.height, 1.0)
+
+def plan_vision_page(page, crop_regions=True):
+    """
+    Sayfayı okuma sırasına göre parçalara ayırır: [(tür, veri, yedek_metin)].
+      - "text":   tablo/şekil dışındaki düz metin bloğu (Vision'a gitmez)
+      - "region": kırpılmış tablo/şekil görseli
+      - "page":   tüm sayfa görseli (taranmış sayfa, çoklu sütun, bölge bulunamadı)
+    Yedek metin, Vision başarısız olursa kullanılan get_text() çıktısıdır.
+    """
+    def whole_page():
+        return [("page", render_page_image(page), page.get_text())]
+
+    if not crop_regions: return whole_page()
+
+    text_blocks = [b for b in page.get_text("blocks") if b[6] == 0 and b[4].strip()]
+    if sum(len(b[4].strip()) for b in text_blocks) < 50: return whole_page() # Metin katmanı yok
+
+    regions = find_vision_regions(page)
+    if not regions: return whole_page() # Çoklu sütun vb.: yerleşim bütün olarak okunmalı
+    page_area = max(page.rect.width * page.rect.height, 1.0)
+    if sum(r.width * r.height for r in regions) / page_area > get_setting("VISION_MAX_CROP_COVERAGE", 0.6, float):
+        return whole_page() # Sayfanın çoğu tablo: kırpmanın kazancı yok
+
+    segments = [(r.y0, ("region", render_page_image(page, clip=r), page.get_text(clip=r))) for r in regions]
+    for block in text_blocks:
+        rect = fitz.Rect(block[:4])
+        if any(_overlap_ratio(rect, r) > 0.5 for r in regions): continue # Tablonun kendi metni
+        segments.append((rect.y0, ("text", block[4], block[4])))
+    segments.sort(key=lambda s: s[0])
+    return [segment for _, segment in segments]
+
+def _join_parts(parts):
+    return "\n\n".join(p.strip() for p in parts if p and p.strip())
+
+def transcribe_page_image(image_bytes, prompt=VISION_PROMPT, max_retries=0, bucket=None):
+    """
+    Görseli gateway üzerinden Gemini Vision'a gönderir. Denemeler bitince exception fırlatır.
+    """
+    return get_gateway().vision(
+        prompt, image_bytes, site="vision", model=VISION_MODEL,
+        max_retries=max_retries, bucket=bucket
+    )
+
+def process_single_page_vision(page, page_num):
+    """
+    Tek bir sayfayı Gemini Vision ile okur ve metni döndürür.
+    """
+    for _, text in process_pages_vision(page.parent, [page.number]):
+        return text
+    return page.get_text()
+
+def _transcribe_with_retry(image_bytes, prompt, page_num, bucket, max_retries):
+    """Worker thread içinde çalışır: hız limiti ve tekrar denemeler gateway'de; başarısızsa None."""
+    try:
+        return transcribe_page_image(image_bytes, prompt, max_retries=max_retries, bucket=bucket) or None
     except Exception as e:
         print(f"Vision Hatası (Sayfa {page_num}): {e}")
-        return page.get_text() # Hata olursa normal oku
+        return None
+
+def process_pages_vision(doc, page_indices=None, on_progress=None):
+    """
+    Sayfaları eşzamanlı (bounded thread pool) olarak Vision'a gönderir.
+    Sonuçları SAYFA SIRASIYLA (index, metin) olarak üretir (generator).
+
+    - Tablo/şekil içeren metin sayfalarında sadece o bölgeler kırpılıp gönderilir,
+      kalan metin get_text() ile okunur (VISION_CROP_REGIONS).
+    - fitz thread-safe olmadığı için render ve get_text() ana thread'de yapılır,
+      sadece Gemini istekleri worker'lara gider.
+    - Aynı anda en fazla 2 x concurrency görsel isteği beklemede tutulur.
+    - Başarısız görsel, tüm denemeler bitince kendi bölgesinin get_text() çıktısıyla değiştirilir.
+    - Önbellekte olan görseller Gemini'ye hiç gönderilmez.
+    - on_progress(biten, toplam) ana thread'den çağrılır (Streamlit güvenli).
+    """
+    if page_indices is None: page_indices = range(len(doc))
+    page_indices = list(page_indices)
+    total = len(page_indices)
+    if total == 0: return
+
+    concurrency = max(1, get_setting("VISION_CONCURRENCY", 4, int))
+    max_retries = max(0, get_setting("VISION_MAX_RETRIES", 3, int))
+    crop_regions = get_setting("VISION_CROP_REGIONS", True, bool)
+    bucket = TokenBucket.per_minute(get_setting("VISION_RPM", 60, float), burst=concurrency)
+    cache = get_vision_cache()
+
+    cache_hits = sent = 0
+    results = {}     # index -> birleştirilmiş sayfa metni
+    page_parts = {}  # index -> parça metinleri (bekleyenlerde yedek metin durur)
+    waiting = {}     # index -> Vision'dan beklenen görsel sayısı
+    pending = {}     # future -> (index, parça no, önbellek anahtarı)
+    next_to_submit = 0
+    next_to_yield = 0
+    done_count = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="vision") as pool:
+        while next_to_yield < total:
+            # Pencere dolana kadar yeni sayfa gönder
+            while next_to_submit < total and len(pending) < concurrency * 2:
+                idx = page_indices[next_to_submit]
+                page = doc[idx]
+                try:
+                    segments = plan_vision_page(page, crop_regions)
+                except Exception as e:
+                    print(f"Render Hatası (Sayfa {idx + 1}): {e}")
+                    segments = [("text", page.get_text(), "")]
+
+                parts = []
+                for part_no, (kind, data, fallback) in enumerate(segments):
+                    if kind == "text":
+                        parts.append(data)
+                        continue
+                    prompt, prompt_version = VISION_PROMPTS[kind]
+                    cache_key = VisionCache.make_key(data, prompt_version, VISION_MODEL)
+                    cached_text = cache.get(cache_key)
+                    if cached_text is not None:
+                        cache_hits += 1
+                        parts.append(cached_text)
+                        continue
+                    parts.append(fallback)
+                    sent += 1
+                    future = pool.submit(bind(_transcribe_with_retry), data, prompt, idx + 1, bucket, max_retries)
+                    pending[future] = (idx, part_no, cache_key)
+                    waiting[idx] = waiting.get(idx, 0) + 1
+
+                page_parts[idx] = parts
+                if idx not in waiting:
+                    results[idx] = _join_parts(page_parts.pop(idx))
+                    done_count += 1
+                next_to_submit += 1
+            if on_progress and done_count: on_progress(done_count, total)
+
+            # Sıradaki sayfa hazırsa sırayla teslim et
+            while next_to_yield < total and page_indices[next_to_yield] in results:
+                idx = page_indices[next_to_yield]
+                yield idx, results.pop(idx)
+                next_to_yield += 1
+            if next_to_yield >= total or not pending: continue
+
+            finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in finished:
+                idx, part_no, cache_key = pending.pop(future)
+                try: text = future.result()
+                except Exception: text = None
+                if text:
+                    page_parts[idx][part_no] = text
+                    cache.put(cache_key, text)
+                waiting[idx] -= 1
+                if waiting[idx] == 0:
+                    del waiting[idx]
+                    results[idx] = _join_parts(page_parts.pop(idx))
+                    done_count += 1
+    event("vision", pages=total, images_sent=sent, cache_hits=cache_hits)
+
+def iter_page_texts(doc, vision_indices, saved_pages=None, on_page=None):
+    """
+    Tüm sayfaların metnini sırayla (index, metin) üretir.
+    Sadece vision_indices içindeki sayfalar Vision'a gider, diğerleri get_text() ile okunur.
+    saved_pages ({index: metin}) verilirse o sayfalar tekrar okunmaz (iş checkpoint'i),
+    yeni okunan her sayfa için on_page(index, metin) çağrılır.
+    """
+    saved_pages = saved_pages or {}
+    vision_indices = [i for i in vision_indices if i not in saved_pages]
+    vision_iter = process_pages_vision(doc, vision_indices)
+    next_vision = next(vision_iter, None) if vision_indices else None
+    for i, page in enumerate(doc):
+        if i in saved_pages:
+            yield i, saved_pages[i]
+            continue
+        if next_vision is not None and next_vision[0] == i:
+            text = next_vision[1]
+            next_vision = next(vision_iter, None)
+        else:
+            text = page.get_text()
+        if on_page: on_page(i, text)
+        yield i, text
+
+# --- 5. İÇERİK ADRESLEME (DETERMİNİSTİK ID) ---
+INDEX_NAME = "mevzuat-asistani"
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def source_key(source):
+    """Dosya adından ASCII, sabit uzunlukta ön ek üretir (Türkçe karakterli adlar için)."""
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+
+def make_chunk_id(source, page, chunk_hash):
+    # Aynı kaynak + sayfa + içerik => her yüklemede aynı vektör ID'si
+    return f"{source_key(source)}-p{page}-{chunk_hash[:16]}"
+
+def chunk_body(chunk):
+    """
+    Hash'lenecek metin: LegalChunker başlığı ("BELGE: {başlık}" ...) hariç parça gövdesi.
+    Başlık LLM'den gelir; tekrar yüklemede değişse bile parça ID'leri değişmez.
+    """
+    return strip_header(chunk.page_content)
+
+def assign_chunk_ids(chunks, seen=None):
+    """
+    Her parçaya gövde hash'i ve deterministik ID (kaynak + sayfa + gövde) verir.
+    Aynı sayfadaki birebir aynı parçalar (aynı ID) tekilleştirilir.
+    seen verilirse dosya boyunca paylaşılır ve güncellenir.
+    (id, chunk) listesi döndürür.
+    """
+    items = []
+    if seen is None: seen = set()
+    for chunk in chunks:
+        chunk_hash = content_hash(chunk_body(chunk))
+        chunk_id = make_chunk_id(chunk.metadata["source"], chunk.metadata.get("page", 0), chunk_hash)
+        if chunk_id in seen: continue
+        seen.add(chunk_id)
+        chunk.metadata["chunk_hash"] = chunk_hash
+        chunk.metadata["chunk_id"] = chunk_id
+        items.append((chunk_id, chunk))
+    return items
+
+def get_embedding_model():
+    """Ingestion ve sorgu tarafında ortak, önbellekli embedding modeli."""
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return wrap_embeddings(GoogleGenerativeAIEmbeddings(
+        model="models/embedding-001",
+        google_api_key=st.secrets["GOOGLE_API_KEY"]
+    ))
+
+def get_pinecone_index():
+    """VECTOR_BACKEND = "local" ise aynı arayüzlü gömülü indeks (local_vector_store)."""
+    if use_local_backend(): return get_local_index()
+    from pinecone import Pinecone
+    pc = Pinecone(api_key=st.secrets["PINECONE_API_KEY"])
+    return pc.Index(INDEX_NAME)
+
+def get_vector_store(embedding_model):
+    if use_local_backend(): return LocalVectorStore(get_local_index(), embedding_model)
+    from langchain_pinecone import PineconeVectorStore
+    return PineconeVectorStore(
+        index_name=INDEX_NAME,
+        embedding=embedding_model,
+        pinecone_api_key=st.secrets["PINECONE_API_KEY"]
+    )
+
+def list_existing_chunk_ids(index, source):
+    """
+    Kaynağa ait mevcut vektör ID'lerini ön ek ile listeler.
+    Index listelemeyi desteklemiyorsa None döner.
+    """
+    try:
+        existing = set()
+        for id_batch in index.list(prefix=f"{source_key(source)}-"):
+            existing.update(id_batch)
+        return existing
+    except Exception as e:
+        print(f"ID Listeleme Hatası ({source}): {e}")
+        return None
+
+def delete_ids(index, ids, batch_size=1000):
+    """ID listesiyle toplu silme (Pinecone tek istekte en fazla 1000 ID kabul eder). Geçici hatalarda tekrar dener."""
+    ids = sorted(ids)
+    for i in range(0, len(ids), batch_size):
+        batch = ids[i : i + batch_size]
+        call_with_retry(lambda: index.delete(ids=batch), max_retries=get_setting("UPLOAD_MAX_RETRIES", 5, int))
+
+def find_legacy_ids(index, source):
+    """
+    Kaynağın manifest öncesi (rastgele ID'li, chunk_id'siz) kayıtlarını bulur.
+    ID'den anlaşılmadığı için tüm ID'ler listelenir ve metadata 100'lük paketlerle okunur.
+    """
+    prefix = f"{source_key(source)}-"
+    candidates = [vector_id for id_batch in index.list() for vector_id in id_batch if not vector_id.startswith(prefix)]
+    legacy = set()
+    for i in range(0, len(candidates), 100):
+        batch = candidates[i : i + 100]
+        response = call_with_retry(lambda: index.fetch(ids=batch), max_retries=get_setting("UPLOAD_MAX_RETRIES", 5, int))
+        for vector_id, record in response.vectors.items():
+            metadata = record.metadata or {}
+            if metadata.get("source") == source and "chunk_id" not in metadata: legacy.add(vector_id)
+    return legacy
+
+def delete_legacy_vectors(index, source):
+    """
+    Manifest öncesi (chunk_id'siz) kayıtları siler; yeni parçalara dokunmaz.
+    Filtreli silme desteklenmiyorsa (Pinecone serverless) kayıtlar listelenip ID ile silinir.
+    İkisi de başarısız olursa hata çağırana iletilir (sessizce yutulmaz).
+    """
+    try:
+        index.delete(filter={"source": source, "chunk_id": {"$exists": False}})
+        return
+    except Exception as e:
+        print(f"Filtreli Silme Başarısız ({source}), ID ile siliniyor: {e}")
+    delete_ids(index, find_legacy_ids(index, source))
+
+# --- 6. AKIŞ AŞAMALARI (EXTRACT) ---
+def _with_title(page_doc, title):
+    # İçerikteki "BELGE: ... SAYFA: ..." başlığını parçalayıcı (LegalChunker) ekler
+    page_doc.metadata["official_title"] = title
+    return page_doc
+
+def iter_titled_pages(doc, file_name, routes, on_title=None, title=None, saved_pages=None, on_page=None):
+    """
+    Sayfa Document'lerini belge başlığı (official_title) eklenmiş halde, sırayla üretir (generator).
+    Başlık tespiti için sadece ilk 2 sayfa tamponlanır; kalan sayfalar akış halinde geçer.
+    title verilirse (devam eden iş) tespit atlanır, böylece parça başlıkları önceki sayfalarla aynı kalır.
+    """
+    vision_indices = [i for i, (needs_vision, _) in enumerate(routes) if needs_vision]
+    full_text_for_title = "" # Başlık tespiti için ilk sayfaları biriktir
+    buffered = []
+    if title is not None and on_title: on_title(title)
+
+    for i, page_text in iter_page_texts(doc, vision_indices, saved_pages, on_page):
+        page_doc = None
+        if page_text.strip():
+            page_doc = Document(
+                page_content=page_text,
+                metadata={
+                    "source": file_name,
+                    "page": i + 1, # <-- İŞTE ÇÖZÜM: Gerçek sayfa numarası
+                    "complexity": "vision" if routes[i][0] else "text",
+                    "route_reason": routes[i][1],
+                    "page_hash": content_hash(page_text)
+                }
+            )
+
+        if title is not None:
+            if page_doc: yield _with_title(page_doc, title)
+            continue
+
+        # Başlık tespiti için ilk 2 sayfanın metnini sakla
+        full_text_for_title += page_text + "\n"
+        if page_doc: buffered.append(page_doc)
+        if i < 1: continue
+
+        title = detect_document_title(full_text_for_title, file_name)
+        if on_title: on_title(title)
+        for d in buffered: yield _with_title(d, title)
+        buffered = []
+
+    if title is None: # Tek sayfalık belge
+        title = detect_document_title(full_text_for_title, file_name)
+        if on_title: on_title(title)
+        for d in buffered: yield _with_title(d, title)
+
+# --- 7. ANA İŞLEME FONKSİYONU ---
+class StreamlitReporter:
+    """
+    process_pdfs'in ilerleme/mesaj çıktısı. Arka plan işçisi (ingest_worker.py)
+    aynı arayüzü iş kuyruğuna yazan bir raporlayıcı ile kullanır.
+    """
+    def __init__(self):
+        self._upload_status = st.empty()
+        self._page_bar = None
+        self._upload_bar = None
+
+    def message(self, level, text):
+        # level: info / success / warning / error / caption
+        getattr(st, level)(text)
+
+    def start_file(self, file_name, total_pages):
+        self._page_bar = st.progress(0)
+
+    def page_done(self, fraction):
+        if self._page_bar: self._page_bar.progress(fraction)
+
+    def upload_status(self, text):
+        self._upload_status.caption(text)
+
+    def upload_progress(self, fraction):
+        if self._upload_bar is None: self._upload_bar = st.progress(0)
+        self._upload_bar.progress(fraction)
+
+    def close(self):
+        self._upload_status.empty()
+
+def _finish_file(index, manifests, source, old_ids, new_ids, legacy, stats, checkpoint, ok):
+    """
+    Yükleme hattı tarafından, dosyanın yeni parçaları yazıldıktan SONRA çağrılır.
+    Atomik değiştirme: manifest yeni sürüme geçer (sorgular artık sadece yeni parçaları görür),
+    ardından eski ID'ler toplu silinir. Hata olursa manifest değişmez, eski sürüm görünür kalır.
+    """
+    stale_ids = old_ids - new_ids
+    if ok:
+        try:
+            # Geçiş noktası. Silinemeyen eski ID'ler "bekleyen" olarak manifestte kalır
+            manifests.put(source, new_ids, pending=stale_ids)
+            bump_corpus_version() # Sorgu tarafındaki manifest sürüm önbelleği de yenilenir
+        except Exception as e:
+            print(f"Manifest Yazma Hatası ({source}): {e}")
+            ok = False
 
-# --- 5. ANA İŞLEME FONKSİYONU ---
-def process_pdfs(uploaded_files, use_vision_mode=False):
+    if not ok:
+        # Yeni sürüm hiç görünür olmadı: yarım yüklenen yeni parçaları geri al
+        print(f"Eski sürüm korunuyor ({source}): yükleme sırasında hata oluştu.")
+        stats["stale_kept"] += len(stale_ids)
+        try: delete_ids(index, new_ids - old_ids)
+        except Exception as e: print(f"Geri Alma Hatası ({source}): {e}")
+        if checkpoint: checkpoint.clear_chunks(source)
+    else:
+        try:
+            delete_ids(index, stale_ids)
+            stats["stale_deleted"] += len(stale_ids)
+            if stale_ids: manifests.put(source, new_ids)
+        except Exception as e:
+            print(f"Eski Parça Silme Hatası ({source}): {e}")
+            stats["stale_kept"] += len(stale_ids)
+        if legacy:
+            try: delete_legacy_vectors(index, source)
+            except Exception as e:
+                # Geçiş yapıldığı için eski kayıtlar sorgularda görünmez; belge silinirken tekrar denenir
+                print(f"Eski Kayıt Silme Hatası ({source}): {e}")
+                stats["legacy_kept"] += 1
+
+    # Anahtar kelime indeksi de görünür sürümle aynı parçalara iner
+    keyword_index = get_bm25_index()
+    if keyword_index:
+        try: keyword_index.retain(source, new_ids if ok else old_ids)
+        except Exception as e: print(f"BM25 Güncelleme Hatası ({source}): {e}")
+
+    if checkpoint: checkpoint.mark_file(source, "done" if ok else "failed", None if ok else "Yükleme hatası")
+
+def process_pdfs(uploaded_files, use_vision_mode=False, reporter=None, checkpoint=None):
+    """
+    Akış halinde işleme: her PDF bellekten açılır, sayfa sayfa okunup parçalanır ve
+    parçalar sınırlı kuyruklu yükleme hattına (embed -> upsert) verilir.
+    Çökme olursa o ana kadar yüklenenler kalır; deterministik ID'ler sayesinde
+    tekrar yüklemede sadece eksikler gönderilir.
+
+    checkpoint (job_queue.JobCheckpoint) verilirse biten dosyalar atlanır, okunmuş
+    sayfa metinleri ve başlık tekrar kullanılır (Vision tekrar çalışmaz). Yazılan her
+    batch'in ID'leri checkpoint'e kaydedilir; devam eden iş bu parçaları tekrar yüklemez.
+
+    Her çağrı "ingest" izi açar: dosya, yönlendirme, sayfa okuma ve yükleme bekleme
+    aşamaları span olarak TRACE_EXPORT_PATH'e yazılır (bkz. tracing.py).
+    """
+    with start_trace("ingest", files=len(uploaded_files), vision_mode=bool(use_vision_mode)):
+        return _process_pdfs(uploaded_files, use_vision_mode, reporter, checkpoint)
+
+def _process_pdfs(uploaded_files, use_vision_mode, reporter, checkpoint):
+    if reporter is None: reporter = StreamlitReporter()
     try:
         supabase = create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
     except: return None
     
     # 1. Pinecone Index Bağlantısı 
     try:
-        embedding_model = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=st.secrets["GOOGLE_API_KEY"]
-        )
-        vector_store = PineconeVectorStore(
-            index_name="mevzuat-asistani",
-            embedding=embedding_model,
-            pinecone_api_key=st.secrets["PINECONE_API_KEY"]
-        )
+        embedding_model = get_embedding_model()
+        vector_store = get_vector_store(embedding_model)
+        index = get_pinecone_index()
+        manifests = get_manifest_store(supabase)
     except Exception as e:
-        st.error(f"Pinecone Bağlantı Hatası: {e}")
+        reporter.message("error", f"Pinecone Bağlantı Hatası: {e}")
         return None
 
-    if not os.path.exists("temp_pdfs"): os.makedirs("temp_pdfs")
-    
-    total_docs_to_upload = []
+    def on_uploaded(records):
+        # Batch bazında ilerleme: manifest dosya bitene kadar değişmediği için devam eden
+        # iş, önceki çalıştırmada yazılmış parçaları buradan öğrenir
+        by_source = collections.defaultdict(list)
+        for record in records: by_source[record["metadata"]["source"]].append(record["id"])
+        for source, ids in by_source.items(): checkpoint.save_chunks(source, ids)
+
+    # --- YÜKLEME HATTI (Embed + Upsert arka planda) ---
+    pipeline = UploadPipeline(
+        embedding_model, index,
+        batch_size=get_setting("EMBED_BATCH_SIZE", 100, int),
+        max_pending_batches=get_setting("UPLOAD_MAX_PENDING_BATCHES", 4, int),
+        upsert_concurrency=get_setting("UPSERT_CONCURRENCY", 4, int),
+        upsert_rpm=get_setting("UPSERT_RPM", 1200, float),
+        embed_rpm=get_setting("EMBED_RPM", 300, float),
+        max_retries=get_setting("UPLOAD_MAX_RETRIES", 5, int),
+        on_uploaded=on_uploaded if checkpoint else None
+    )
+    stats = {"skipped": 0, "stale_deleted": 0, "stale_kept": 0, "resumed": 0, "resumed_chunks": 0, "legacy_kept": 0}
+    keyword_index = get_bm25_index()
 
     for uploaded_file in uploaded_files:
         try:
-            # Dosyayı kaydet
-            uploaded_file.seek(0)
-            file_path = os.path.join("temp_pdfs", uploaded_file.name)
-            with open(file_path, "wb") as f: f.write(uploaded_file.getbuffer())
-
-            # Karmaşıklık Analizi
-            is_complex, reason = analyze_pdf_complexity(file_path)
-            should_use_vision = use_vision_mode or is_complex
-            
-            if should_use_vision: st.warning(f"📸 Vision: {uploaded_file.name} ({reason})")
-            else: st.success(f"⚡ Hızlı: {uploaded_file.name}")
-
-            # --- SAYFA SAYFA İŞLEME ---
-            doc = fitz.open(file_path)
-            file_pages_docs = [] # Bu dosyanın sayfaları
-            full_text_for_title = "" # Başlık tespiti için ilk sayfaları biriktir
-
-            status_bar = st.progress(0)
-            
-            for i, page in enumerate(doc):
-                # İlerleme çubuğu
-                status_bar.progress((i + 1) / len(doc))
-                
-                # Metni Çıkar
-                page_text = ""
-                if should_use_vision:
-                    page_text = process_single_page_vision(page, i+1)
+            file_name = uploaded_file.name
+            if checkpoint and checkpoint.is_file_done(file_name):
+                stats["resumed"] += 1
+                continue
+
+            # Bellekteki tampondan aç (temp_pdfs/ yok)
+            file_started = time.perf_counter()
+            doc = fitz.open(stream=uploaded_file.getvalue(), filetype="pdf")
+            try:
+                # Karmaşıklık Analizi (sayfa bazlı yönlendirme)
+                with span("route", source=file_name, pages=len(doc)) as attrs:
+                    routes = route_pages(doc, force_vision=use_vision_mode)
+                    vision_count = sum(1 for needs_vision, _ in routes if needs_vision)
+                    attrs["vision_pages"] = vision_count
+
+                if vision_count:
+                    reasons = collections.Counter(reason for needs_vision, reason in routes if needs_vision)
+                    reason_text = ", ".join(f"{r} x{c}" for r, c in reasons.most_common(3))
+                    reporter.message("warning", f"📸 Vision: {file_name} ({vision_count}/{len(doc)} sayfa: {reason_text})")
+                else: reporter.message("success", f"⚡ Hızlı: {file_name}")
+
+                # --- ARTIMLI GÜNCELLEME (Sadece değişen parçalar) ---
+                # Geçerli ID'ler manifestten okunur; manifest yoksa (eski yükleme) index'ten listelenir
+                manifest = manifests.get(file_name)
+                legacy = manifest is None or manifest.version == LEGACY_VERSION
+                if manifest and not manifest.deleted:
+                    existing_ids = set(manifest.ids)
+                    old_ids = manifest.ids | manifest.pending
                 else:
-                    page_text = page.get_text()
-                
-                # Başlık tespiti için ilk 2 sayfanın metnini sakla
-                if i < 2: full_text_for_title += page_text + "\n"
-
-                # DOKÜMAN OLUŞTUR 
-                if page_text.strip():
-                    new_doc = Document(
-                        page_content=page_text,
-                        metadata={
-                            "source": uploaded_file.name,
-                            "page": i + 1, # <-- İŞTE ÇÖZÜM: Gerçek sayfa numarası
-                            "complexity": "vision" if should_use_vision else "text"
-                        }
-                    )
-                    file_pages_docs.append(new_doc)
-
-            # Belge Başlığını Tespit Et
-            detected_title = detect_document_title(full_text_for_title, uploaded_file.name)
-            st.caption(f"🏷️ Tespit Edilen Başlık: **{detected_title}**")
-
-            # Metadata'yı Güncelle (Başlığı ekle)
-            for d in file_pages_docs:
-                d.metadata["official_title"] = detected_title
-                # İçeriğe de başlığı ekleyelim ki aramalarda çıksın
-                d.page_content = f"BELGE: {detected_title}\nSAYFA: {d.metadata['page']}\n---\n{d.page_content}"
-
-            # --- SPLITTER (Parçalama) ---
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=2000, # Senaryoya göre değiştirilebilir değerler.
-                chunk_overlap=300,
-                separators=["\nMADDE", "\n\n", ". ", " ", ""]
-            )
-            
-            # Listeyi split et
-            chunks = text_splitter.split_documents(file_pages_docs)
-            total_docs_to_upload.extend(chunks)
+                    existing_ids = list_existing_chunk_ids(index, file_name) or set()
+                    old_ids = frozenset(existing_ids) | (manifest.pending if manifest else frozenset())
+                    # İlk manifest: yeni parçalar, geçiş anına kadar sorgularda görünmez.
+                    # Eski (chunk_id'siz) kayıtlar sürüm 0'da görünür kalır, geçişte gizlenir
+                    manifests.put(file_name, existing_ids, pending=old_ids - existing_ids, version=LEGACY_VERSION if legacy else None)
+
+                # --- CHECKPOINT (Yarıda kalan işin okunmuş sayfaları ve başlığı) ---
+                saved_pages, saved_title, on_page = None, None, None
+                uploaded_before = set()
+                if checkpoint:
+                    checkpoint.start_file(file_name, len(doc))
+                    saved_pages = checkpoint.saved_pages(file_name)
+                    saved_title = checkpoint.saved_title(file_name)
+                    uploaded_before = checkpoint.uploaded_chunks(file_name) - existing_ids
+                    on_page = functools.partial(checkpoint.save_page, file_name)
+                    if saved_pages:
+                        reporter.message("caption", f"↩️ {file_name}: {len(saved_pages)} sayfa kaldığı yerden devam ediyor")
+
+                # --- SAYFA SAYFA İŞLEME ---
+                reporter.start_file(file_name, len(doc))
+                seen_ids = set()
+                chunker = None # Başlık tespit edilince oluşturulur
+                terms = TermCollector() # Yerel sorgu zenginleştirme için korpus sözlüğü
 
-            # Temizlik (Dosyayı sil)
-            doc.close()
-            if os.path.exists(file_path): os.remove(file_path)
+                def on_title(title):
+                    nonlocal chunker
+                    reporter.message("caption", f"🏷️ Tespit Edilen Başlık: **{title}**")
+                    if checkpoint and title != saved_title: checkpoint.save_title(file_name, title)
+                    # --- SPLITTER (Madde bazlı parçalama, overlap yok) ---
+                    chunker = LegalChunker(title, max_chars=get_setting("CHUNK_MAX_CHARS", 4000, int))
+
+                def enqueue(chunks):
+                    items = assign_chunk_ids(chunks, seen_ids)
+                    # Değişmemiş parçalar da BM25'e yazılır (indeks sonradan açılmış olabilir)
+                    if keyword_index and items:
+                        try: keyword_index.add(items)
+                        except Exception as e: print(f"BM25 Yazma Hatası ({file_name}): {e}")
+                    for chunk_id, chunk in items:
+                        if chunk_id in existing_ids:
+                            stats["skipped"] += 1
+                            continue
+                        if chunk_id in uploaded_before:
+                            stats["resumed_chunks"] += 1
+                            continue
+                        pipeline.add(chunk_id, chunk)
+
+                titled_pages = iter_titled_pages(
+                    doc, file_name, routes, on_title=on_title,
+                    title=saved_title, saved_pages=saved_pages, on_page=on_page
+                )
+                # Okuma + Vision + parçalama (yükleme hattı doluysa bekleme dahil)
+                pages_started = time.perf_counter()
+                for page_doc in titled_pages:
+                    # İlerleme çubuğu
+                    reporter.page_done(page_doc.metadata["page"] / len(doc))
+                    terms.add(page_doc.page_content)
+                    enqueue(chunker.feed(page_doc))
+                    reporter.upload_status(f"⬆️ {pipeline.uploaded}/{pipeline.submitted} parça yüklendi")
+                if chunker: enqueue(chunker.finish())
+                reporter.page_done(1.0)
+                record_span("pages", pages_started, source=file_name, pages=len(doc), chunks=len(seen_ids))
+                if not seen_ids:
+                    reporter.message("warning", f"⚠️ {file_name}: metin bulunamadı, parça üretilmedi.")
+                try: get_corpus_vocabulary().update_source(file_name, terms)
+                except Exception as e: print(f"Korpus Sözlüğü Yazma Hatası: {e}")
+
+                # Manifest geçişi ve eski parçaların silinmesi, bu dosyanın yeni parçaları yazıldıktan SONRA
+                pipeline.after_uploads(functools.partial(
+                    _finish_file, index, manifests, file_name, frozenset(old_ids), frozenset(seen_ids), legacy, stats, checkpoint
+                ))
+            finally:
+                record_span("file", file_started, source=file_name, pages=len(doc))
+                doc.close()
 
             # Supabase Yedekleme 
             try:
-                uploaded_file.seek(0)
                 supabase.storage.from_("belgeler").upload(
-                    path=uploaded_file.name, file=uploaded_file.read(),
+                    path=file_name, file=uploaded_file.getvalue(),
                     file_options={"content-type": "application/pdf", "upsert": "true"}
                 )
-                supabase.table("dokumanlar").upsert({"dosya_adi": uploaded_file.name}).execute()
+                supabase.table("dokumanlar").upsert({"dosya_adi": file_name}).execute()
             except: pass
 
         except Exception as e:
-            st.error(f"Hata ({uploaded_file.name}): {e}")
+            reporter.message("error", f"Hata ({uploaded_file.name}): {e}")
+            event("file_error", source=uploaded_file.name, error=type(e).__name__)
+            if checkpoint: checkpoint.mark_file(uploaded_file.name, "failed", str(e))
 
-    # --- TOPLU PINECONE YÜKLEMESİ ---
-    if total_docs_to_upload:
-        try:
-            st.info(f"🚀 {len(total_docs_to_upload)} parça Pinecone'a yükleniyor...")
-            
-            batch_size = 20
-            pbar = st.progress(0)
-            for i in range(0, len(total_docs_to_upload), batch_size):
-                batch = total_docs_to_upload[i : i + batch_size]
-                vector_store.add_documents(batch)
-                pbar.progress(min((i + batch_size) / len(total_docs_to_upload), 1.0))
-                time.sleep(0.5) # Rate limit yememek için minik bekleme
-            
-            st.success("✅ Yükleme Tamamlandı! Veritabanı güncel.")
-            return vector_store
-        except Exception as e:
-            st.error(f"Pinecone Yükleme Hatası: {e}")
-            return None
+    # --- YÜKLEME HATTININ BİTMESİNİ BEKLE ---
+    upload_started = time.perf_counter()
+    pipeline.close(timeout=0)
+    if pipeline.submitted:
+        reporter.message("info", f"🚀 {pipeline.submitted} parça Pinecone'a yükleniyor...")
+        reporter.upload_progress(0)
+        while pipeline.is_alive():
+            reporter.upload_progress(min((pipeline.uploaded + pipeline.failed) / pipeline.submitted, 1.0))
+            time.sleep(0.25)
+        reporter.upload_progress(1.0)
+    else:
+        pipeline.close()
+    reporter.close()
+    record_span("upload_wait", upload_started, submitted=pipeline.submitted, uploaded=pipeline.uploaded, failed=pipeline.failed)
+    event("upload", throughput=round(pipeline.throughput(), 1), **stats)
+
+    # Korpus değişti: eski korpusla üretilmiş önbellekteki cevaplar geçersiz
+    if pipeline.uploaded or stats["stale_deleted"]: bump_corpus_version()
+
+    if stats["resumed"]:
+        reporter.message("caption", f"↩️ {stats['resumed']} dosya önceki çalıştırmada tamamlanmıştı, atlandı.")
+    if stats["resumed_chunks"]:
+        reporter.message("caption", f"↩️ {stats['resumed_chunks']} parça önceki çalıştırmada yüklenmişti, tekrar gönderilmedi.")
+    if stats["legacy_kept"]:
+        reporter.message("warning", f"⚠️ {stats['legacy_kept']} belgenin manifest öncesi eski kayıtları silinemedi. Sorgularda görünmezler; belgeyi silerek temizleyebilirsiniz.")
+    if stats["skipped"]:
+        reporter.message("caption", f"♻️ {stats['skipped']} parça değişmemiş, tekrar yüklenmedi.")
+    if stats["stale_deleted"]:
+        reporter.message("caption", f"🧹 {stats['stale_deleted']} eskimiş parça silindi.")
+    if pipeline.uploaded:
+        reporter.message("caption", f"⚡ Yükleme hızı: {pipeline.throughput():.1f} parça/sn ({pipeline.uploaded} parça)")
+    if hasattr(embedding_model, "stats"):
+        cache_stats = embedding_model.stats()
+        event("embedding_cache", hits=cache_stats["hits"], misses=cache_stats["misses"])
+        if cache_stats["hits"] + cache_stats["misses"]:
+            reporter.message("caption", f"🧠 Embedding önbelleği: %{cache_stats['hit_rate'] * 100:.0f} isabet ({cache_stats['hits']} / {cache_stats['hits'] + cache_stats['misses']})")
+    if pipeline.failed:
+        reporter.message("error", f"Pinecone Yükleme Hatası: {pipeline.failed} parça yüklenemedi.")
+        for message in pipeline.error_messages()[:5]: reporter.message("caption", f"❌ {message}")
+        if stats["stale_kept"]:
+            reporter.message("caption", f"⚠️ Hata nedeniyle {stats['stale_kept']} eski parça silinmeden bırakıldı.")
+        return vector_store if pipeline.uploaded else None
+
+    if pipeline.uploaded or stats["skipped"] or stats["stale_deleted"] or stats["resumed"] or stats["resumed_chunks"]:
+        reporter.message("success", "✅ Yükleme Tamamlandı! Veritabanı güncel.")
+        return vector_store
     
     return None
 
 # --- TEMİZLEME VE DİĞER FONKSİYONLAR ---
 def delete_document_cloud(file_name):
-    
+    """
+    Belgeyi manifestteki ID'lerle siler. Önce manifest "silindi" olarak işaretlenir
+    (belge sorgulardan hemen kalkar), sonra vektörler toplu silinir.
+    """
     try:
-        pinecone_api_key = st.secrets["PINECONE_API_KEY"]
-        index_name = "mevzuat-asistani"
-        pc = Pinecone(api_key=pinecone_api_key)
-        index = pc.Index(index_name)
-        index.delete(filter={"source": file_name})
-    except: pass
+        supabase = create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
+        index = get_pinecone_index()
+        manifests = get_manifest_store(supabase)
+        manifest = manifests.get(file_name)
+        if manifest: ids = manifest.ids | manifest.pending
+        else: ids = list_existing_chunk_ids(index, file_name) or set()
+        # Silme yarıda kalırsa (ör. eski kayıtlar silinemezse) belge yine de sorgulardan kalkmış olur
+        manifests.put(file_name, (), pending=ids, deleted=True)
+        delete_ids(index, ids)
+        delete_legacy_vectors(index, file_name)
+        manifests.remove(file_name)
+        try: get_corpus_vocabulary().remove_source(file_name)
+        except Exception as e: print(f"Korpus Sözlüğü Yazma Hatası: {e}")
+        keyword_index = get_bm25_index()
+        if keyword_index:
+            try: keyword_index.remove_source(file_name)
+            except Exception as e: print(f"BM25 Silme Hatası: {e}")
+    except Exception as e:
+        return False, f"Vektör silme hatası: {e}"
+    finally:
+        bump_corpus_version() # Kısmi silme de korpusu değiştirir
     
     try:
-        supabase = create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
         supabase.table("dokumanlar").delete().eq("dosya_adi", file_name).execute()
         supabase.storage.from_("belgeler").remove([file_name])
         return True, "Silindi"
     except Exception as e: return False, str(e)
 
+def rebuild_keyword_index():
+    """
+    BM25 indeksini Pinecone'daki mevcut parçalardan doldurur (indeks sonradan açıldıysa
+    veya .cache silindiyse). Sadece manifestteki görünür ID'ler alınır. (belge, parça) sayısı döndürür.
+    """
+    keyword_index = get_bm25_index()
+    if keyword_index is None: return 0, 0
+    supabase = create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
+    index = get_pinecone_index()
+    manifests = get_manifest_store(supabase)
+    sources = [row["dosya_adi"] for row in supabase.table("dokumanlar").select("dosya_adi").execute().data]
+    total = 0
+    for source in sources:
+        manifest = manifests.get(source)
+        if manifest and manifest.deleted: continue
+        ids = sorted(manifest.ids if manifest else (list_existing_chunk_ids(index, source) or ()))
+        items = []
+        for i in range(0, len(ids), 100):
+            response = call_with_retry(lambda: index.fetch(ids=ids[i : i + 100]), max_retries=get_setting("UPLOAD_MAX_RETRIES", 5, int))
+            for vector_id, record in response.vectors.items():
+                metadata = dict(record.metadata or {})
+                text = metadata.pop("text", "")
+                metadata.setdefault("chunk_id", vector_id)
+                items.append((vector_id, Document(page_content=text, metadata=metadata)))
+        keyword_index.add(items)
+        keyword_index.retain(source, frozenset(ids))
+        total += len(items)
+    return len(sources), total
+
 def connect_to_existing_index():
     
     try:
-        embedding_model = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=st.secrets["GOOGLE_API_KEY"]
-        )
+        embedding_model = get_embedding_model()
+        if use_local_backend(): return get_vector_store(embedding_model)
+        from langchain_pinecone import PineconeVectorStore
         vector_store = PineconeVectorStore.from_existing_index(
-            index_name="mevzuat-asistani",
+            index_name=INDEX_NAME,
             embedding=embedding_model
         )
         return vector_store
@@ -0,0 +1,224 @@
+import hashlib
+import inspect
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+import numpy as np
+try:
+    import fcntl # Birden fazla süreç (app + worker) aynı dosyaya yazabilir
+except ImportError:
+    fcntl = None
+from langchain_core.embeddings import Embeddings
+from settings import get_setting
+
+# --- EMBEDDING ÖNBELLEĞİ ---
+# Aynı metin (BELGE/SAYFA başlıkları, 300 karakterlik overlap'ler, tekrar yüklemeler,
+# tekrar eden sorular) her seferinde yeniden embed edilmesin diye.
+# Vektörler float32 olarak tek bir ekleme-yalnız (append-only) dosyada tutulur ve
+# NumPy memmap ile okunur; anahtar -> satır eşlemesi SQLite'tadır.
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+class EmbeddingCache:
+    """Tek bir model (namespace) için kalıcı vektör deposu. Thread-safe."""
+    def __init__(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._vectors_path = os.path.join(folder, "vectors.f32")
+        self._conn = sqlite3.connect(os.path.join(folder, "index.sqlite3"), check_same_thread=False, timeout=30)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+        self.dim = self._stored_dim()
+        self.hits = 0
+        self.misses = 0
+        self._mmap = None
+
+    def _stored_dim(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        return int(row[0]) if row else None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _file_rows(self):
+        # Yarım yazılmış son satır (çökme) varsa yok sayılır
+        if not self.dim or not os.path.exists(self._vectors_path): return 0
+        return os.path.getsize(self._vectors_path) // (4 * self.dim)
+
+    def _matrix(self, min_rows=1):
+        """Gerekirse memmap'i yeniden açar (dosya başka yazımla büyüdüyse)."""
+        if self._mmap is None or self._mmap.shape[0] < min_rows:
+            rows = self._file_rows()
+            if rows == 0: return None
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._mmap
+
+    def get_many(self, keys):
+        """{anahtar: np.ndarray} döndürür; bulunamayanlar sözlükte yer almaz."""
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            if not self.dim: self.dim = self._stored_dim()
+            if not self.dim: return found
+            for i in range(0, len(keys), 500):
+                part = keys[i : i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, row FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                if not rows: continue
+                matrix = self._matrix(max(row for _, row in rows) + 1)
+                if matrix is None: continue
+                for key, row in rows:
+                    if row < matrix.shape[0]: found[key] = np.array(matrix[row])
+        return found
+
+    def put_many(self, items):
+        """items: [(anahtar, vektör)]. Önce vektör dosyaya eklenir, sonra indeks güncellenir."""
+        if not items: return
+        vectors = np.asarray([v for _, v in items], dtype=np.float32)
+        with self._lock:
+            if self.dim is None: self.dim = self._stored_dim()
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dim', ?)", (str(self.dim),))
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding boyutu uyuşmuyor: {vectors.shape[1]} != {self.dim}")
+            with open(self._vectors_path, "ab") as f:
+                if fcntl: fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0, os.SEEK_END)
+                    # Yarım satır kaldıysa satır sınırına hizala
+                    offset = f.tell()
+                    row_bytes = 4 * self.dim
+                    if offset % row_bytes:
+                        f.truncate(offset - offset % row_bytes)
+                        f.seek(0, os.SEEK_END)
+                    first_row = f.tell() // row_bytes
+                    f.write(vectors.tobytes())
+                    f.flush()
+                finally:
+                    if fcntl: fcntl.flock(f, fcntl.LOCK_UN)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, row) VALUES (?, ?)",
+                [(key, first_row + i) for i, (key, _) in enumerate(items)]
+            )
+            self._conn.commit()
+
+    def record(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "vectors": self._file_rows(),
+            }
+
+class CachedEmbeddings(Embeddings):
+    """
+    Herhangi bir LangChain Embeddings modelini saran önbellek katmanı.
+    Anahtar: (model adı, sorgu/belge türü, normalize edilmiş metnin hash'i).
+    Sorgu ve belge vektörleri ayrı tutulur (Gemini'de task_type farklıdır).
+    """
+    def __init__(self, underlying, cache, model_name):
+        self.underlying = underlying
+        self.cache = cache
+        self.model_name = model_name
+
+    def _key(self, text, kind):
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{self.model_name}|{kind}|{digest}"
+
+    def _embed(self, texts, kind, embed_fn):
+        keys = [self._key(t, kind) for t in texts]
+        found = self.cache.get_many(set(keys))
+
+        # Eksikler tekilleştirilerek tek seferde embed edilir
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing: missing[key] = text
+        if missing:
+            vectors = embed_fn(list(missing.values()))
+            new_items = list(zip(missing.keys(), vectors))
+            self.cache.put_many(new_items)
+            for key, vector in new_items: found[key] = np.asarray(vector, dtype=np.float32)
+
+        self.cache.record(len(keys) - len(missing), len(missing))
+        return [found[key].tolist() for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed(texts, "document", self.underlying.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed([text], "query", lambda ts: [self.underlying.embed_query(ts[0])])[0]
+
+    def embed_queries(self, texts):
+        """Birden fazla sorguyu (mümkünse) tek istekte embed eder."""
+        return self._embed(list(texts), "query", lambda ts: batch_embed_queries(self.underlying, ts))
+
+    def cached_document_vectors(self, texts):
+        """Belge metinlerinin önbellekteki vektörleri (yoksa None). İstatistiğe yazılmaz, model çağrılmaz."""
+        keys = [self._key(t, "document") for t in texts]
+        found = self.cache.get_many(set(keys))
+        return [found.get(key) for key in keys]
+
+    def stats(self):
+        return self.cache.stats()
+
+# Sorgu ve belge vektörü aynı olan (talimatsız) modeller: sorgular embed_documents ile toplu gönderilebilir
+SYMMETRIC_EMBEDDINGS = {"HuggingFaceEmbeddings", "SentenceTransformerEmbeddings", "FakeEmbeddings"}
+
+def batch_embed_queries(model, texts):
+    """
+    Sorguları tek istekte embed eder. Gemini'de task_type ile, simetrik modellerde
+    embed_documents ile; ikisi de yoksa tek tek embed_query ile.
+    """
+    if isinstance(model, CachedEmbeddings): return model.embed_queries(texts)
+    try:
+        if "task_type" in inspect.signature(model.embed_documents).parameters:
+            return model.embed_documents(list(texts), task_type="retrieval_query")
+    except (TypeError, ValueError):
+        pass
+    if type(model).__name__ in SYMMETRIC_EMBEDDINGS:
+        return model.embed_documents(list(texts))
+    return [model.embed_query(text) for text in texts]
+
+# --- SÜREÇ GENELİ ÖRNEKLER ---
+_caches = {}
+_caches_lock = threading.Lock()
+
+def _model_name(model):
+    for attr in ("model", "model_name"):
+        name = getattr(model, attr, None)
+        if isinstance(name, str) and name: return name
+    return type(model).__name__
+
+def wrap_embeddings(model):
+    """Modeli kalıcı önbellekle sarar. EMBEDDING_CACHE_ENABLED=false ise modeli aynen döndürür."""
+    if isinstance(model, CachedEmbeddings) or not get_setting("EMBEDDING_CACHE_ENABLED", True, bool):
+        return model
+    name = _model_name(model)
+    folder_name = re.sub(r"[^A-Za-z0-9._-]+", "_", name)
+    with _caches_lock:
+        if name not in _caches:
+            root = get_setting("EMBEDDING_CACHE_DIR", os.path.join(".cache", "embeddings"))
+            _caches[name] = EmbeddingCache(os.path.join(root, folder_name))
+        return CachedEmbeddings(model, _caches[name], name)
+
+def embedding_cache_stats():
+    """Model adı -> isabet istatistikleri (süreç başlangıcından beri)."""
+    with _caches_lock:
+        return {name: cache.stats() for name, cache in _caches.items()}
@@ -1,70 +1,59 @@
-import os
 import streamlit as st
-from langchain_google_genai import ChatGoogleGenerativeAI
-import json
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from chunk_manifest import filter_visible
+from llm_gateway import get_gateway
+from local_mmr import CandidateSet, get_local_retriever
+from answer_cache import get_answer_cache
+from context_builder import build_context
+from bm25_index import get_bm25_index, reciprocal_rank_fusion
+from query_expansion import get_query_expander
+from reranker import rerank_documents
+from settings import get_setting
+from tracing import bind, event, record_span, span, start_trace
 
 # --- 1. RERANKER (HAKEM) --- 
 # 40 belgeyi birden okuyamaz, en iyi 5-10 tanesini seçmeli.
-def rerank_documents(query, docs, api_key):
-    reranker_llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        google_api_key=api_key,
-        temperature=0.0
-    )
-
-    doc_text = ""
-    for i, doc in enumerate(docs):
-        source = os.path.basename(doc.metadata.get("source", "Bilinmiyor"))
-        clean_content = doc.page_content.replace("\n", " ").strip()
-        # 2500 karaktere çıkardık ki bağlam kopmasın
-        doc_text += f"\n[ID: {i}] (Kaynak: {source}) -> {clean_content[:2500]}...\n"
-
-    rerank_prompt = f"""
-    GÖREV: Aşağıdaki belge parçalarını analiz et ve kullanıcının sorusuyla EN ALAKALI olanları seç.
-
-    SORU: "{query}"
-
-    ADAY BELGELER:
-    {doc_text}
-
-    SEÇİM STRATEJİSİ (GENEL KURALLAR):
-    1. Belge, sorudaki ana konuyu (Staj, Kredi, AKTS, Puan) anlatıyor mu?
-    2. Sorudaki detaylar belgede birebir geçmeyebilir. ANLAM olarak eşleşiyorsa SEÇ.
-    3. Soru "Seviye" diyebilir, Belge "Düzey" diyebilir. Bunun gibi benzer anlamlıları aynı kabul et.
-    3. (30 AKTS, %20, 65 puan) gibi sayısal veriler içeren belgeleri önceliklendir.
-    
-    ÇIKTI FORMATI (JSON):
-    {{ "selected_indices": [0, 2, 5] }}
-    """
+# Yerel cross-encoder veya Gemini hakemi: bkz. reranker.py (RERANKER ayarı)
+
+# --- 2. MADDE ATIFLARI ---
+ARTICLE_REF_RE = re.compile(r"\b(geçici\s+|ek\s+)?madde\s*(\d+)", re.IGNORECASE)
+
+def find_article_docs(question, vector_store, k=6):
+    """Sorudaki "Madde n" atıflarını LegalChunker'ın yazdığı 'article' metadata'sı ile arar."""
+    articles = []
+    for prefix, number in ARTICLE_REF_RE.findall(question):
+        prefix = prefix.strip().upper().replace("GECICI", "GEÇİCİ").replace("GEÇICI", "GEÇİCİ")
+        articles.append(f"{prefix} {number}".strip())
+    if not articles: return []
     try:
-        response = reranker_llm.invoke(rerank_prompt).content
-        cleaned_response = re.sub(r"```json|```", "", response).strip()
-        selected_data = json.loads(cleaned_response)
-        selected_indices = selected_data.get("selected_indices", [])
-        
-        if not selected_indices:
-            return docs[:5] # Hiçbir şey bulamazsa ilk 5'i döndür
-        return [docs[i] for i in selected_indices if i < len(docs)]
-    except:
-        return docs[:5]
+        return vector_store.similarity_search(question, k=k, filter={"article": {"$in": articles}})
+    except Exception as e:
+        print(f"Madde Arama Hatası: {e}")
+        return []
 
-# --- 2. ANA FONKSİYON ---
-def generate_answer(question, vector_store, chat_history):
-    
-    if "GOOGLE_API_KEY" in st.secrets:
-        google_api_key = st.secrets["GOOGLE_API_KEY"]
-    else:
-        return {"answer": "Hata: Google API Key bulunamadı.", "sources": []}
+# --- 3. EŞZAMANLI ERİŞİM (RETRIEVAL) ---
+# Ham soru araması sorgu zenginleştirmeyi beklemez: ikisi aynı anda başlar,
+# zenginleştirilmiş arama da LLM cevabı gelir gelmez başlar.
+# Havuz süreç genelindedir (oturum başına thread açılmaz).
+_retrieval_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="retrieval")
+
+def _timed(timings, name, fn, *args, **kwargs):
+    """fn'i çalıştırır, süresini timings[name] (ms) olarak yazar; izde aynı adla span açar (liste dönerse adet ile)."""
+    started = time.perf_counter()
+    with span(name) as attrs:
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            timings[name] = (time.perf_counter() - started) * 1000
+        if isinstance(result, (list, CandidateSet)): attrs["count"] = len(result)
+        return result
 
+def llm_optimize_query(question, gateway):
+    """Soruyu LLM ile zenginleştirir; hata olursa orijinal soruyu döndürür."""
     # ---  SORGU TEMİZLEYİCİ VE ÇEVİRİCİ 
     try:
-        cleaner_llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash", 
-            google_api_key=google_api_key,
-            temperature=0.0 # Yaratıcılık yok, sadece temizlik
-        )
-        
         cleaning_prompt = f"""
         GÖREV: Kullanıcı sorusunu veritabanı araması için ZENGİNLEŞTİR ve RESMİLEŞTİR.
         
@@ -79,60 +68,289 @@ def generate_answer(question, vector_store, chat_history):
         Orijinal Soru: "{question}"
         Optimize Edilmiş Sorgu:
         """
-        optimized_query = cleaner_llm.invoke(cleaning_prompt).content.strip()
-        
-        # Arama yaparken optimize edilmiş sorguyu kullanacağız!
-        # Ama cevap verirken orijinal soruyu (question) kullanacağız.
-        
+        # Yaratıcılık yok, sadece temizlik
+        return gateway.invoke(cleaning_prompt, site="query_rewrite", temperature=0.0).strip()
     except:
-        optimized_query = question # Hata olursa orijinali kullan
+        return question # Hata olursa orijinali kullan
 
-    # --- ADIM 1: GENİŞ ARAMA (RETRIEVAL) ---
+def optimize_query(question, gateway):
+    """
+    Önce yerel motor (query_expansion): dolgu silme + eş anlamlı ekleme, LLM çağrısı yok.
+    Sorudaki kelimeler korpusta/sözlükte az biliniyorsa (düşük güven) ve
+    QUERY_EXPANSION_LLM_FALLBACK açıksa eski LLM temizleyicisine düşülür.
+    """
+    if get_setting("QUERY_EXPANSION_MODE", "local") != "local":
+        return llm_optimize_query(question, gateway)
     try:
-        # Arama A: Orijinal Soru (Belki parantez içi önemlidir?)
-        docs_raw = vector_store.max_marginal_relevance_search(
-            question, k=30, fetch_k=300, lambda_mult=0.6
-        )
-        
-        # Arama B: Temiz Soru (Gürültüsüz)
-        docs_clean = vector_store.max_marginal_relevance_search(
-            optimized_query, k=30, fetch_k=300, lambda_mult=0.6
+        expansion = get_query_expander().expand(question)
+    except Exception as e:
+        print(f"Yerel Sorgu Zenginleştirme Hatası: {e}")
+        return llm_optimize_query(question, gateway)
+    if expansion.confidence < get_setting("QUERY_EXPANSION_MIN_CONFIDENCE", 0.5, float) \
+            and get_setting("QUERY_EXPANSION_LLM_FALLBACK", True, bool):
+        return llm_optimize_query(question, gateway)
+    return expansion.query
+
+def hybrid_index():
+    """
+    Dolu BM25 indeksi. Hibrit arama kapalıysa veya indeks boşsa (bu özellikten önce yüklenmiş
+    korpus, rebuild_keyword_index henüz çalışmadı) None: arama tamamen yoğun aramaya kalır.
+    """
+    index = get_bm25_index()
+    if index is None: return None
+    try: return None if index.is_empty() else index
+    except Exception as e:
+        print(f"BM25 Okuma Hatası: {e}")
+        return None
+
+def dense_limits():
+    """
+    (k, fetch_k). Anahtar kelime araması açıkken birebir token eşleşmeleri BM25'ten geldiği için
+    yoğun arama çok daha küçük aday havuzuyla yetinir.
+    """
+    hybrid = hybrid_index() is not None
+    return (get_setting("DENSE_K", 15 if hybrid else 30, int),
+            get_setting("DENSE_FETCH_K", 80 if hybrid else 300, int))
+
+def mmr_search(vector_store, query):
+    k, fetch_k = dense_limits()
+    return vector_store.max_marginal_relevance_search(query, k=k, fetch_k=fetch_k, lambda_mult=0.6)
+
+def search_candidates(vector_store, query):
+    """
+    1. aşama. Yerel MMR açıksa sadece adaylar (ID + metadata, vektör değerleri olmadan) getirilir
+    ve CandidateSet döner; değilse (veya hata olursa) Pinecone MMR ile Document listesi döner.
+    """
+    retriever = get_local_retriever(vector_store)
+    if retriever is not None:
+        try: return retriever.candidates(query, fetch_k=dense_limits()[1])
+        except Exception as e: print(f"Yerel MMR Hatası (aday): {e}")
+    return mmr_search(vector_store, query)
+
+def finish_search(vector_store, stages):
+    """2. aşama. Tüm CandidateSet'ler ID ile birleştirilip tek seferde yerel MMR'dan geçer."""
+    pending = [i for i, stage in enumerate(stages) if isinstance(stage, CandidateSet)]
+    results = list(stages)
+    if pending:
+        try:
+            selected = get_local_retriever(vector_store).select([stages[i] for i in pending], k=dense_limits()[0])
+            for i, docs in zip(pending, selected): results[i] = docs
+        except Exception as e:
+            print(f"Yerel MMR Hatası (seçim): {e}")
+            for i in pending: results[i] = None
+    return results
+
+def keyword_search(question, optimized_query):
+    """BM25 araması (ham soru + zenginleştirilmiş sorgu terimleri). Hibrit arama kapalıysa veya indeks boşsa None."""
+    index = hybrid_index()
+    if index is None: return None
+    try: return index.search(f"{question} {optimized_query}", k=get_setting("BM25_K", 20, int))
+    except Exception as e:
+        print(f"BM25 Arama Hatası: {e}")
+        return []
+
+def retrieve_documents(question, vector_store, gateway, timings):
+    """
+    (optimize_edilmiş_sorgu, aday_belgeler) döndürür.
+    Arama yaparken optimize edilmiş sorguyu kullanacağız, ama cevap verirken orijinal soruyu.
+    """
+    started = time.perf_counter()
+    # Arama A: Orijinal Soru (Belki parantez içi önemlidir?) — zenginleştirmeyle aynı anda
+    raw_future = _retrieval_pool.submit(bind(_timed), timings, "search_raw", search_candidates, vector_store, question)
+    # Arama C: Soruda "Madde 14" gibi açık atıf varsa o maddeyi metadata ile birebir getir
+    article_future = _retrieval_pool.submit(bind(_timed), timings, "search_article", find_article_docs, question, vector_store)
+
+    optimized_query = _timed(timings, "expand", optimize_query, question, gateway)
+    # Arama D: Anahtar kelime (BM25) — yerel, temiz arama ile aynı anda
+    keyword_future = _retrieval_pool.submit(bind(_timed), timings, "search_keyword", keyword_search, question, optimized_query)
+
+    # Arama B: Temiz Soru (Gürültüsüz) — sorgu hazır olur olmaz
+    if optimized_query.strip() != question.strip():
+        stage_clean = _timed(timings, "search_clean", search_candidates, vector_store, optimized_query)
+    else:
+        stage_clean = []
+    stage_raw = raw_future.result()
+
+    # İki aramanın adayları birleştirilip yerel MMR'dan bir kez geçer
+    docs_raw, docs_clean = _timed(timings, "mmr", finish_search, vector_store, [stage_raw, stage_clean])
+    if docs_raw is None: docs_raw = mmr_search(vector_store, question)
+    if docs_clean is None: docs_clean = mmr_search(vector_store, optimized_query) if stage_clean else []
+    docs_article = article_future.result()
+    docs_keyword = keyword_future.result()
+
+    # --- HİBRİT BİRLEŞTİRME (RRF) ---
+    # Yoğun ve BM25 sıralamaları sıra bazlı birleşir; hakeme sınırlı sayıda aday gider
+    if docs_keyword is None:
+        ranked_docs = docs_clean + docs_raw
+    else:
+        ranked_docs = reciprocal_rank_fusion(
+            [docs_clean, docs_raw, docs_keyword],
+            k=get_setting("RRF_K", 60, int),
+            limit=get_setting("RETRIEVAL_CANDIDATES", 25, int)
         )
 
-        # --- DEDUPLICATION (TEKRAR ENGELLEME) ---
-        seen_identifiers = set()
-        initial_docs = []
+    # --- DEDUPLICATION (TEKRAR ENGELLEME) ---
+    seen_identifiers = set()
+    initial_docs = []
+    
+    for doc in docs_article + ranked_docs:
+        unique_id = (
+            doc.metadata.get("source", ""),
+            doc.metadata.get("page", ""),
+            doc.page_content[:500]
+        )
         
-        for doc in docs_clean + docs_raw:
-            unique_id = (
-                doc.metadata.get("source", ""),
-                doc.metadata.get("page", ""),
-                doc.page_content[:500]
-            )
-            
-            if unique_id not in seen_identifiers:
-                initial_docs.append(doc)
-                seen_identifiers.add(unique_id)
+        if unique_id not in seen_identifiers:
+            initial_docs.append(doc)
+            seen_identifiers.add(unique_id)
+
+    # Değiştirilmekte/silinmekte olan belgelerin sadece güncel sürümü görünsün
+    initial_docs = filter_visible(initial_docs)
+    timings["retrieval"] = (time.perf_counter() - started) * 1000
+    record_span("retrieval", started, count=len(initial_docs), hybrid=docs_keyword is not None)
+    return optimized_query, initial_docs
 
+# --- 4. CEVAP ÖNBELLEĞİ ---
+def _question_embedding(vector_store, question):
+    # Önbellekli embedding: aynı vektör yerel MMR aramasında tekrar hesaplanmaz
+    embedding = getattr(vector_store, "embeddings", None)
+    if embedding is None: return None
+    try: return embedding.embed_query(question)
     except Exception as e:
-        return {"answer": f"Veritabanı hatası: {str(e)}", "sources": []}
+        print(f"Soru Embedding Hatası: {e}")
+        return None
+
+def _cache_lookup(question, vector_store):
+    """(önbellek, embedding, korpus_sürümü, önbellekteki_sonuç) — önbellek kapalı/hatalıysa önbellek None."""
+    started = time.perf_counter()
+    cache, embedding, corpus_version = None, None, None
+    try:
+        cache = get_answer_cache()
+        if cache:
+            corpus_version = cache.corpus_version()
+            # Birebir eşleşme embedding istemez: soru sadece ıskada (anlamsal arama için) embed edilir
+            cached, kind = cache.get_exact(question)
+            if not cached:
+                embedding = _question_embedding(vector_store, question)
+                cached, kind = cache.get(question, embedding)
+            event("answer_cache", result=kind if cached else "miss")
+            if cached:
+                elapsed = (time.perf_counter() - started) * 1000
+                return cache, embedding, corpus_version, {**cached, "cache_hit": kind, "timings": {"cache": elapsed, "total": elapsed}}
+    except Exception as e:
+        print(f"Cevap Önbelleği Hatası: {e}")
+        cache = None
+    return cache, embedding, corpus_version, None
+
+def _cache_store(cache, question, result, embedding, corpus_version):
+    if cache and not result.get("error"):
+        try: cache.put(question, {"answer": result["answer"], "sources": result["sources"]}, embedding, corpus_version)
+        except Exception as e: print(f"Cevap Önbelleği Yazma Hatası: {e}")
+
+def generate_answer(question, vector_store, chat_history):
+    """
+    Önce cevap önbelleğine (birebir / anlamsal) bakar, yoksa tüm hattı çalıştırıp kaydeder.
+    Sonuçtaki "trace" aşama span'larını ve olayları içerir (bkz. tracing.py).
+    """
+    with start_trace("answer", question_chars=len(question)) as trace:
+        result = _answer(question, vector_store, chat_history)
+    result["trace"] = trace.to_dict()
+    return result
+
+def _answer(question, vector_store, chat_history):
+    started = time.perf_counter()
+    cache, embedding, corpus_version, cached = _cache_lookup(question, vector_store)
+    if cached: return cached
+    cache_ms = (time.perf_counter() - started) * 1000
+
+    result = answer_question(question, vector_store, chat_history)
+    result.setdefault("timings", {})["cache"] = cache_ms
+    _cache_store(cache, question, result, embedding, corpus_version)
+    return result
+
+def generate_answer_stream(question, vector_store, chat_history):
+    """
+    generate_answer'ın akışlı sürümü: (token üreteci, sonuç) döndürür. Üreteç cevabı Gemini
+    ürettikçe verir (st.write_stream'e uygun); tükendiğinde sonuç sözlüğü generate_answer ile
+    aynı alanlarla (answer, sources, timings, trace, error, cache_hit) dolar.
+    """
+    result = {}
+    return _traced_tokens(question, vector_store, chat_history, result), result
+
+def _traced_tokens(question, vector_store, chat_history, result):
+    with start_trace("answer", question_chars=len(question), stream=True) as trace:
+        try: yield from _answer_tokens(question, vector_store, chat_history, result)
+        finally: result["trace"] = trace.finish()
+
+def _answer_tokens(question, vector_store, chat_history, result):
+    started = time.perf_counter()
+    cache, embedding, corpus_version, cached = _cache_lookup(question, vector_store)
+    if cached:
+        result.update(cached)
+        yield cached["answer"]
+        return
+    cache_ms = (time.perf_counter() - started) * 1000
+
+    prepared = prepare_answer(question, vector_store, chat_history)
+    if prepared.get("error"):
+        result.update(prepared)
+        yield prepared["answer"]
+        return
+
+    timings = prepared["timings"]
+    timings["cache"] = cache_ms
+    parts = []
+    answer_started = time.perf_counter()
+    try:
+        for token in get_gateway().stream(prepared["prompt"], site="answer", temperature=0.2):
+            if not parts:
+                timings["first_token"] = (time.perf_counter() - prepared["started"]) * 1000
+                event("first_token")
+            parts.append(token)
+            yield token
+    except Exception as e:
+        note = f"Cevap oluşturulurken hata: {str(e)}"
+        if parts: note = f"\n\n⚠️ Cevap yarıda kesildi ({str(e)})."
+        parts.append(note)
+        yield note
+        timings["answer"] = (time.perf_counter() - answer_started) * 1000
+        record_span("answer", answer_started, error=type(e).__name__, tokens=len(parts) - 1)
+        result.update({"answer": "".join(parts), "sources": [], "timings": timings, "error": True})
+        return
+    timings["answer"] = (time.perf_counter() - answer_started) * 1000
+    record_span("answer", answer_started, tokens=len(parts))
+
+    result.update(finish_answer("".join(parts), prepared))
+    _cache_store(cache, question, result, embedding, corpus_version)
+
+# --- 5. ANA FONKSİYON ---
+def prepare_answer(question, vector_store, chat_history):
+    """
+    Adım 1-3 (erişim, hakem, formatlama) ve cevap prompt'u. Cevap çağrısı ayrı yapılır:
+    answer_question tek seferde, generate_answer_stream akışlı.
+    {"prompt", "sources", "timings", "started"} veya hata sonucu döndürür.
+    """
+    if "GOOGLE_API_KEY" not in st.secrets:
+        return {"answer": "Hata: Google API Key bulunamadı.", "sources": [], "error": True}
+    gateway = get_gateway()
+    timings = {} # Aşama -> süre (ms)
+    started = time.perf_counter()
+
+    # --- ADIM 1: GENİŞ ARAMA (RETRIEVAL) ---
+    try:
+        optimized_query, initial_docs = retrieve_documents(question, vector_store, gateway, timings)
+    except Exception as e:
+        return {"answer": f"Veritabanı hatası: {str(e)}", "sources": [], "timings": timings, "error": True}
     
     # --- ADIM 2: RERANKING ---
     # Hakem'e ZENGİNLEŞTİRİLMİŞ SORUYU veriyoruz.
-    final_docs = rerank_documents(optimized_query, initial_docs, google_api_key)
+    final_docs = _timed(timings, "rerank", rerank_documents, optimized_query, initial_docs)
+    event("rerank", candidates=len(initial_docs), selected=len(final_docs))
 
     # --- ADIM 3: FORMATLAMA ---
-    context_text = ""
-    sources = []
-
-    for doc in final_docs:
-        content = doc.page_content.replace("\n", " ").strip()
-        filename = os.path.basename(doc.metadata.get("source", "Bilinmiyor"))
-        page = int(doc.metadata.get("page", 0)) + 1 if "page" in doc.metadata else 1
-        
-        context_text += f"\n--- KAYNAK: {filename} (Sayfa {page}) ---\n{content}\n"
-        if filename not in sources:
-            sources.append(filename)
+    # Belge başına tek başlık, örtüşmeler birleşik, toplam boyut token bütçesiyle sınırlı
+    context_text, sources = _timed(timings, "context", build_context, final_docs)
+    event("context", chars=len(context_text), sources=len(sources))
     # ==========================================
     # DEBUG (HATA AYIKLAMA) PENCERESİ
     # ==========================================
@@ -144,12 +362,6 @@ def generate_answer(question, vector_store, chat_history):
     # ==========================================
 
     # --- ADIM 4: CEVAPLAYICI ---
-    llm_answer = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash", 
-        google_api_key=google_api_key,
-        temperature=0.2 #  esneklik 
-    )
-    
     final_template = f"""
     Sen Bursa Uludağ Üniversitesi mevzuat asistanısın. 
     Elinizdeki belgeleri  kullanarak soruya en doğru, resmi ve net cevabı ver.
@@ -182,17 +394,25 @@ def generate_answer(question, vector_store, chat_history):
     CEVAP:
     """
     
-    try:
-        answer = llm_answer.invoke(final_template).content
-        
-        # Basit negatif kontrolü
-        negative_signals = ["bilgi bulunmamaktadır", "bilgiye rastlanmamıştır", "yer almamaktadır"]
-        if any(signal in answer.lower() for signal in negative_signals):
-            final_sources = []
-        else:
-            final_sources = sources[:5]
+    return {"prompt": final_template, "sources": sources, "timings": timings, "started": started}
 
-        return {"answer": answer, "sources": final_sources}
+def finish_answer(answer, prepared):
+    timings = prepared["timings"]
+    # Basit negatif kontrolü
+    negative_signals = ["bilgi bulunmamaktadır", "bilgiye rastlanmamıştır", "yer almamaktadır"]
+    if any(signal in answer.lower() for signal in negative_signals):
+        final_sources = []
+    else:
+        final_sources = prepared["sources"][:5]
 
+    timings["total"] = (time.perf_counter() - prepared["started"]) * 1000
+    return {"answer": answer, "sources": final_sources, "timings": timings}
+
+def answer_question(question, vector_store, chat_history):
+    prepared = prepare_answer(question, vector_store, chat_history)
+    if prepared.get("error"): return prepared
+    try:
+        answer = _timed(prepared["timings"], "answer", get_gateway().invoke, prepared["prompt"], site="answer", temperature=0.2) #  esneklik 
+        return finish_answer(answer, prepared)
     except Exception as e:
-        return {"answer": f"Cevap oluşturulurken hata: {str(e)}", "sources": []}
\ No newline at end of file
+        return {"answer": f"Cevap oluşturulurken hata: {str(e)}", "sources": [], "timings": prepared["timings"], "error": True}
\ No newline at end of file
@@ -0,0 +1,92 @@
+import os
+import socket
+import sys
+import threading
+import time
+import job_queue
+from settings import get_setting
+
+# --- ARKA PLAN YÜKLEME İŞÇİSİ ---
+# Kullanım:  python ingest_worker.py          (sürekli çalışır, kuyruğu dinler)
+#            python ingest_worker.py --once   (kuyruktaki işler bitince çıkar)
+# Admin paneli, canlı bir işçi yoksa bu süreci --once ile kendisi başlatır.
+# Süreç öldürülürse iş "running" olarak kalır; heartbeat'i eskiyince başka bir işçi
+# işi devralır ve dosya/sayfa/parça checkpoint'lerinden devam eder: biten dosyalar atlanır,
+# okunmuş sayfalar için Vision çalışmaz, yazılmış batch'lerdeki parçalar tekrar yüklenmez.
+
+HEARTBEAT_SECONDS = 10
+
+class JobReporter:
+    """process_pdfs çıktısını Streamlit yerine iş kuyruğuna (ve konsola) yazar."""
+    def __init__(self, checkpoint):
+        self.checkpoint = checkpoint
+
+    def message(self, level, text):
+        print(f"[{self.checkpoint.job_id}] {text}")
+        self.checkpoint.log(level, text)
+
+    def start_file(self, file_name, total_pages): pass
+    def page_done(self, fraction): pass     # Sayfa ilerlemesi checkpoint.save_page ile yazılır
+    def upload_status(self, text): pass
+    def upload_progress(self, fraction): pass
+    def close(self): pass
+
+def _heartbeat_loop(worker_id, current, stop):
+    # Uzun Vision/yükleme adımlarında da işin sahipli kaldığı bilinsin
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try:
+            job_queue.worker_heartbeat(worker_id)
+            if current.get("job"): current["job"].heartbeat()
+        except Exception as e:
+            print(f"Heartbeat Hatası: {e}")
+
+def run_job(checkpoint):
+    from data_ingestion import process_pdfs
+    reporter = JobReporter(checkpoint)
+    try:
+        result = process_pdfs(
+            checkpoint.files(), use_vision_mode=checkpoint.use_vision,
+            reporter=reporter, checkpoint=checkpoint
+        )
+    except Exception as e:
+        checkpoint.finish(False, f"Hata: {e}")
+        return
+
+    # Başarı dosya durumlarından okunur: process_pdfs hiç parça üretmeyen (boş / sadece
+    # görsel) dosyalarda da None döner, bağlantı hatasında ise dosyalar "done" olmaz
+    failed = [name for name, status in checkpoint.file_statuses().items() if status != "done"]
+    if failed:
+        checkpoint.finish(False, f"{len(failed)} dosya tamamlanamadı: {', '.join(failed[:3])}")
+    elif result is None:
+        checkpoint.finish(True, "Tamamlandı (yüklenecek parça bulunamadı)")
+    else:
+        checkpoint.finish(True, "Tamamlandı")
+
+def main(once=False):
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    poll_seconds = get_setting("INGEST_POLL_SECONDS", 3, float)
+    current = {"job": None}
+    stop = threading.Event()
+
+    job_queue.init_db()
+    job_queue.worker_heartbeat(worker_id)
+    threading.Thread(target=_heartbeat_loop, args=(worker_id, current, stop), daemon=True).start()
+    print(f"İşçi başladı: {worker_id}")
+
+    try:
+        while True:
+            checkpoint = job_queue.claim_next_job(worker_id)
+            if checkpoint is None:
+                if once: break
+                time.sleep(poll_seconds)
+                continue
+            print(f"İş alındı: {checkpoint.job_id}")
+            current["job"] = checkpoint
+            run_job(checkpoint)
+            current["job"] = None
+    finally:
+        stop.set()
+        job_queue.remove_worker(worker_id)
+
+if __name__ == "__main__":
+    main(once="--once" in sys.argv)
@@ -0,0 +1,149 @@
+import queue
+import threading
+import time
+import traceback
+from rate_limit import TokenBucket, call_with_retry
+from upsert_engine import UpsertEngine
+
+# --- AŞAMALI YÜKLEME HATTI (EMBED -> UPSERT) ---
+# PDF ayrıştırma ana thread'de (Streamlit + fitz) kalır; embedding ve Pinecone yazımı
+# arka plan thread'lerinde çalışır. Aşamalar arası kuyruklar SINIRLI olduğu için
+# ayrıştırma çok önde giderse add() bekler: bellek, yüklenen PDF sayısından bağımsızdır.
+# 1. dosyanın embed/upsert işlemi, 2. dosyanın ayrıştırılmasıyla aynı anda yürür.
+
+_STOP = object()
+
+class UploadPipeline:
+    """
+    add(id, doc) ile parça alır, büyük batch'ler halinde embed eder ve UpsertEngine ile
+    eşzamanlı olarak index'e yazar.
+    after_uploads(fn): o ana kadar eklenen tüm parçalar yazıldıktan sonra fn(ok) çağrılır
+    (ok=False ise arada başarısız batch vardır; eski ID silme gibi işlemler atlanmalı).
+    on_uploaded(records): yazılan her batch'ten sonra çağrılır (iş checkpoint'i için).
+    Thread'ler Streamlit API'sine dokunmaz; ilerleme sayaçlardan okunur.
+    """
+    def __init__(self, embedding_model, index, text_key="text", batch_size=100, max_pending_batches=4,
+                 upsert_concurrency=4, upsert_rpm=1200, embed_rpm=300, max_retries=5, on_uploaded=None):
+        self.embedding_model = embedding_model
+        self.index = index
+        self.text_key = text_key
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.engine = UpsertEngine(index, concurrency=upsert_concurrency,
+                                   requests_per_minute=upsert_rpm, max_retries=max_retries, on_written=on_uploaded)
+        self.embed_bucket = TokenBucket.per_minute(embed_rpm)
+
+        self.submitted = 0
+        self.embed_failed = 0
+        self.errors = []
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+        self._buffer = []
+        self._closed = False
+        self._failed_at_marker = 0
+        self._embed_queue = queue.Queue(maxsize=max_pending_batches)
+        self._upsert_queue = queue.Queue(maxsize=max_pending_batches)
+        self._threads = [
+            threading.Thread(target=self._embed_worker, name="pipeline-embed", daemon=True),
+            threading.Thread(target=self._upsert_worker, name="pipeline-upsert", daemon=True),
+        ]
+        for t in self._threads: t.start()
+
+    # --- Ana thread tarafı ---
+    def add(self, chunk_id, doc):
+        self._buffer.append((chunk_id, doc))
+        self.submitted += 1
+        if len(self._buffer) >= self.batch_size: self._flush()
+
+    def after_uploads(self, fn):
+        self._flush()
+        self._embed_queue.put(("callback", fn))
+
+    def close(self, timeout=None):
+        """Kalan parçaları gönderir ve thread'lerin bitmesini bekler (timeout=0: beklemez)."""
+        if not self._closed:
+            self._closed = True
+            self._flush()
+            self._embed_queue.put(_STOP)
+        for t in self._threads: t.join(timeout)
+
+    def is_alive(self):
+        return any(t.is_alive() for t in self._threads)
+
+    @property
+    def uploaded(self):
+        return self.engine.upserted
+
+    @property
+    def failed(self):
+        return self.embed_failed + self.engine.failed
+
+    def throughput(self):
+        """Uçtan uca parça/saniye (embedding dahil)."""
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return self.uploaded / elapsed if elapsed > 0 else 0.0
+
+    def _flush(self):
+        if self._buffer:
+            self._embed_queue.put(("batch", self._buffer))
+            self._buffer = []
+
+    # --- Arka plan thread'leri ---
+    def _embed_worker(self):
+        while True:
+            item = self._embed_queue.get()
+            if item is _STOP:
+                self._upsert_queue.put(_STOP)
+                return
+            kind, payload = item
+            if kind == "batch":
+                texts = [doc.page_content for _, doc in payload]
+                try:
+                    vectors = call_with_retry(lambda: self.embedding_model.embed_documents(texts),
+                                              self.max_retries, self.embed_bucket, base=2.0)
+                    self._upsert_queue.put(("batch", (payload, vectors)))
+                except Exception as e:
+                    # Hata kaydı da sırayı korumak için upsert kuyruğundan geçer
+                    self._upsert_queue.put(("failed", (len(payload), f"Embedding Hatası: {e}")))
+            else:
+                self._upsert_queue.put(item)
+
+    def _upsert_worker(self):
+        while True:
+            item = self._upsert_queue.get()
+            if item is _STOP:
+                self.engine.close()
+                self.finished_at = time.monotonic()
+                return
+            kind, payload = item
+            if kind == "batch":
+                items, vectors = payload
+                records = [
+                    {"id": chunk_id, "values": values, "metadata": {**doc.metadata, self.text_key: doc.page_content}}
+                    for (chunk_id, doc), values in zip(items, vectors)
+                ]
+                self.engine.submit(records)
+            elif kind == "failed":
+                self._record_failure(*payload)
+            else:
+                # Önceki tüm batch'ler bitmeden callback çalışmaz
+                self.engine.drain()
+                failed_now = self.failed
+                ok = failed_now == self._failed_at_marker
+                self._failed_at_marker = failed_now
+                try: payload(ok)
+                except Exception:
+                    self.errors.append(traceback.format_exc(limit=2))
+
+    def _record_failure(self, count, message):
+        print(message)
+        self.embed_failed += count
+        self.errors.append(message)
+
+    def error_messages(self):
+        """Embedding hataları + batch bazında upsert hataları."""
+        return self.errors + [
+            f"Pinecone Batch Hatası ({r.count} parça, ilk ID {r.first_id}): {r.error}"
+            for r in self.engine.failed_batches()
+        ]
@@ -0,0 +1,331 @@
+import contextlib
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from settings import get_setting
+
+# --- KALICI İŞ KUYRUĞU (SQLite) ---
+# Admin paneli yüklenen PDF'leri diske yazıp buraya bir iş (job) olarak ekler,
+# ayrı bir süreç (ingest_worker.py) işleri sırayla alıp işler.
+# Her iş dosya, sayfa ve yüklenen parça bazında checkpoint tutar: yeniden başlatılan iş,
+# Vision okumasını ve önceki çalıştırmada yazılmış parçaların embed/upsert'ünü tekrarlamaz.
+
+STALE_AFTER_SECONDS = 120 # Bu süre heartbeat gelmeyen "running" iş sahipsiz sayılır
+
+def _db_path():
+    return get_setting("JOB_DB_PATH", os.path.join(".cache", "jobs.sqlite3"))
+
+def _files_dir():
+    return get_setting("JOB_FILES_DIR", os.path.join(".cache", "jobs"))
+
+def _connect():
+    path = _db_path()
+    folder = os.path.dirname(path)
+    if folder: os.makedirs(folder, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+@contextlib.contextmanager
+def _transaction():
+    """
+    Bağlantı açar; blok bitince commit (hata olursa rollback) eder ve bağlantıyı kapatır.
+    sqlite3 bağlantısının kendi "with" bloğu bağlantıyı kapatmaz (sürekli çalışan işçide sızıntı).
+    """
+    conn = _connect()
+    try:
+        with conn: yield conn
+    finally:
+        conn.close()
+
+def init_db():
+    with _transaction() as conn:
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,            -- queued / running / done / failed
+                use_vision INTEGER NOT NULL DEFAULT 0,
+                created_by TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                worker_id TEXT,
+                heartbeat REAL,
+                message TEXT
+            );
+            CREATE TABLE IF NOT EXISTS job_files (
+                job_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                file_name TEXT NOT NULL,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending', -- pending / running / done / failed
+                title TEXT,
+                pages_total INTEGER NOT NULL DEFAULT 0,
+                pages_done INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                PRIMARY KEY (job_id, file_name)
+            );
+            CREATE TABLE IF NOT EXISTS job_pages (
+                job_id TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                page_index INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (job_id, file_name, page_index)
+            );
+            CREATE TABLE IF NOT EXISTS job_chunks (
+                job_id TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                PRIMARY KEY (job_id, file_name, chunk_id)
+            );
+            CREATE TABLE IF NOT EXISTS job_messages (
+                job_id TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                level TEXT NOT NULL,
+                text TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS workers (
+                id TEXT PRIMARY KEY,
+                pid INTEGER,
+                heartbeat REAL NOT NULL
+            );
+        """)
+
+# --- 1. İŞ EKLEME / SORGULAMA (Admin paneli) ---
+def enqueue_job(files, use_vision=False, created_by=None):
+    """
+    files: [(dosya_adı, bayt)] listesi. Dosyalar diske yazılır, iş kuyruğa eklenir.
+    İş ID'si döner.
+    """
+    init_db()
+    job_id = uuid.uuid4().hex[:12]
+    job_dir = os.path.join(_files_dir(), job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    now = time.time()
+    with _transaction() as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, status, use_vision, created_by, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+            (job_id, int(use_vision), created_by, now, now)
+        )
+        for position, (file_name, data) in enumerate(files):
+            path = os.path.join(job_dir, f"{position:03d}.pdf")
+            with open(path, "wb") as f: f.write(data)
+            conn.execute(
+                "INSERT INTO job_files (job_id, position, file_name, path) VALUES (?, ?, ?, ?)",
+                (job_id, position, file_name, path)
+            )
+    return job_id
+
+def list_jobs(limit=10):
+    """Son işler, dosya bazında ilerleme bilgisiyle birlikte."""
+    init_db()
+    with _transaction() as conn:
+        jobs = [dict(r) for r in conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))]
+        for job in jobs:
+            job["files"] = [dict(r) for r in conn.execute(
+                "SELECT file_name, status, title, pages_total, pages_done, error FROM job_files WHERE job_id = ? ORDER BY position",
+                (job["id"],)
+            )]
+            job["messages"] = [dict(r) for r in conn.execute(
+                "SELECT level, text FROM job_messages WHERE job_id = ? ORDER BY created_at DESC LIMIT 5",
+                (job["id"],)
+            )]
+    return jobs
+
+def has_active_jobs():
+    init_db()
+    with _transaction() as conn:
+        row = conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()
+    return row[0] > 0
+
+def live_worker_count(max_age=30):
+    init_db()
+    with _transaction() as conn:
+        row = conn.execute("SELECT COUNT(*) FROM workers WHERE heartbeat > ?", (time.time() - max_age,)).fetchone()
+    return row[0]
+
+def retry_job(job_id):
+    """Başarısız işi tekrar kuyruğa alır; biten dosyalar ve okunmuş sayfalar korunur."""
+    now = time.time()
+    with _transaction() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', message = NULL, worker_id = NULL, updated_at = ? WHERE id = ? AND status = 'failed'",
+            (now, job_id)
+        )
+        conn.execute("UPDATE job_files SET status = 'pending' WHERE job_id = ? AND status = 'failed'", (job_id,))
+
+# --- 2. WORKER TARAFI ---
+def worker_heartbeat(worker_id):
+    with _transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO workers (id, pid, heartbeat) VALUES (?, ?, ?)",
+            (worker_id, os.getpid(), time.time())
+        )
+
+def remove_worker(worker_id):
+    with _transaction() as conn:
+        conn.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+def claim_next_job(worker_id):
+    """
+    Sıradaki işi atomik olarak sahiplenir. Önce yarıda kalmış (heartbeat'i eskimiş)
+    işler, sonra kuyruktaki en eski iş alınır. İş yoksa None.
+    """
+    init_db()
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            """SELECT id FROM jobs
+               WHERE status = 'queued' OR (status = 'running' AND (heartbeat IS NULL OR heartbeat < ?))
+               ORDER BY status = 'queued', created_at LIMIT 1""",
+            (now - STALE_AFTER_SECONDS,)
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', worker_id = ?, heartbeat = ?, updated_at = ? WHERE id = ?",
+            (worker_id, now, now, row["id"])
+        )
+        conn.execute("COMMIT")
+        return JobCheckpoint(row["id"])
+    finally:
+        conn.close()
+
+class StoredFile:
+    """İş dizinindeki PDF; process_pdfs için UploadedFile ile aynı arayüz (name, getvalue)."""
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+
+    def getvalue(self):
+        with open(self.path, "rb") as f: return f.read()
+
+class JobCheckpoint:
+    """
+    Tek bir işin durum ve checkpoint kayıtları. process_pdfs bu nesneyi alırsa:
+    biten dosyaları atlar, kaydedilmiş sayfa metinlerini ve başlığı tekrar kullanır.
+    Her çağrı kendi bağlantısını açar (yükleme hattı thread'lerinden de çağrılabilir).
+    """
+    def __init__(self, job_id):
+        self.job_id = job_id
+        with _transaction() as conn:
+            job = conn.execute("SELECT use_vision FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        self.use_vision = bool(job["use_vision"]) if job else False
+
+    def files(self):
+        with _transaction() as conn:
+            rows = conn.execute(
+                "SELECT file_name, path FROM job_files WHERE job_id = ? ORDER BY position", (self.job_id,)
+            ).fetchall()
+        return [StoredFile(r["file_name"], r["path"]) for r in rows]
+
+    def heartbeat(self):
+        now = time.time()
+        with _transaction() as conn:
+            conn.execute("UPDATE jobs SET heartbeat = ?, updated_at = ? WHERE id = ?", (now, now, self.job_id))
+
+    def finish(self, ok, message=""):
+        now = time.time()
+        with _transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, updated_at = ? WHERE id = ?",
+                ("done" if ok else "failed", message, now, self.job_id)
+            )
+            if ok:
+                # Sayfa checkpoint'leri ve dosyalar artık gereksiz
+                conn.execute("DELETE FROM job_pages WHERE job_id = ?", (self.job_id,))
+                conn.execute("DELETE FROM job_chunks WHERE job_id = ?", (self.job_id,))
+        if ok: shutil.rmtree(os.path.join(_files_dir(), self.job_id), ignore_errors=True)
+
+    def log(self, level, text):
+        with _transaction() as conn:
+            conn.execute(
+                "INSERT INTO job_messages (job_id, created_at, level, text) VALUES (?, ?, ?, ?)",
+                (self.job_id, time.time(), level, text)
+            )
+
+    # --- Dosya checkpoint'leri ---
+    def is_file_done(self, file_name):
+        with _transaction() as conn:
+            row = conn.execute(
+                "SELECT status FROM job_files WHERE job_id = ? AND file_name = ?", (self.job_id, file_name)
+            ).fetchone()
+        return row is not None and row["status"] == "done"
+
+    def start_file(self, file_name, pages_total):
+        with _transaction() as conn:
+            conn.execute(
+                "UPDATE job_files SET status = 'running', pages_total = ?, error = NULL WHERE job_id = ? AND file_name = ?",
+                (pages_total, self.job_id, file_name)
+            )
+
+    def mark_file(self, file_name, status, error=None):
+        with _transaction() as conn:
+            conn.execute(
+                "UPDATE job_files SET status = ?, error = ? WHERE job_id = ? AND file_name = ?",
+                (status, error, self.job_id, file_name)
+            )
+
+    def file_statuses(self):
+        with _transaction() as conn:
+            rows = conn.execute("SELECT file_name, status FROM job_files WHERE job_id = ?", (self.job_id,)).fetchall()
+        return {r["file_name"]: r["status"] for r in rows}
+
+    def saved_title(self, file_name):
+        with _transaction() as conn:
+            row = conn.execute(
+                "SELECT title FROM job_files WHERE job_id = ? AND file_name = ?", (self.job_id, file_name)
+            ).fetchone()
+        return row["title"] if row else None
+
+    def save_title(self, file_name, title):
+        with _transaction() as conn:
+            conn.execute(
+                "UPDATE job_files SET title = ? WHERE job_id = ? AND file_name = ?", (title, self.job_id, file_name)
+            )
+
+    # --- Sayfa checkpoint'leri ---
+    def saved_pages(self, file_name):
+        with _transaction() as conn:
+            rows = conn.execute(
+                "SELECT page_index, text FROM job_pages WHERE job_id = ? AND file_name = ?", (self.job_id, file_name)
+            ).fetchall()
+        return {r["page_index"]: r["text"] for r in rows}
+
+    def save_page(self, file_name, page_index, text):
+        with _transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO job_pages (job_id, file_name, page_index, text) VALUES (?, ?, ?, ?)",
+                (self.job_id, file_name, page_index, text)
+            )
+            conn.execute(
+                """UPDATE job_files SET pages_done = (SELECT COUNT(*) FROM job_pages WHERE job_id = ? AND file_name = ?)
+                   WHERE job_id = ? AND file_name = ?""",
+                (self.job_id, file_name, self.job_id, file_name)
+            )
+            conn.execute("UPDATE jobs SET heartbeat = ?, updated_at = ? WHERE id = ?", (time.time(), time.time(), self.job_id))
+
+    # --- Parça checkpoint'leri (batch bazında yazılan vektör ID'leri) ---
+    def uploaded_chunks(self, file_name):
+        with _transaction() as conn:
+            rows = conn.execute(
+                "SELECT chunk_id FROM job_chunks WHERE job_id = ? AND file_name = ?", (self.job_id, file_name)
+            ).fetchall()
+        return {r["chunk_id"] for r in rows}
+
+    def save_chunks(self, file_name, chunk_ids):
+        with _transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO job_chunks (job_id, file_name, chunk_id) VALUES (?, ?, ?)",
+                [(self.job_id, file_name, chunk_id) for chunk_id in chunk_ids]
+            )
+
+    def clear_chunks(self, file_name):
+        """Yarım yükleme geri alındığında: kayıtlı parçalar artık index'te yok."""
+        with _transaction() as conn:
+            conn.execute("DELETE FROM job_chunks WHERE job_id = ? AND file_name = ?", (self.job_id, file_name))
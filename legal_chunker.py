@@ -0,0 +1,214 @@
+import bisect
+import re
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# --- MEVZUAT YAPISINA GÖRE PARÇALAMA (BÖLÜM / MADDE / FIKRA / BENT) ---
+# Yönetmelikler madde madde okunur: her MADDE tek parça olur, sayfa sonunu aşan
+# maddeler birleştirilir. Sadece çok uzun maddeler fıkra -> bent -> karakter sırasıyla bölünür.
+# Parçalar arasında overlap YOK: daha az parça, daha ucuz embedding, tam "MADDE n" eşleşmesi.
+
+ARTICLE_RE = re.compile(
+    r"^[ \t]*(?P<prefix>(?:GEÇİCİ|Geçici|EK|Ek)[ \t]+)?(?:MADDE|Madde)[ \t]+(?P<no>\d+)[ \t]*[-–—:]",
+    re.MULTILINE
+)
+SECTION_RE = re.compile(r"^[ \t]*[A-ZÇĞİÖŞÜ]+(?:[ \t]+[A-ZÇĞİÖŞÜ]+)?[ \t]+BÖLÜM[ \t]*$", re.MULTILINE)
+PARAGRAPH_RE = re.compile(r"(?=^[ \t]*\(\d+\)[ \t])", re.MULTILINE)   # fıkra: (1) (2) ...
+CLAUSE_RE = re.compile(r"(?=^[ \t]*[a-zçğıöşü]\)[ \t])", re.MULTILINE)  # bent: a) b) ...
+
+class LegalChunker:
+    """
+    Sayfa Document'lerini sırayla alır (feed), madde bazlı parçalar üretir.
+    Bellekte sadece henüz bitmemiş madde(ler)in metni tutulur.
+
+    Sayfa metadata'sı (source, official_title, complexity...) parçalara taşınır;
+    ek olarak article, article_title, section, page (başlangıç) ve page_end yazılır.
+    """
+    def __init__(self, title, max_chars=4000, max_buffer_chars=20000):
+        self.title = title
+        self.max_chars = max_chars
+        self.max_buffer_chars = max_buffer_chars
+        self.section = ""
+        self._text = ""
+        self._page_starts = []   # (buffer offset) -> sayfa numarası eşlemesi
+        self._page_meta = []
+        self._fallback_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=max_chars, chunk_overlap=0,
+            separators=["\n\n", "\n", ". ", " ", ""],
+            keep_separator="end"
+        )
+
+    # --- Dışa açık API ---
+    def feed(self, page_doc):
+        """Bir sayfa ekler, tamamlanan maddeleri parça olarak döndürür."""
+        if self._text and not self._text.endswith("\n"): self._text += "\n"
+        self._page_starts.append(len(self._text))
+        self._page_meta.append(page_doc.metadata)
+        self._text += page_doc.page_content
+
+        boundaries = self._boundaries()
+        if len(boundaries) >= 2:
+            # Son sınırdan sonrası bir sonraki sayfada devam edebilir, tamponda kalır
+            return self._emit_until(boundaries, boundaries[-1][0])
+        if not boundaries and len(self._text) > self.max_buffer_chars:
+            # Madde yapısı olmayan uzun metin (ek, tablo): boyuta göre boşalt
+            return self._emit_plain(len(self._text))
+        if len(boundaries) == 1 and len(self._text) - boundaries[0][0] > self.max_buffer_chars:
+            # Son maddeden sonra gelen uzun ek/tablo: tamponu sınırsız büyütme
+            return self._emit_until(boundaries, len(self._text))
+        return []
+
+    def finish(self):
+        """Tampondaki son madde(ler)i döndürür."""
+        if not self._text.strip(): return []
+        boundaries = self._boundaries()
+        if not boundaries: return self._emit_plain(len(self._text))
+        return self._emit_until(boundaries, len(self._text))
+
+    # --- Sınır tespiti ---
+    def _boundaries(self):
+        """
+        [(başlangıç, madde_no, madde_başlığı, bölüm)] listesi.
+        Başlangıç, MADDE satırının üstündeki madde başlığını ve varsa BÖLÜM başlığını da kapsar:
+            İKİNCİ BÖLÜM          <- bölüm
+            Öğrenci İşleri        <- bölüm adı
+            Kayıt                 <- madde başlığı
+            MADDE 5 – (1) ...
+        """
+        result = []
+        for match in ARTICLE_RE.finditer(self._text):
+            before = self._text[:match.start()].rstrip("\n")
+            heading_lines = []
+            for line in reversed(before.split("\n")[-4:]):
+                stripped = line.strip()
+                if not stripped or len(stripped) > 80 or stripped.endswith((".", ";", ":", ",")): break
+                heading_lines.insert(0, line)
+
+            article_title, section = "", None
+            section_idx = next((i for i, l in enumerate(heading_lines) if SECTION_RE.match(l)), None)
+            if section_idx is not None:
+                heading_lines = heading_lines[section_idx:]
+                names = [l.strip() for l in heading_lines]
+                if len(names) >= 3:
+                    section, article_title = " - ".join(names[:-1]), names[-1]
+                else:
+                    section = " - ".join(names)
+            elif heading_lines:
+                heading_lines = heading_lines[-1:]
+                article_title = heading_lines[0].strip()
+
+            start = match.start()
+            if heading_lines:
+                start = max(len(before) - sum(len(l) + 1 for l in heading_lines) + 1, 0)
+            if result and start <= result[-1][0]: start = match.start()
+
+            prefix = (match.group("prefix") or "").strip().upper()
+            article_no = f"{prefix} {match.group('no')}".strip()
+            result.append((start, article_no, article_title, section))
+        return result
+
+    # --- Parça üretimi ---
+    def _emit_until(self, boundaries, end):
+        chunks = []
+        first_start = boundaries[0][0]
+        if first_start > 0:
+            chunks.extend(self._make_chunks(0, first_start, None, "", self.section))
+
+        for i, (start, article_no, article_title, section) in enumerate(boundaries):
+            if start >= end: break
+            if section: self.section = section
+            stop = boundaries[i + 1][0] if i + 1 < len(boundaries) else len(self._text)
+            stop = min(stop, end)
+            chunks.extend(self._make_chunks(start, stop, article_no, article_title, self.section))
+        self._consume(end)
+        return chunks
+
+    def _emit_plain(self, end):
+        chunks = self._make_chunks(0, end, None, "", self.section)
+        self._consume(end)
+        return chunks
+
+    def _consume(self, end):
+        """Tamponun [0, end) kısmını atar, sayfa ofsetlerini kaydırır."""
+        keep_from = max(bisect.bisect_right(self._page_starts, end) - 1, 0)
+        self._text = self._text[end:]
+        self._page_starts = [max(p - end, 0) for p in self._page_starts[keep_from:]]
+        self._page_meta = self._page_meta[keep_from:]
+
+    def _page_at(self, offset):
+        idx = max(bisect.bisect_right(self._page_starts, offset) - 1, 0)
+        return idx, self._page_meta[idx]
+
+    def _make_chunks(self, start, stop, article_no, article_title, section):
+        text = self._text[start:stop].strip()
+        if not text: return []
+
+        parts = [text] if len(text) <= self.max_chars else self._split_large(text)
+        chunks = []
+        cursor = start
+        for part_no, part in enumerate(parts):
+            part_offset = self._text.find(part[:50], cursor, stop)
+            if part_offset < 0: part_offset = cursor
+            first_idx, first_meta = self._page_at(part_offset)
+            last_idx, last_meta = self._page_at(part_offset + max(len(part) - 1, 0))
+            cursor = part_offset + len(part)
+
+            metadata = dict(first_meta)
+            metadata.pop("page_hash", None)
+            metadata["page_end"] = last_meta["page"]
+            metadata["section"] = section
+            if any(m.get("complexity") == "vision" for m in self._page_meta[first_idx : last_idx + 1]):
+                metadata["complexity"] = "vision"
+            if article_no:
+                metadata["article"] = article_no
+                metadata["article_title"] = article_title
+            if len(parts) > 1: metadata["part"] = part_no + 1
+
+            chunks.append(Document(page_content=self._header(metadata, article_no, article_title) + part, metadata=metadata))
+        return chunks
+
+    def _header(self, metadata, article_no, article_title):
+        page_text = str(metadata["page"])
+        if metadata["page_end"] != metadata["page"]: page_text += f"-{metadata['page_end']}"
+        header = f"BELGE: {self.title}\nSAYFA: {page_text}\n"
+        if metadata["section"]: header += f"BÖLÜM: {metadata['section']}\n"
+        if article_no:
+            header += f"MADDE {article_no}"
+            if article_title: header += f" ({article_title})"
+            if metadata.get("part"): header += f" [Parça {metadata['part']}]"
+            header += "\n"
+        return header + "---\n"
+
+    def _split_large(self, text):
+        """Uzun maddeyi önce fıkralara, sonra bentlere, en son karakter sınırına göre böler."""
+        for pattern in (PARAGRAPH_RE, CLAUSE_RE):
+            pieces = [p for p in pattern.split(text) if p.strip()]
+            if len(pieces) > 1:
+                parts = []
+                for packed in self._pack(pieces):
+                    if len(packed) <= self.max_chars: parts.append(packed)
+                    else: parts.extend(self._split_large_fallback(packed, pattern))
+                return parts
+        return self._fallback_splitter.split_text(text)
+
+    def _split_large_fallback(self, text, used_pattern):
+        if used_pattern is PARAGRAPH_RE:
+            pieces = [p for p in CLAUSE_RE.split(text) if p.strip()]
+            if len(pieces) > 1:
+                parts = []
+                for packed in self._pack(pieces):
+                    if len(packed) <= self.max_chars: parts.append(packed)
+                    else: parts.extend(self._fallback_splitter.split_text(packed))
+                return parts
+        return self._fallback_splitter.split_text(text)
+
+    def _pack(self, pieces):
+        """Ardışık parçaları max_chars'ı aşmadan birleştirir (overlap yok)."""
+        packed, current = [], ""
+        for piece in pieces:
+            if current and len(current) + len(piece) > self.max_chars:
+                packed.append(current.strip())
+                current = ""
+            current += piece
+        if current.strip(): packed.append(current.strip())
+        return packed
@@ -0,0 +1,305 @@
+import collections
+import functools
+import threading
+import time
+from rate_limit import backoff_delay, is_retryable_error
+from settings import get_setting
+from tracing import event
+
+# --- ORTAK LLM GEÇİDİ (GATEWAY) ---
+# Tüm Gemini çağrıları (sorgu temizleme, reranker, cevap, başlık tespiti, Vision) buradan geçer:
+#   - İstemciler süreç genelinde bir kez oluşturulur ve tekrar kullanılır (bağlantı havuzu).
+#   - Global eşzamanlılık sınırı: aynı süreçteki tüm Streamlit oturumları ortak semafor kullanır.
+#   - Tekrar deneme ÇAĞRI bazındadır (backoff + jitter); tek bir 503 tüm hattı baştan çalıştırmaz.
+#   - Devre kesici (circuit breaker): art arda geçici hatalarda bir süre hızlıca hata döner.
+#     Her çağrı noktasının kendi devresi vardır: toplu Vision yüklemesindeki 429'lar
+#     kullanıcı cevaplarının devresini açmaz.
+#   - Çağrı noktası (site) bazında token ve gecikme istatistikleri tutulur.
+#   - Her çağrı / tekrar deneme geçerli ize (tracing.py) olay olarak yazılır (prompt ve cevap boyutu dahil).
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+class CircuitOpenError(RuntimeError):
+    """Devre açıkken yapılan çağrılar beklemeden bu hatayı alır."""
+
+class CircuitBreaker:
+    """
+    closed -> (art arda failure_threshold geçici hata) -> open -> (reset_seconds) -> half-open
+    half-open'da tek deneme çağrısı geçer: başarılıysa closed, değilse tekrar open.
+    """
+    def __init__(self, failure_threshold=5, reset_seconds=30.0, clock=time.monotonic):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_seconds = float(reset_seconds)
+        self.clock = clock
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None: return "closed"
+            if self.clock() - self._opened_at >= self.reset_seconds: return "half-open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None: return True
+            if self.clock() - self._opened_at < self.reset_seconds: return False
+            if self._trial_running: return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = self.clock()
+            self._trial_running = False
+
+class SiteStats:
+    """Bir çağrı noktasının sayaçları; gecikmeler son N çağrı için tutulur."""
+    def __init__(self, window=500):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latencies = collections.deque(maxlen=window)
+        self.first_token_latencies = collections.deque(maxlen=window) # Sadece akışlı çağrılar
+
+    def snapshot(self):
+        def pct(values, p):
+            values = sorted(values)
+            if not values: return 0.0
+            return values[min(len(values) - 1, int(p * len(values)))]
+        return {
+            "calls": self.calls, "errors": self.errors, "retries": self.retries,
+            "input_tokens": self.input_tokens, "output_tokens": self.output_tokens,
+            "p50_ms": pct(self.latencies, 0.50) * 1000, "p95_ms": pct(self.latencies, 0.95) * 1000,
+            "ttft_p50_ms": pct(self.first_token_latencies, 0.50) * 1000,
+        }
+
+def _langchain_usage(message):
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("input_tokens", 0) or 0, usage.get("output_tokens", 0) or 0
+
+def _chunk_text(chunk):
+    # Gemini bazen içeriği parça listesi olarak döndürür
+    content = getattr(chunk, "content", "")
+    if isinstance(content, list):
+        return "".join(part if isinstance(part, str) else part.get("text", "") for part in content)
+    return content or ""
+
+def _genai_usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None: return 0, 0
+    return getattr(usage, "prompt_token_count", 0) or 0, getattr(usage, "candidates_token_count", 0) or 0
+
+class LLMGateway:
+    def __init__(self, api_key, max_concurrency=8, max_retries=3, breaker_factory=CircuitBreaker, timeout=60, sleep=time.sleep):
+        self.api_key = api_key
+        self.max_retries = max(0, int(max_retries))
+        self.timeout = timeout
+        self.breaker_factory = breaker_factory
+        self.sleep = sleep
+        self._breakers = {} # çağrı noktası -> CircuitBreaker
+        self._semaphore = threading.BoundedSemaphore(max(1, int(max_concurrency)))
+        self._clients = {}
+        self._vision_models = {}
+        self._clients_lock = threading.Lock()
+        self._stats = collections.defaultdict(SiteStats)
+        self._stats_lock = threading.Lock()
+        self._genai_configured = False
+
+    # --- İstemci havuzu ---
+    def chat_client(self, model=DEFAULT_MODEL, temperature=0.0):
+        key = (model, float(temperature))
+        with self._clients_lock:
+            if key not in self._clients:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                self._clients[key] = ChatGoogleGenerativeAI(
+                    model=model,
+                    google_api_key=self.api_key,
+                    temperature=temperature,
+                    max_retries=1, # Tekrar denemeler gateway'de
+                    timeout=self.timeout
+                )
+            return self._clients[key]
+
+    def vision_model(self, model=DEFAULT_MODEL):
+        with self._clients_lock:
+            if not self._genai_configured:
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                self._genai_configured = True
+            if model not in self._vision_models:
+                import google.generativeai as genai
+                self._vision_models[model] = genai.GenerativeModel(model)
+            return self._vision_models[model]
+
+    def breaker(self, site):
+        with self._clients_lock:
+            if site not in self._breakers: self._breakers[site] = self.breaker_factory()
+            return self._breakers[site]
+
+    # --- Çağrılar ---
+    def invoke(self, prompt, site, model=DEFAULT_MODEL, temperature=0.0, max_retries=None):
+        """Metin üretir ve içeriği (str) döndürür."""
+        client = self.chat_client(model, temperature)
+        message = self._call(site, lambda: client.invoke(prompt), _langchain_usage, max_retries)
+        input_tokens, output_tokens = _langchain_usage(message)
+        event("llm", site=site, prompt_chars=len(prompt), response_chars=len(message.content),
+              input_tokens=input_tokens, output_tokens=output_tokens)
+        return message.content
+
+    def stream(self, prompt, site, model=DEFAULT_MODEL, temperature=0.0, max_retries=None):
+        """
+        Metni üretildikçe parça parça (str) verir. Tekrar deneme sadece ilk parça gelmeden
+        önce yapılır; akış yarıda koparsa hata çağırana iletilir (cevap iki kez yazılmasın).
+        """
+        client = self.chat_client(model, temperature)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        stats = self._site(site)
+        breaker = self.breaker(site)
+        for attempt in range(max_retries + 1):
+            if not breaker.allow():
+                self._record(stats, errors=1)
+                event("llm_circuit_open", site=site)
+                raise CircuitOpenError(f"LLM devresi açık ({site}): servis geçici olarak kullanılamıyor.")
+
+            started = time.monotonic()
+            first_token = None
+            input_tokens = output_tokens = response_chars = 0
+            try:
+                with self._semaphore:
+                    for chunk in client.stream(prompt):
+                        chunk_input, chunk_output = _langchain_usage(chunk)
+                        input_tokens += chunk_input
+                        output_tokens += chunk_output
+                        text = _chunk_text(chunk)
+                        if not text: continue
+                        if first_token is None: first_token = time.monotonic() - started
+                        response_chars += len(text)
+                        yield text
+            except GeneratorExit:
+                # Okuyan taraf akışı bıraktı (ör. sayfa yenilendi): hata sayılmaz
+                breaker.record_success()
+                raise
+            except Exception as e:
+                retryable = is_retryable_error(e)
+                if retryable: breaker.record_failure()
+                else: breaker.record_success()
+                if first_token is not None or not retryable or attempt >= max_retries:
+                    self._record(stats, errors=1)
+                    event("llm_error", site=site, error=type(e).__name__)
+                    raise
+                self._record(stats, retries=1)
+                event("llm_retry", site=site, attempt=attempt + 1, error=type(e).__name__)
+                self.sleep(backoff_delay(attempt, base=1.0, cap=20.0))
+                continue
+
+            breaker.record_success()
+            self._record(stats, latency=time.monotonic() - started, first_token=first_token,
+                         input_tokens=input_tokens, output_tokens=output_tokens)
+            event("llm", site=site, prompt_chars=len(prompt), response_chars=response_chars,
+                  input_tokens=input_tokens, output_tokens=output_tokens)
+            return
+
+    def vision(self, prompt, image_bytes, site="vision", model=DEFAULT_MODEL, mime_type="image/jpeg",
+               max_retries=None, bucket=None):
+        """Görseli prompt ile birlikte gönderir, metni döndürür."""
+        vision_model = self.vision_model(model)
+        response = self._call(
+            site,
+            lambda: vision_model.generate_content([prompt, {"mime_type": mime_type, "data": image_bytes}]),
+            _genai_usage, max_retries, bucket
+        )
+        event("llm", site=site, image_bytes=len(image_bytes), response_chars=len(response.text or ""))
+        return response.text
+
+    def _call(self, site, fn, usage_fn, max_retries=None, bucket=None):
+        max_retries = self.max_retries if max_retries is None else max_retries
+        stats = self._site(site)
+        breaker = self.breaker(site)
+        for attempt in range(max_retries + 1):
+            if not breaker.allow():
+                self._record(stats, errors=1)
+                event("llm_circuit_open", site=site)
+                raise CircuitOpenError(f"LLM devresi açık ({site}): servis geçici olarak kullanılamıyor.")
+            if bucket is not None: bucket.acquire()
+
+            started = time.monotonic()
+            try:
+                with self._semaphore:
+                    result = fn()
+            except Exception as e:
+                retryable = is_retryable_error(e)
+                if retryable: breaker.record_failure()
+                else: breaker.record_success() # Kalıcı hata (ör. geçersiz istek) servisin sağlığını göstermez
+                if not retryable or attempt >= max_retries:
+                    self._record(stats, errors=1)
+                    event("llm_error", site=site, error=type(e).__name__)
+                    raise
+                self._record(stats, retries=1)
+                event("llm_retry", site=site, attempt=attempt + 1, error=type(e).__name__)
+                self.sleep(backoff_delay(attempt, base=1.0, cap=20.0))
+                continue
+
+            breaker.record_success()
+            input_tokens, output_tokens = usage_fn(result)
+            self._record(stats, latency=time.monotonic() - started, input_tokens=input_tokens, output_tokens=output_tokens)
+            return result
+
+    # --- İstatistikler ---
+    def _site(self, site):
+        with self._stats_lock:
+            return self._stats[site]
+
+    def _record(self, stats, latency=None, errors=0, retries=0, input_tokens=0, output_tokens=0, first_token=None):
+        with self._stats_lock:
+            if latency is not None or errors: stats.calls += 1
+            stats.errors += errors
+            stats.retries += retries
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            if latency is not None: stats.latencies.append(latency)
+            if first_token is not None: stats.first_token_latencies.append(first_token)
+
+    def stats(self):
+        """Çağrı noktası -> {calls, errors, retries, input/output_tokens, p50_ms, p95_ms, ttft_p50_ms}"""
+        with self._stats_lock:
+            return {site: s.snapshot() for site, s in self._stats.items()}
+
+# --- SÜREÇ GENELİ ÖRNEK ---
+_gateway = None
+_gateway_lock = threading.Lock()
+
+def get_gateway():
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway(
+                api_key=get_setting("GOOGLE_API_KEY"),
+                max_concurrency=get_setting("LLM_MAX_CONCURRENCY", 8, int),
+                max_retries=get_setting("LLM_MAX_RETRIES", 3, int),
+                breaker_factory=functools.partial(
+                    CircuitBreaker,
+                    failure_threshold=get_setting("LLM_BREAKER_THRESHOLD", 5, int),
+                    reset_seconds=get_setting("LLM_BREAKER_RESET_SECONDS", 30, float)
+                ),
+                timeout=get_setting("LLM_TIMEOUT_SECONDS", 60, float)
+            )
+        return _gateway
+
+def llm_stats():
+    """Admin paneli için: gateway henüz kullanılmadıysa boş sözlük."""
+    with _gateway_lock:
+        return _gateway.stats() if _gateway else {}
@@ -0,0 +1,185 @@
+import collections
+import threading
+import weakref
+import numpy as np
+from langchain_core.documents import Document
+from embedding_cache import batch_embed_queries
+from settings import get_setting
+
+# --- TEK GETİRMELİ YEREL MMR ---
+# Eski yol: soru başına 2 x max_marginal_relevance_search(fetch_k=300) = ~600 tam vektör
+# (değerler + metadata) indirilir, adayların çoğu iki aramada aynıdır.
+# Yeni yol:
+#   1. Sorgu embed edilir (önbellekli). Ham soru ve zenginleştirilmiş sorgu toplu embed edilmez:
+#      ham soru araması zenginleştirmeyi beklemeden başlar (generation.retrieve_documents).
+#   2. Her sorgu için index.query(include_values=False): sadece ID + skor + metadata.
+#   3. Adaylar ID ile birleştirilir; vektörleri sırasıyla embedding önbelleğinden (metin hash'i),
+#      bellek içi LRU'dan, en son index.fetch ile sadece eksikler için alınır.
+#   4. MMR, birleşik aday kümesi üzerinde NumPy ile vektörize çalışır.
+
+CandidateSet = collections.namedtuple("CandidateSet", ["query_vector", "matches"])
+
+def mmr_select(query_vector, candidates, k, lambda_mult=0.5):
+    """
+    Maximal Marginal Relevance. candidates: (n, d) matris. Seçilen satır indekslerini döndürür.
+    Her adımda sadece yeni seçilenle benzerlik hesaplanır: O(k * n * d).
+    """
+    candidates = np.asarray(candidates, dtype=np.float32)
+    n = candidates.shape[0]
+    if n == 0 or k <= 0: return []
+    norms = np.linalg.norm(candidates, axis=1, keepdims=True)
+    normalized = candidates / np.maximum(norms, 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = normalized @ query
+    first = int(np.argmax(relevance))
+    selected = [first]
+    chosen = np.zeros(n, dtype=bool)
+    chosen[first] = True
+    max_similarity = normalized @ normalized[first]
+
+    for _ in range(min(k, n) - 1):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[chosen] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        chosen[best] = True
+        np.maximum(max_similarity, normalized @ normalized[best], out=max_similarity)
+    return selected
+
+class VectorLRU:
+    """ID -> vektör, boyutu sınırlı bellek içi önbellek. Thread-safe."""
+    def __init__(self, max_items=20000):
+        self.max_items = max_items
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, ids):
+        found = {}
+        with self._lock:
+            for vector_id in ids:
+                vector = self._items.get(vector_id)
+                if vector is not None:
+                    self._items.move_to_end(vector_id)
+                    found[vector_id] = vector
+        return found
+
+    def put_many(self, items):
+        with self._lock:
+            for vector_id, vector in items.items():
+                self._items[vector_id] = vector
+                self._items.move_to_end(vector_id)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+def _field(obj, name):
+    # Pinecone yanıtları sürüme göre nesne ya da sözlük olabilir
+    if isinstance(obj, dict): return obj.get(name)
+    return getattr(obj, name, None)
+
+class LocalMMRRetriever:
+    def __init__(self, vector_store, k=30, fetch_k=300, lambda_mult=0.6, vector_cache=None):
+        self.index = vector_store._index
+        self.embedding = vector_store.embeddings
+        self.text_key = getattr(vector_store, "_text_key", "text")
+        self.namespace = getattr(vector_store, "_namespace", None)
+        self.k = k
+        self.fetch_k = fetch_k
+        self.lambda_mult = lambda_mult
+        self.vector_cache = vector_cache or VectorLRU()
+        self.stats = {"candidates": 0, "from_embedding_cache": 0, "from_memory": 0, "fetched": 0}
+
+    @staticmethod
+    def supports(vector_store):
+        return getattr(vector_store, "_index", None) is not None and getattr(vector_store, "embeddings", None) is not None
+
+    # --- 1. aşama: aday toplama (vektör değerleri indirilmez) ---
+    def embed_queries(self, queries):
+        return batch_embed_queries(self.embedding, queries)
+
+    def candidates(self, query, query_vector=None, fetch_k=None):
+        if query_vector is None: query_vector = self.embed_queries([query])[0]
+        response = self.index.query(
+            vector=list(query_vector), top_k=fetch_k or self.fetch_k,
+            include_metadata=True, include_values=False, namespace=self.namespace
+        )
+        return CandidateSet(np.asarray(query_vector, dtype=np.float32), _field(response, "matches") or [])
+
+    # --- 2. aşama: birleştirme + yerel MMR ---
+    def select(self, candidate_sets, k=None):
+        """Her aday kümesi için MMR ile seçilmiş Document listesi döndürür (aynı sırada)."""
+        merged = {}
+        for candidate_set in candidate_sets:
+            for match in candidate_set.matches:
+                merged.setdefault(_field(match, "id"), dict(_field(match, "metadata") or {}))
+        if not merged: return [[] for _ in candidate_sets]
+
+        vectors = self._vectors(merged)
+        ids = [vector_id for vector_id in merged if vector_id in vectors]
+        matrix = np.stack([vectors[vector_id] for vector_id in ids]) if ids else np.zeros((0, 1), dtype=np.float32)
+
+        results = []
+        for candidate_set in candidate_sets:
+            # Her sorgu kendi aday kümesiyle değil, birleşik kümeyle çeşitlendirilir
+            chosen = mmr_select(candidate_set.query_vector, matrix, k or self.k, self.lambda_mult)
+            results.append([self._document(ids[i], merged[ids[i]]) for i in chosen])
+        return results
+
+    def _vectors(self, merged):
+        self.stats["candidates"] += len(merged)
+        vectors = {}
+
+        # a) Embedding önbelleği: parça metni bu makinede embed edildiyse ağa hiç gidilmez
+        if hasattr(self.embedding, "cached_document_vectors"):
+            ids = list(merged)
+            texts = [merged[vector_id].get(self.text_key, "") for vector_id in ids]
+            for vector_id, vector in zip(ids, self.embedding.cached_document_vectors(texts)):
+                if vector is not None: vectors[vector_id] = vector
+            self.stats["from_embedding_cache"] += len(vectors)
+
+        # b) Önceki sorularda indirilmiş vektörler
+        remaining = [vector_id for vector_id in merged if vector_id not in vectors]
+        from_memory = self.vector_cache.get_many(remaining)
+        vectors.update(from_memory)
+        self.stats["from_memory"] += len(from_memory)
+
+        # c) Sadece eksikler için index.fetch
+        remaining = [vector_id for vector_id in remaining if vector_id not in from_memory]
+        fetched = {}
+        for i in range(0, len(remaining), 100):
+            response = self.index.fetch(ids=remaining[i : i + 100], namespace=self.namespace)
+            for vector_id, record in (_field(response, "vectors") or {}).items():
+                values = _field(record, "values")
+                if values: fetched[vector_id] = np.asarray(values, dtype=np.float32)
+        self.vector_cache.put_many(fetched)
+        vectors.update(fetched)
+        self.stats["fetched"] += len(fetched)
+        return vectors
+
+    def _document(self, vector_id, metadata):
+        metadata = dict(metadata)
+        text = metadata.pop(self.text_key, "")
+        return Document(id=vector_id, page_content=text, metadata=metadata)
+
+# --- SÜREÇ GENELİ ÖRNEKLER ---
+# Retriever'lar vector store nesnesine zayıf referansla bağlanır: oturum kapanıp store
+# çöpe gidince retriever da gider; id() yeniden kullanımı eski retriever'ı yeni store'a vermez.
+# (Retriever store'un kendisini değil, index ve embedding'i tuttuğu için store'u canlı tutmaz.)
+_retrievers = weakref.WeakKeyDictionary()
+_shared_vectors = None
+_lock = threading.Lock()
+
+def get_local_retriever(vector_store):
+    """RETRIEVAL_MODE=local_mmr (varsayılan) ve vector store destekliyorsa retriever, değilse None."""
+    global _shared_vectors
+    if vector_store is None or get_setting("RETRIEVAL_MODE", "local_mmr") != "local_mmr": return None
+    if not LocalMMRRetriever.supports(vector_store): return None
+    with _lock:
+        retriever = _retrievers.get(vector_store)
+        if retriever is None:
+            if _shared_vectors is None:
+                _shared_vectors = VectorLRU(get_setting("MMR_VECTOR_CACHE_SIZE", 20000, int))
+            retriever = LocalMMRRetriever(vector_store, vector_cache=_shared_vectors)
+            _retrievers[vector_store] = retriever
+        return retriever
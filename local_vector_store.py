@@ -0,0 +1,318 @@
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import uuid
+import numpy as np
+from langchain_core.documents import Document
+from local_mmr import mmr_select
+from settings import get_setting
+
+# --- GÖMÜLÜ YEREL VEKTÖR İNDEKSİ ---
+# Üniversite mevzuatı korpusu en fazla on binlerce parçadır; her arama/yazma için Pinecone'a
+# ağ isteği atmak yerine süreç içinde aranabilir. VECTOR_BACKEND = "local" ile seçilir.
+#   - Vektörler: bellek eşlemeli (memmap) float32 matris dosyası (vectors.f32), satır = kayıt.
+#   - Metadata: SQLite yan dosyası (id -> satır, metadata JSON) + sürüm sayacı.
+#   - LocalIndex, Pinecone Index'in kullanılan alt kümesini taklit eder (upsert, query, fetch,
+#     delete, list, describe_index_stats); böylece UploadPipeline, local_mmr, manifest silmeleri
+#     değişmeden çalışır. LocalVectorStore, PineconeVectorStore'un generation.py'de kullanılan
+#     arayüzünü sağlar. Testler ve benchmark için tamamen çevrimdışı bir yedektir.
+# Arama kaba kuvvet (brute-force) kosinüs benzerliğidir: 50k x 768 matriste birkaç ms.
+# Yazan süreç (ingest_worker) sürümü artırır; okuyan süreç (app) sürüm değişince dosyaları yeniden açar.
+# Her yazma (upsert/delete) tek bir BEGIN IMMEDIATE işlemi içinde yapılır: güncel görünüm okunur,
+# boş satırlar ayrılır ve yazılır; aynı anda yazan diğer süreç bu sırada bekler (satır çakışması olmaz).
+
+class Vector:
+    def __init__(self, id, values=None, metadata=None, score=None):
+        self.id = id
+        self.values = values
+        self.metadata = metadata
+        self.score = score
+
+class QueryResponse:
+    def __init__(self, matches):
+        self.matches = matches
+
+class FetchResponse:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+# --- METADATA FİLTRESİ (Pinecone sözdiziminin alt kümesi) ---
+def _compare(value, op, expected):
+    if op == "$eq": return value == expected
+    if op == "$ne": return value != expected
+    if op == "$in": return value in expected
+    if op == "$nin": return value not in expected
+    if op == "$exists": return (value is not None) == bool(expected)
+    if value is None: return False
+    if op == "$gt": return value > expected
+    if op == "$gte": return value >= expected
+    if op == "$lt": return value < expected
+    if op == "$lte": return value <= expected
+    raise ValueError(f"Desteklenmeyen filtre operatörü: {op}")
+
+def matches_filter(metadata, filter):
+    """{"source": "a.pdf", "article": {"$in": [...]}, "$and": [...], "$or": [...]}"""
+    if not filter: return True
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, f) for f in condition): return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, f) for f in condition): return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if not all(_compare(value, op, expected) for op, expected in condition.items()): return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+class LocalIndex:
+    def __init__(self, path, initial_capacity=1024):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.initial_capacity = initial_capacity
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(path, "meta.sqlite3"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS records (
+                id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL UNIQUE,
+                metadata TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+        self._conn.commit()
+        self._loaded_version = None
+        self._matrix = None
+
+    # --- Yükleme ---
+    def _meta(self, name, default=0):
+        row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, name, value):
+        self._conn.execute(
+            "INSERT INTO meta (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, value)
+        )
+
+    def _refresh(self):
+        """Başka süreç yazdıysa (sürüm değiştiyse) matris ve metadata yeniden okunur."""
+        version = self._meta("version")
+        if version == self._loaded_version: return
+        self.dimension = self._meta("dimension") or None
+        capacity = self._meta("capacity")
+        self._matrix = None
+        if self.dimension and capacity:
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+        self._ids = [None] * capacity
+        self._metadata = [None] * capacity
+        self._rows = {}
+        for vector_id, row, metadata in self._conn.execute("SELECT id, row, metadata FROM records"):
+            self._ids[row] = vector_id
+            self._metadata[row] = json.loads(metadata)
+            self._rows[vector_id] = row
+        self._alive = np.array([i is not None for i in self._ids], dtype=bool)
+        self._norms = np.zeros(capacity, dtype=np.float32)
+        if self._matrix is not None and self._alive.any():
+            self._norms[self._alive] = np.linalg.norm(self._matrix[self._alive], axis=1)
+        self._loaded_version = version
+
+    def _ensure_capacity(self, dimension, needed):
+        if self.dimension is None:
+            self.dimension = dimension
+            self._set_meta("dimension", dimension)
+        elif dimension != self.dimension:
+            raise ValueError(f"Vektör boyutu {dimension}, indeks boyutu {self.dimension}")
+        capacity = len(self._ids)
+        if needed <= capacity and self._matrix is not None: return
+        new_capacity = max(self.initial_capacity, capacity)
+        while new_capacity < needed: new_capacity *= 2
+        if self._matrix is not None: self._matrix.flush()
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(new_capacity * self.dimension * 4)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(new_capacity, self.dimension))
+        grow = new_capacity - capacity
+        self._ids.extend([None] * grow)
+        self._metadata.extend([None] * grow)
+        self._alive = np.concatenate([self._alive, np.zeros(grow, dtype=bool)])
+        self._norms = np.concatenate([self._norms, np.zeros(grow, dtype=np.float32)])
+        self._set_meta("capacity", new_capacity)
+
+    def _commit(self):
+        if self._matrix is not None: self._matrix.flush()
+        self._set_meta("version", self._meta("version") + 1)
+        self._conn.commit()
+        self._loaded_version = self._meta("version")
+
+    @contextlib.contextmanager
+    def _write(self):
+        """
+        Süreçler arası yazma işlemi: BEGIN IMMEDIATE diğer yazanları bekletir, görünüm kilit
+        altında tazelenir. Blok state["changed"] = False bırakırsa sürüm artırılmaz.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            state = {"changed": True}
+            try:
+                self._refresh()
+                yield state
+            except BaseException:
+                self._conn.rollback()
+                self._loaded_version = None # Bellekteki görünüm yarım kalmış olabilir
+                raise
+            if state["changed"]: self._commit()
+            else: self._conn.rollback()
+
+    # --- Pinecone Index arayüzü ---
+    def upsert(self, vectors, namespace=None):
+        records = [v if isinstance(v, dict) else {"id": v[0], "values": v[1], "metadata": v[2] if len(v) > 2 else {}} for v in vectors]
+        if not records: return {"upserted_count": 0}
+        with self._write():
+            new_ids = [r["id"] for r in records if r["id"] not in self._rows]
+            self._ensure_capacity(len(records[0]["values"]), len(self._rows) + len(set(new_ids)))
+            free_rows = iter(i for i, vector_id in enumerate(self._ids) if vector_id is None)
+            for record in records:
+                vector_id = record["id"]
+                row = self._rows.get(vector_id)
+                if row is None: row = next(free_rows)
+                values = np.asarray(record["values"], dtype=np.float32)
+                metadata = record.get("metadata") or {}
+                self._matrix[row] = values
+                self._norms[row] = np.linalg.norm(values)
+                self._ids[row], self._metadata[row], self._alive[row] = vector_id, metadata, True
+                self._rows[vector_id] = row
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO records (id, row, metadata) VALUES (?, ?, ?)",
+                    (vector_id, row, json.dumps(metadata, ensure_ascii=False))
+                )
+        return {"upserted_count": len(records)}
+
+    def query(self, vector, top_k=10, include_metadata=False, include_values=False, filter=None, namespace=None, **kwargs):
+        with self._lock:
+            self._refresh()
+            if self._matrix is None or not self._alive.any(): return QueryResponse([])
+            query = np.asarray(vector, dtype=np.float32)
+            mask = self._alive.copy()
+            if filter:
+                for row in np.flatnonzero(mask):
+                    if not matches_filter(self._metadata[row], filter): mask[row] = False
+            rows = np.flatnonzero(mask)
+            if not len(rows): return QueryResponse([])
+            scores = (self._matrix[rows] @ query) / np.maximum(self._norms[rows] * np.linalg.norm(query), 1e-12)
+            top = np.argsort(-scores)[:top_k]
+            return QueryResponse([
+                Vector(
+                    self._ids[rows[i]],
+                    values=self._matrix[rows[i]].tolist() if include_values else None,
+                    metadata=dict(self._metadata[rows[i]]) if include_metadata else None,
+                    score=float(scores[i])
+                ) for i in top
+            ])
+
+    def fetch(self, ids, namespace=None):
+        with self._lock:
+            self._refresh()
+            found = {}
+            for vector_id in ids:
+                row = self._rows.get(vector_id)
+                if row is not None:
+                    found[vector_id] = Vector(vector_id, self._matrix[row].tolist(), dict(self._metadata[row]))
+            return FetchResponse(found)
+
+    def delete(self, ids=None, filter=None, delete_all=False, namespace=None):
+        """ids, filter veya delete_all'dan biri verilmelidir (Pinecone gibi); boş çağrı hata verir."""
+        if not ids and not filter and not delete_all:
+            raise ValueError("delete: ids, filter veya delete_all verilmeli")
+        with self._write() as state:
+            if delete_all: targets = list(self._rows)
+            elif ids: targets = [i for i in ids if i in self._rows]
+            else: targets = [vector_id for vector_id, row in self._rows.items() if matches_filter(self._metadata[row], filter)]
+            for vector_id in targets:
+                row = self._rows.pop(vector_id)
+                self._ids[row], self._metadata[row], self._alive[row] = None, None, False
+            for i in range(0, len(targets), 500):
+                batch = targets[i : i + 500]
+                self._conn.execute(f"DELETE FROM records WHERE id IN ({','.join('?' * len(batch))})", batch)
+            state["changed"] = bool(targets)
+        return {}
+
+    def list(self, prefix="", limit=100, namespace=None):
+        """ID'leri limit'lik listeler halinde üretir (Pinecone list() gibi)."""
+        with self._lock:
+            self._refresh()
+            ids = sorted(vector_id for vector_id in self._rows if vector_id.startswith(prefix))
+        for i in range(0, len(ids), limit):
+            yield ids[i : i + limit]
+
+    def describe_index_stats(self, **kwargs):
+        with self._lock:
+            self._refresh()
+            return {"dimension": self.dimension, "total_vector_count": len(self._rows)}
+
+class LocalVectorStore:
+    """PineconeVectorStore yerine: aynı arama/ekleme/silme metotları, LocalIndex üzerinde."""
+    def __init__(self, index, embedding, text_key="text"):
+        self._index = index
+        self.embeddings = embedding
+        self._text_key = text_key
+        self._namespace = None
+
+    def add_documents(self, documents, ids=None, batch_size=100, **kwargs):
+        ids = list(ids) if ids else [getattr(d, "id", None) or str(uuid.uuid4()) for d in documents]
+        for i in range(0, len(documents), batch_size):
+            batch = documents[i : i + batch_size]
+            vectors = self.embeddings.embed_documents([d.page_content for d in batch])
+            self._index.upsert(vectors=[
+                {"id": vector_id, "values": values, "metadata": {**d.metadata, self._text_key: d.page_content}}
+                for vector_id, values, d in zip(ids[i : i + batch_size], vectors, batch)
+            ])
+        return ids
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        metadatas = metadatas or [{} for _ in texts]
+        return self.add_documents([Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas)], ids=ids)
+
+    def _document(self, match):
+        metadata = dict(match.metadata or {})
+        text = metadata.pop(self._text_key, "")
+        return Document(id=match.id, page_content=text, metadata=metadata)
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        response = self._index.query(vector=embedding, top_k=k, include_metadata=True, filter=filter)
+        return [(self._document(m), m.score) for m in response.matches]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self.embeddings.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20, lambda_mult=0.5, filter=None, **kwargs):
+        query_vector = self.embeddings.embed_query(query)
+        response = self._index.query(vector=query_vector, top_k=fetch_k, include_metadata=True, include_values=True, filter=filter)
+        matches = response.matches
+        if not matches: return []
+        chosen = mmr_select(query_vector, np.array([m.values for m in matches], dtype=np.float32), k, lambda_mult)
+        return [self._document(matches[i]) for i in chosen]
+
+    def delete(self, ids=None, filter=None, delete_all=None, **kwargs):
+        """Boş çağrı (ids/filter/delete_all yok) tüm indeksi silmez, ValueError verir."""
+        self._index.delete(ids=ids, filter=filter, delete_all=bool(delete_all))
+
+# --- SÜREÇ GENELİ ÖRNEK ---
+_index = None
+_index_lock = threading.Lock()
+
+def use_local_backend():
+    return get_setting("VECTOR_BACKEND", "pinecone") == "local"
+
+def get_local_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = LocalIndex(get_setting("LOCAL_VECTOR_PATH", os.path.join(".cache", "vectors")))
+        return _index
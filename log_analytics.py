@@ -0,0 +1,106 @@
+import datetime
+
+# --- SORGU ANALİTİĞİ (SUNUCU TARAFI ÖZETLER) ---
+# Eski yol: Analiz Paneli her yeniden çalıştırmada sorgu_loglari'nın TAMAMINI (soru + cevap)
+# çekip pandas'ta sayıyordu; maliyet log boyutuyla büyüyordu.
+# Yeni yol: sayaçlar Postgres'te, her log satırı eklenirken tetikleyiciyle (trigger) güncellenen
+# özet tablolarda tutulur. Panel sadece bu küçük tablolardan ve son birkaç satırdan okur:
+#   sorgu_toplam        : toplam soru sayısı          (tek satır; toplam Python'da toplanmaz)
+#   sorgu_gunluk        : gün -> soru sayısı          (günde 1 satır)
+#   sorgu_kullanicilari : kullanıcı -> soru sayısı    (kullanıcı başına 1 satır; "aktif öğrenci")
+#   sorgu_populer       : normalize soru -> adet      (en çok sorulanlar, adet indeksiyle)
+# "Son sorular" created_at indeksiyle sayfalı okunur (sadece gösterilen satırlar).
+# Aktif öğrenci = son ACTIVE_USER_DAYS günde soru soranlar; sayım count="exact" ile sunucuda yapılır
+# (PostgREST satır sınırı sonuçları kesmez).
+#
+# Supabase SQL (bir kez çalıştırılır):
+#   create index if not exists sorgu_loglari_created_at on sorgu_loglari (created_at desc);
+#   create table if not exists sorgu_toplam (
+#       id smallint primary key default 1 check (id = 1), soru_sayisi bigint not null default 0
+#   );
+#   create table if not exists sorgu_gunluk (gun date primary key, soru_sayisi bigint not null default 0);
+#   create table if not exists sorgu_kullanicilari (
+#       kullanici_adi text primary key, soru_sayisi bigint not null default 0, son_soru timestamptz
+#   );
+#   create index if not exists sorgu_kullanicilari_son_soru on sorgu_kullanicilari (son_soru desc);
+#   create table if not exists sorgu_populer (
+#       soru_anahtari text primary key, soru text not null, adet bigint not null default 0, son_soru timestamptz
+#   );
+#   create index if not exists sorgu_populer_adet on sorgu_populer (adet desc);
+#
+#   create or replace function sorgu_ozet_guncelle() returns trigger language plpgsql as $$
+#   begin
+#       insert into sorgu_toplam values (1, 1)
+#           on conflict (id) do update set soru_sayisi = sorgu_toplam.soru_sayisi + 1;
+#       insert into sorgu_gunluk values ((new.created_at at time zone 'Europe/Istanbul')::date, 1)
+#           on conflict (gun) do update set soru_sayisi = sorgu_gunluk.soru_sayisi + 1;
+#       insert into sorgu_kullanicilari values (new.kullanici_adi, 1, new.created_at)
+#           on conflict (kullanici_adi) do update
+#           set soru_sayisi = sorgu_kullanicilari.soru_sayisi + 1, son_soru = excluded.son_soru;
+#       insert into sorgu_populer values (lower(regexp_replace(trim(new.soru), '\s+', ' ', 'g')), new.soru, 1, new.created_at)
+#           on conflict (soru_anahtari) do update
+#           set adet = sorgu_populer.adet + 1, son_soru = excluded.son_soru;
+#       return new;
+#   end $$;
+#   create trigger sorgu_loglari_ozet after insert on sorgu_loglari
+#       for each row execute function sorgu_ozet_guncelle();
+#
+#   -- Mevcut loglar için bir kerelik doldurma (tetikleyiciden ÖNCE çalıştırılmalı):
+#   insert into sorgu_toplam select 1, count(*) from sorgu_loglari;
+#   insert into sorgu_gunluk select (created_at at time zone 'Europe/Istanbul')::date, count(*) from sorgu_loglari group by 1;
+#   insert into sorgu_kullanicilari select kullanici_adi, count(*), max(created_at) from sorgu_loglari group by 1;
+#   insert into sorgu_populer
+#       select lower(regexp_replace(trim(soru), '\s+', ' ', 'g')), min(soru), count(*), max(created_at) from sorgu_loglari group by 1;
+#
+# Özet tabloları yoksa (SQL henüz çalıştırılmadıysa) toplam soru sayısı sunucuda count ile alınır,
+# diğer özetler boş döner; loglar yine de tamamen çekilmez.
+
+LOG_TABLE = "sorgu_loglari"
+ACTIVE_USER_DAYS = 30
+
+class LogAnalytics:
+    def __init__(self, client):
+        self.client = client
+
+    def summary(self, active_days=ACTIVE_USER_DAYS):
+        """
+        {"total_questions", "active_users", "active_days"}: sayımlar veritabanında yapılır.
+        active_users son active_days günde soru soranlardır; özet tablolar yoksa None.
+        """
+        since = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=active_days)).isoformat()
+        try:
+            total = self.client.table("sorgu_toplam").select("soru_sayisi").eq("id", 1).limit(1).execute().data
+            users = self.client.table("sorgu_kullanicilari").select("kullanici_adi", count="exact") \
+                .gte("son_soru", since).limit(1).execute()
+            return {
+                "total_questions": total[0]["soru_sayisi"] if total else 0,
+                "active_users": users.count or 0, "active_days": active_days,
+            }
+        except Exception as e:
+            print(f"Analiz Özeti Hatası (özet tabloları): {e}")
+        # Yedek: sadece sunucu tarafı sayım
+        response = self.client.table(LOG_TABLE).select("*", count="exact", head=True).execute()
+        return {"total_questions": response.count or 0, "active_users": None, "active_days": active_days}
+
+    def daily_volume(self, days=14):
+        """Son `days` gün: [{"gun", "soru_sayisi"}], eskiden yeniye."""
+        try:
+            rows = self.client.table("sorgu_gunluk").select("gun, soru_sayisi").order("gun", desc=True).limit(days).execute().data
+            return rows[::-1]
+        except Exception as e:
+            print(f"Günlük Hacim Hatası: {e}")
+            return []
+
+    def top_questions(self, limit=5):
+        """En çok sorulan sorular: [{"soru", "adet", "son_soru"}]."""
+        try:
+            return self.client.table("sorgu_populer").select("soru, adet, son_soru").order("adet", desc=True).limit(limit).execute().data
+        except Exception as e:
+            print(f"Popüler Sorular Hatası: {e}")
+            return []
+
+    def recent(self, page=0, page_size=5):
+        """Yeniden eskiye sayfalı son sorular; sadece gösterilen sütunlar ve satırlar çekilir."""
+        start = max(0, int(page)) * page_size
+        return self.client.table(LOG_TABLE).select("kullanici_adi, soru, created_at") \
+            .order("created_at", desc=True).range(start, start + page_size - 1).execute().data
@@ -0,0 +1,192 @@
+import atexit
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+from settings import get_setting
+
+# --- ARKA PLAN LOG YAZICISI ---
+# Eski yol: her cevaptan sonra sohbet akışının içinde senkron bir Supabase insert'i;
+# yavaş bir Supabase cevabı betiği bekletiyor, her cevap ayrı bir HTTP isteğine mal oluyordu.
+# Yeni yol:
+#   - write() kaydı sınırlı bir kuyruğa bırakır ve hemen döner (kullanıcı beklemez).
+#   - Tek bir arka plan thread'i kayıtları toplu insert ile yazar: batch dolunca ya da
+#     ilk kayıttan LOG_FLUSH_SECONDS sonra (hangisi önce olursa).
+#   - Supabase'e ulaşılamazsa (veya kuyruk doluysa) kayıtlar yerel bir JSONL biriktirme
+#     (spool) dosyasına yazılır; bağlantı düzelince LOG_REPLAY_SECONDS aralıklarla tekrar gönderilir.
+#   - Süreç kapanırken (atexit) kuyrukta kalanlar yazılır, yazılamayanlar spool'a geçer.
+# created_at kayıt anında istemcide atanır: geç yazılan / spool'dan dönen satırlar da
+# doğru gün ve sırayla görünür (bkz. log_analytics.py özet tetikleyicisi).
+
+_STOP = object()
+
+def _now_iso():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+class LogWriter:
+    def __init__(self, client, table="sorgu_loglari", spool_path=os.path.join(".cache", "log_spool.jsonl"),
+                 batch_size=50, flush_seconds=2.0, max_queue=1000, replay_seconds=60.0):
+        folder = os.path.dirname(spool_path)
+        if folder: os.makedirs(folder, exist_ok=True)
+        self.client = client
+        self.table = table
+        self.spool_path = spool_path
+        self.batch_size = max(1, int(batch_size))
+        self.flush_seconds = float(flush_seconds)
+        self.replay_seconds = float(replay_seconds)
+
+        self.written = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.batches = 0
+        self.last_error = None
+
+        self._closed = False
+        self._without_trace = False # "iz" sütunu yoksa bir kez öğrenilir
+        self._last_replay = 0.0
+        self._spool_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    # --- Çağıran taraf (asla beklemez) ---
+    def write(self, record):
+        record = dict(record)
+        record.setdefault("created_at", _now_iso())
+        if not self._closed:
+            try:
+                self._queue.put_nowait(record)
+                return
+            except queue.Full: pass
+        self._spool([record]) # Kuyruk dolu veya yazıcı kapandı: kayıt kaybolmasın
+
+    def close(self, timeout=5.0):
+        """Kuyruktakileri yazar ve thread'i durdurur; süre yetmezse kalanlar spool'a yazılır."""
+        if self._closed: return
+        self._closed = True
+        try: self._queue.put(_STOP, timeout=timeout)
+        except queue.Full: pass
+        self._thread.join(timeout)
+        leftover = []
+        while True:
+            try: item = self._queue.get_nowait()
+            except queue.Empty: break
+            if item is not _STOP: leftover.append(item)
+        if leftover: self._spool(leftover)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(), "written": self.written, "batches": self.batches,
+            "spooled": self.spooled, "replayed": self.replayed, "spool_pending": self._spool_pending(),
+            "last_error": self.last_error,
+        }
+
+    # --- Arka plan thread'i ---
+    def _run(self):
+        batch, deadline, stopping = [], None, False
+        while not stopping:
+            wait = self.flush_seconds if deadline is None else max(0.0, deadline - time.monotonic())
+            # Kuyruk boşken de spool tekrar gönderimi zamanında denensin
+            wait = min(wait, max(0.0, self._last_replay + self.replay_seconds - time.monotonic()))
+            try:
+                item = self._queue.get(timeout=wait)
+                if item is _STOP: stopping = True
+                else:
+                    batch.append(item)
+                    if deadline is None: deadline = time.monotonic() + self.flush_seconds
+            except queue.Empty: pass
+
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch, deadline = [], None
+            if not stopping: self._maybe_replay()
+
+    def _flush(self, batch):
+        if self._insert(batch): self.written += len(batch)
+        else: self._spool(batch)
+
+    def _insert(self, rows):
+        """Toplu insert; başarılıysa True. Tabloda "iz" sütunu yoksa izsiz tekrar denenir."""
+        if self._without_trace: rows = [{k: v for k, v in r.items() if k != "iz"} for r in rows]
+        try:
+            self.client.table(self.table).insert(rows).execute()
+            self.batches += 1
+            return True
+        except Exception as e:
+            error = e
+        # PostgREST: "Could not find the 'iz' column of 'sorgu_loglari' in the schema cache"
+        if not self._without_trace and "'iz'" in str(error) and any("iz" in r for r in rows):
+            try:
+                self.client.table(self.table).insert([{k: v for k, v in r.items() if k != "iz"} for r in rows]).execute()
+                print(f"Log Yazıcı: 'iz' sütunu yazılamadı, izsiz devam ediliyor ({error})")
+                self._without_trace = True
+                self.batches += 1
+                return True
+            except Exception as e:
+                error = e
+        self.last_error = str(error)
+        print(f"Log Yazma Hatası ({len(rows)} kayıt spool'a): {error}")
+        return False
+
+    # --- Spool (yerel biriktirme) ---
+    def _spool(self, records, returned=False):
+        """returned=True: tekrar gönderilemeyip geri dönen kayıtlar (spooled sayacına yeniden eklenmez)."""
+        try:
+            with self._spool_lock, open(self.spool_path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+            if not returned: self.spooled += len(records)
+        except Exception as e:
+            print(f"Log Spool Hatası ({len(records)} kayıt kayboldu): {e}")
+
+    def _spool_pending(self):
+        try:
+            with open(self.spool_path, "rb") as f: return sum(1 for line in f if line.strip())
+        except FileNotFoundError: return 0
+
+    def _maybe_replay(self):
+        if time.monotonic() - self._last_replay < self.replay_seconds: return
+        self._last_replay = time.monotonic()
+        if not os.path.exists(self.spool_path): return
+        # Dosya devralınır; gönderilemeyenler yeni spool'a geri eklenir
+        with self._spool_lock:
+            try:
+                with open(self.spool_path, encoding="utf-8") as f: lines = f.readlines()
+                os.remove(self.spool_path)
+            except FileNotFoundError: return
+        records = []
+        for line in lines:
+            try: records.append(json.loads(line))
+            except ValueError: continue # Yarım yazılmış satır
+        for i in range(0, len(records), self.batch_size):
+            batch = records[i : i + self.batch_size]
+            if not self._insert(batch):
+                self._spool(records[i:], returned=True)
+                return
+            self.replayed += len(batch)
+
+# --- SÜREÇ GENELİ ÖRNEK ---
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_log_writer(client):
+    """İlk çağrıdaki istemciyle tek bir yazıcı oluşturur; süreç kapanırken atexit ile boşaltılır."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = LogWriter(
+                client,
+                spool_path=get_setting("LOG_SPOOL_PATH", os.path.join(".cache", "log_spool.jsonl")),
+                batch_size=get_setting("LOG_BATCH_SIZE", 50, int),
+                flush_seconds=get_setting("LOG_FLUSH_SECONDS", 2.0, float),
+                max_queue=get_setting("LOG_QUEUE_SIZE", 1000, int),
+                replay_seconds=get_setting("LOG_REPLAY_SECONDS", 60.0, float)
+            )
+            atexit.register(_writer.close)
+        return _writer
+
+def log_writer_stats():
+    """Admin paneli için: yazıcı henüz oluşmadıysa boş sözlük."""
+    with _writer_lock:
+        return _writer.stats() if _writer else {}
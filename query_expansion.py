@@ -0,0 +1,240 @@
+import collections
+import json
+import os
+import re
+import threading
+from settings import get_setting
+
+# --- YEREL SORGU ZENGİNLEŞTİRME ---
+# Eski yolda her soru için bir Gemini çağrısı sadece "lütfen/acaba" gibi dolgu kelimeleri
+# siliyor ve sabit bir eş anlamlı listesi ekliyordu. Bu motor aynısını yerelde yapar:
+#   1. Türkçe normalizasyon (I/ı, İ/i) + aksan katlama (ş->s, ğ->g, ü->u, ö->o, ç->c, ı->i)
+#   2. Dolgu/soru kelimelerinin (stopword) silinmesi
+#   3. Hafif ek atma (stajları -> staj, koşulları -> kosul)
+#   4. Eş anlamlı grupları: query_thesaurus.json + korpustan öğrenilen tanımlar
+#      ("AKTS: Avrupa Kredi Transfer Sistemini" gibi "Tanımlar" maddeleri)
+# Sorudaki kelimelerin çoğu korpusta/sözlükte yoksa güven düşüktür ve (isteğe bağlı) LLM'e düşülür.
+
+FOLD_TABLE = str.maketrans({"ı": "i", "ş": "s", "ğ": "g", "ü": "u", "ö": "o", "ç": "c", "â": "a", "î": "i", "û": "u"})
+
+STOPWORDS = {
+    # Dolgu / nezaket
+    "lutfen", "acaba", "rica", "ederim", "ediyorum", "merhaba", "selam", "selamlar", "hocam", "tesekkur",
+    "tesekkurler", "sagol", "iyi", "gunler", "sormak", "istiyorum", "ogrenmek", "merak", "bilgi",
+    "verir", "verebilir", "misiniz", "misin", "musunuz", "soyler", "soyleyebilir", "yardimci", "olur",
+    # Soru kelimeleri ve ekleri
+    "mi", "mu", "ne", "neler", "nedir", "nelerdir", "nasil", "nasildir", "hangi", "hangisi", "kac",
+    "kim", "kimdir", "niye", "neden", "nerede", "nereden",
+    # Bağlaçlar / zamirler
+    "ve", "veya", "ile", "ya", "da", "de", "ki", "bu", "su", "o", "bir", "icin", "gibi", "kadar",
+    "ben", "benim", "biz", "bizim", "sen", "siz", "var", "yok", "mudur", "midir", "dir", "dir",
+    "olan", "olarak", "ise", "ama", "fakat", "hem", "daha", "en", "cok", "az",
+}
+
+# Uzundan kısaya; katlanmış (aksansız) biçimde
+SUFFIXES = sorted({
+    "lerinden", "larindan", "lerinde", "larinda", "lerine", "larina", "lerini", "larini",
+    "leri", "lari", "ler", "lar", "sinin", "sinda", "sinde", "sina", "sine", "sini",
+    "nin", "nun", "ndan", "nden", "dan", "den", "tan", "ten", "nda", "nde", "inda", "inde",
+    "ina", "ine", "ini", "unu", "dir", "tir", "si", "su", "da", "de", "ta", "te",
+    "in", "un", "yi", "yu", "ya", "ye", "i", "u", "a", "e",
+}, key=len, reverse=True)
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def fold(text):
+    """Türkçe küçük harf + aksan katlama: 'ŞARTLARI' -> 'sartlari'."""
+    return text.replace("I", "ı").replace("İ", "i").lower().translate(FOLD_TABLE)
+
+def stem(word, min_length=3, max_passes=3):
+    """Hafif ek atma (katlanmış kelime üzerinde). Kök en az min_length harf kalır."""
+    for _ in range(max_passes):
+        for suffix in SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= min_length:
+                word = word[: -len(suffix)]
+                break
+        else:
+            break
+    return word
+
+def tokenize(text):
+    """[(yüzey_biçimi, kök)] — stopword'ler ve sayılar dahil, sıralı."""
+    return [(token, stem(fold(token))) for token in TOKEN_RE.findall(text)]
+
+def phrase_stems(phrase):
+    return tuple(s for _, s in tokenize(phrase))
+
+# --- KORPUS SÖZLÜĞÜ ---
+# "Tanımlar" maddesi bentleri: "b) AKTS: Avrupa Kredi Transfer Sistemini,"
+DEFINITION_RE = re.compile(r"^[ \t]*[a-zçğıöşü]{1,2}\)[ \t]*([^:\n]{2,60}?)[ \t]*:[ \t]*([^,;:\n]{3,100})", re.MULTILINE)
+# Kısaltma tanımı: "Avrupa Kredi Transfer Sistemi (AKTS)"
+ACRONYM_RE = re.compile(r"((?:[A-ZÇĞİÖŞÜ][\wçğıöşü]+[ \t]+){1,6}[A-ZÇĞİÖŞÜ]?[\wçğıöşü]+)[ \t]*\(([A-ZÇĞİÖŞÜ]{2,10})\)")
+
+class TermCollector:
+    """Bir belgenin parça metinlerinden kök kümesi ve tanım gruplarını biriktirir (akış halinde)."""
+    def __init__(self):
+        self.stems = set()
+        self.groups = []
+
+    def add(self, text):
+        for _, s in tokenize(text):
+            if len(s) >= 3 and not s.isdigit(): self.stems.add(s)
+        for term, definition in DEFINITION_RE.findall(text):
+            term, definition = term.strip(), definition.strip().rstrip(".")
+            if len(term.split()) <= 5 and len(definition.split()) <= 12:
+                self.groups.append([term.lower(), definition.lower()])
+        for long_form, acronym in ACRONYM_RE.findall(text):
+            self.groups.append([acronym.lower(), long_form.strip().lower()])
+
+class CorpusVocabulary:
+    """
+    Belge -> (kökler, tanım grupları). JSON dosyası ingest_worker ile app arasında paylaşılır;
+    değiştiği (mtime) zaman tekrar okunur. Belge silinince o belgenin terimleri de çıkar.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._sources = {}
+        self._stems = frozenset()
+        self._groups = []
+
+    def _reload(self):
+        try: mtime = os.stat(self.path).st_mtime_ns
+        except OSError: return
+        if mtime == self._mtime: return
+        try:
+            with open(self.path, encoding="utf-8") as f: self._sources = json.load(f).get("sources", {})
+        except (OSError, ValueError) as e:
+            print(f"Korpus Sözlüğü Okuma Hatası: {e}")
+            return
+        self._mtime = mtime
+        self._stems = frozenset(s for entry in self._sources.values() for s in entry.get("stems", []))
+        self._groups = [g for entry in self._sources.values() for g in entry.get("groups", [])]
+
+    def snapshot(self):
+        """(kök kümesi, tanım grupları, mtime)"""
+        with self._lock:
+            self._reload()
+            return self._stems, self._groups, self._mtime
+
+    def update_source(self, source, collector):
+        self._write(lambda sources: sources.__setitem__(source, {
+            "stems": sorted(collector.stems), "groups": collector.groups
+        }))
+
+    def remove_source(self, source):
+        self._write(lambda sources: sources.pop(source, None))
+
+    def _write(self, change):
+        with self._lock:
+            self._mtime = None
+            self._reload()
+            sources = dict(self._sources)
+            change(sources)
+            folder = os.path.dirname(self.path)
+            if folder: os.makedirs(folder, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"sources": sources}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path) # Okuyan süreç yarım dosya görmez
+            self._mtime = None
+
+# --- GENİŞLETME MOTORU ---
+Expansion = collections.namedtuple("Expansion", ["query", "confidence", "terms", "synonyms"])
+
+class QueryExpander:
+    def __init__(self, thesaurus_path, vocabulary=None):
+        self.thesaurus_path = thesaurus_path
+        self.vocabulary = vocabulary
+        self._lock = threading.Lock()
+        self._file_groups = self._load_thesaurus(thesaurus_path)
+        self._built_for = object()
+        self._index = {}
+        self._known = frozenset()
+
+    @staticmethod
+    def _load_thesaurus(path):
+        try:
+            with open(path, encoding="utf-8") as f: return json.load(f).get("groups", [])
+        except (OSError, ValueError) as e:
+            print(f"Eş Anlamlı Sözlüğü Okuma Hatası: {e}")
+            return []
+
+    def _ensure_index(self):
+        corpus_stems, corpus_groups, version = self.vocabulary.snapshot() if self.vocabulary else (frozenset(), [], None)
+        with self._lock:
+            if version == self._built_for: return self._index, self._known, corpus_stems
+            # İlk kök -> [(ifadenin kökleri, grup no)]; uzun ifadeler önce denenir
+            index = collections.defaultdict(list)
+            groups = self._file_groups + corpus_groups
+            for group_no, group in enumerate(groups):
+                for phrase in group:
+                    stems = phrase_stems(phrase)
+                    if stems: index[stems[0]].append((stems, group_no))
+            for entries in index.values(): entries.sort(key=lambda e: -len(e[0]))
+            self._index = (dict(index), groups)
+            self._known = frozenset(s for group in groups for phrase in group for s in phrase_stems(phrase))
+            self._built_for = version
+            return self._index, self._known, corpus_stems
+
+    def expand(self, question):
+        (index, groups), thesaurus_stems, corpus_stems = self._ensure_index()
+        tokens = tokenize(question)
+        stems = [s for _, s in tokens]
+
+        # Eş anlamlı ifadeleri bul (çok kelimeli ifadeler dahil)
+        matched_groups, i = [], 0
+        while i < len(stems):
+            for phrase, group_no in index.get(stems[i], []):
+                if tuple(stems[i : i + len(phrase)]) == phrase:
+                    if group_no not in matched_groups: matched_groups.append(group_no)
+                    i += len(phrase) - 1
+                    break
+            i += 1
+
+        content = [(surface, s) for surface, s in tokens if fold(surface) not in STOPWORDS and s not in STOPWORDS]
+        terms = [surface for surface, _ in content]
+
+        # Güven: içerik kelimelerinin ne kadarı korpusta/sözlükte biliniyor
+        if not content:
+            confidence = 0.0
+        elif corpus_stems:
+            known = sum(1 for _, s in content if s in corpus_stems or s in thesaurus_stems or s.isdigit())
+            confidence = known / len(content)
+        else:
+            # Korpus sözlüğü henüz yok: sadece eş anlamlı eşleşmesi güven verir
+            confidence = 1.0 if matched_groups else 0.5
+
+        seen = {fold(t) for t in terms}
+        synonyms = []
+        for group_no in matched_groups:
+            for phrase in groups[group_no]:
+                if fold(phrase) not in seen:
+                    seen.add(fold(phrase))
+                    synonyms.append(phrase)
+
+        query = " ".join(terms)
+        if synonyms: query += " / " + " / ".join(synonyms)
+        return Expansion(query.strip() or question, confidence, terms, synonyms)
+
+# --- SÜREÇ GENELİ ÖRNEKLER ---
+_vocabulary = None
+_expander = None
+_lock = threading.Lock()
+
+def get_corpus_vocabulary():
+    global _vocabulary
+    with _lock:
+        if _vocabulary is None:
+            _vocabulary = CorpusVocabulary(get_setting("CORPUS_VOCABULARY_PATH", os.path.join(".cache", "corpus_vocabulary.json")))
+        return _vocabulary
+
+def get_query_expander():
+    global _expander
+    vocabulary = get_corpus_vocabulary()
+    with _lock:
+        if _expander is None:
+            default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_thesaurus.json")
+            _expander = QueryExpander(get_setting("QUERY_THESAURUS_PATH", default_path), vocabulary)
+        return _expander
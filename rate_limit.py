@@ -0,0 +1,69 @@
+import random
+import threading
+import time
+
+# --- 1. TOKEN BUCKET (HIZ SINIRLAYICI) ---
+class TokenBucket:
+    """
+    Thread-safe token-bucket. Saniyede `rate` kadar token dolar,
+    en fazla `capacity` kadar birikir (anlık patlama limiti).
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = max(float(rate), 1e-6)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1.0):
+        """Yeterli token birikene kadar bekler."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    @classmethod
+    def per_minute(cls, rpm, burst=None):
+        """Dakikalık kota (RPM) üzerinden bucket oluşturur."""
+        return cls(rate=float(rpm) / 60.0, capacity=burst)
+
+# --- 2. BEKLEME SÜRESİ (BACKOFF) ---
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Üstel bekleme + tam jitter: [0, min(cap, base * 2^attempt)]"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+# --- 3. TEKRAR DENENEBİLİR HATA TESPİTİ ---
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_MARKERS = (
+    "429", "500", "502", "503", "504", "Too Many Requests", "RESOURCE_EXHAUSTED",
+    "UNAVAILABLE", "Deadline Exceeded", "DEADLINE_EXCEEDED", "timed out", "Connection reset",
+)
+
+def is_retryable_error(error):
+    """429 / 5xx / zaman aşımı gibi geçici hataları ayırt eder."""
+    for attr in ("status", "status_code", "code"):
+        status = getattr(error, attr, None)
+        if isinstance(status, int) and status in RETRYABLE_STATUS:
+            return True
+    message = str(error)
+    return any(marker in message for marker in RETRYABLE_MARKERS)
+
+def call_with_retry(fn, max_retries=3, bucket=None, base=1.0, cap=30.0, retryable=is_retryable_error):
+    """
+    fn() çağrısını hız limitine uyarak yapar; geçici hatalarda üstel bekleme + jitter ile
+    tekrar dener. Kalıcı hata veya deneme hakkı bitince son hatayı fırlatır.
+    """
+    for attempt in range(max_retries + 1):
+        if bucket is not None: bucket.acquire()
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= max_retries or not retryable(e):
+                raise
+            time.sleep(backoff_delay(attempt, base=base, cap=cap))
@@ -0,0 +1,236 @@
+import json
+import math
+import os
+import re
+import threading
+from llm_gateway import get_gateway
+from settings import get_setting
+
+# --- TAKILABİLİR RERANKER ---
+# Eski yol: ~60 aday x 2500 karakter tek prompt'ta Gemini'ye gider, cevaptan JSON ayıklanır;
+# ayrıştırma bozulursa sessizce ilk 5 belge döner. Soru başına en yavaş ve en pahalı adım.
+# Arayüz: rerank(query, docs) -> seçilmiş belgeler (en alakalı önce). Skor, belgenin
+# metadata'sına "rerank_score" olarak yazılır.
+#   - "cross_encoder": yerel çok dilli cross-encoder, CPU'da toplu (batch) skorlar.
+#     İsteğe bağlı çalışma zamanı: torch, torch_int8 (dinamik nicemleme), onnx, onnx_int8.
+#   - "llm": eski Gemini hakemi.
+# Cross-encoder'dan sonra LLM hakemi sadece ilk birkaç aday üzerinde ikinci tur olarak çalışabilir.
+
+DEFAULT_CROSS_ENCODER = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+class LLMJudgeReranker:
+    """Gemini'ye "Hakem" rolüyle aday listesi verir, seçtiği indeksleri döndürür."""
+    name = "llm"
+
+    def __init__(self, max_chars=2500, fallback_n=5):
+        self.max_chars = max_chars
+        self.fallback_n = fallback_n
+
+    def select(self, query, docs):
+        """Seçilen belgeler; cevap alınamaz veya ayrıştırılamazsa None."""
+        doc_text = ""
+        for i, doc in enumerate(docs):
+            source = os.path.basename(doc.metadata.get("source", "Bilinmiyor"))
+            clean_content = doc.page_content.replace("\n", " ").strip()
+            # 2500 karaktere çıkardık ki bağlam kopmasın
+            doc_text += f"\n[ID: {i}] (Kaynak: {source}) -> {clean_content[:self.max_chars]}...\n"
+
+        rerank_prompt = f"""
+    GÖREV: Aşağıdaki belge parçalarını analiz et ve kullanıcının sorusuyla EN ALAKALI olanları seç.
+
+    SORU: "{query}"
+
+    ADAY BELGELER:
+    {doc_text}
+
+    SEÇİM STRATEJİSİ (GENEL KURALLAR):
+    1. Belge, sorudaki ana konuyu (Staj, Kredi, AKTS, Puan) anlatıyor mu?
+    2. Sorudaki detaylar belgede birebir geçmeyebilir. ANLAM olarak eşleşiyorsa SEÇ.
+    3. Soru "Seviye" diyebilir, Belge "Düzey" diyebilir. Bunun gibi benzer anlamlıları aynı kabul et.
+    3. (30 AKTS, %20, 65 puan) gibi sayısal veriler içeren belgeleri önceliklendir.
+
+    ÇIKTI FORMATI (JSON):
+    {{ "selected_indices": [0, 2, 5] }}
+    """
+        try:
+            response = get_gateway().invoke(rerank_prompt, site="rerank", temperature=0.0)
+            cleaned_response = re.sub(r"```json|```", "", response).strip()
+            selected_indices = json.loads(cleaned_response).get("selected_indices", [])
+        except Exception as e:
+            print(f"LLM Hakem Hatası: {e}")
+            return None
+        selected = []
+        for i in selected_indices:
+            if isinstance(i, int) and 0 <= i < len(docs) and docs[i] not in selected: selected.append(docs[i])
+        return selected or None
+
+    def rerank(self, query, docs):
+        selected = self.select(query, docs)
+        if selected is None: return docs[: self.fallback_n] # Hiçbir şey bulamazsa ilk 5'i döndür
+        for rank, doc in enumerate(selected): doc.metadata["rerank_score"] = 1.0 / (rank + 1)
+        return selected
+
+class CrossEncoderReranker:
+    """
+    (soru, parça) çiftlerini yerel cross-encoder ile skorlar. Model ilk kullanımda bir kez yüklenir;
+    yüklenemezse (paket/model yok) available False olur ve çağıran LLM hakemine düşer.
+    """
+    name = "cross_encoder"
+
+    def __init__(self, model_name=DEFAULT_CROSS_ENCODER, runtime="torch", top_n=5, threshold=None,
+                 min_results=2, batch_size=16, max_chars=2000, max_length=512, cache_dir=os.path.join(".cache", "reranker")):
+        self.model_name = model_name
+        self.runtime = runtime
+        self.top_n = top_n
+        self.threshold = threshold
+        self.min_results = min_results
+        self.batch_size = batch_size
+        self.max_chars = max_chars
+        self.max_length = max_length
+        self.cache_dir = cache_dir
+        self._model = None
+        self._onnx = None # (InferenceSession, tokenizer, giriş adları)
+        self._failed = False
+        self._load_lock = threading.Lock()
+        self._predict_lock = threading.Lock() # CPU çekirdekleri oturumlar arasında paylaşılmasın diye sırayla
+
+    @property
+    def available(self):
+        return self._ensure_loaded()
+
+    def _ensure_loaded(self):
+        with self._load_lock:
+            if self._model is not None or self._onnx is not None: return True
+            if self._failed: return False
+            try:
+                from sentence_transformers import CrossEncoder
+                model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+            except Exception as e:
+                print(f"Cross-Encoder Yükleme Hatası: {e}")
+                self._failed = True
+                return False
+
+            if self.runtime in ("onnx", "onnx_int8"):
+                try: self._onnx = self._load_onnx(model, quantize=self.runtime == "onnx_int8")
+                except Exception as e: print(f"ONNX Dönüşüm Hatası (torch kullanılacak): {e}")
+            elif self.runtime == "torch_int8":
+                try:
+                    import torch
+                    model.model = torch.quantization.quantize_dynamic(model.model, {torch.nn.Linear}, dtype=torch.qint8)
+                except Exception as e: print(f"int8 Nicemleme Hatası (float32 kullanılacak): {e}")
+            if self._onnx is None: self._model = model
+            return True
+
+    def _load_onnx(self, model, quantize):
+        """Modeli bir kez ONNX'e çevirir (isteğe bağlı int8), dosyayı cache_dir'de tekrar kullanır."""
+        import onnxruntime
+        folder = os.path.join(self.cache_dir, re.sub(r"[^\w.-]", "_", self.model_name))
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, "model.onnx")
+        tokenizer = model.tokenizer
+        if not os.path.exists(path):
+            import torch
+            sample = dict(tokenizer(["soru"], ["belge"], return_tensors="pt"))
+            axes = {name: {0: "batch", 1: "sequence"} for name in sample}
+            axes["logits"] = {0: "batch"}
+            model.model.eval()
+            tmp_path = f"{path}.tmp"
+            torch.onnx.export(
+                model.model, (sample,), tmp_path, input_names=list(sample), output_names=["logits"],
+                dynamic_axes=axes, opset_version=14
+            )
+            os.replace(tmp_path, path)
+        if quantize:
+            quantized_path = os.path.join(folder, "model.int8.onnx")
+            if not os.path.exists(quantized_path):
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+                quantize_dynamic(path, quantized_path, weight_type=QuantType.QInt8)
+            path = quantized_path
+        session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        return session, tokenizer, {i.name for i in session.get_inputs()}
+
+    def score(self, query, docs):
+        """Belge başına alaka olasılığı (0-1). Model yoksa None."""
+        if not docs or not self._ensure_loaded(): return None
+        pairs = [(query, doc.page_content[: self.max_chars]) for doc in docs]
+        with self._predict_lock:
+            if self._onnx is not None: logits = self._predict_onnx(pairs)
+            else: logits = [float(x) for x in self._model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)]
+        # Tek çıkışlı (logit) modellerde olasılık; eşik değeri bu ölçektedir
+        return [1.0 / (1.0 + math.exp(-max(min(x, 50.0), -50.0))) for x in logits]
+
+    def _predict_onnx(self, pairs):
+        session, tokenizer, input_names = self._onnx
+        logits = []
+        for i in range(0, len(pairs), self.batch_size):
+            batch = pairs[i : i + self.batch_size]
+            encoded = tokenizer(
+                [q for q, _ in batch], [d for _, d in batch],
+                padding=True, truncation="only_second", max_length=self.max_length, return_tensors="np"
+            )
+            feed = {name: value.astype("int64") for name, value in encoded.items() if name in input_names}
+            output = session.run(["logits"], feed)[0]
+            logits.extend(float(row[0]) for row in output)
+        return logits
+
+    def rerank(self, query, docs):
+        scores = self.score(query, docs)
+        if scores is None: return None
+        ranked = sorted(zip(docs, scores), key=lambda pair: -pair[1])
+        kept = []
+        for rank, (doc, score) in enumerate(ranked[: self.top_n]):
+            if self.threshold is not None and score < self.threshold and rank >= self.min_results: break
+            doc.metadata["rerank_score"] = score
+            kept.append(doc)
+        return kept
+
+class RerankPipeline:
+    """Birincil reranker + isteğe bağlı LLM ikinci turu (sadece ilk llm_candidates aday)."""
+    def __init__(self, primary, judge=None, llm_candidates=8):
+        self.primary = primary
+        self.judge = judge or LLMJudgeReranker()
+        self.llm_candidates = llm_candidates
+
+    def rerank(self, query, docs, second_pass=False):
+        if not docs: return []
+        if self.primary is None: return self.judge.rerank(query, docs)
+        try:
+            ranked = self.primary.rerank(query, docs)
+        except Exception as e:
+            print(f"Reranker Hatası ({self.primary.name}): {e}")
+            ranked = None
+        if ranked is None: return self.judge.rerank(query, docs) # Model yok: eski hakem
+        if not second_pass or len(ranked) <= 1: return ranked
+
+        # İkinci tur: hakem sadece en iyi birkaç adayı okur; cevap gelmezse birinci tur sonucu kalır
+        shortlist = ranked[: self.llm_candidates]
+        selected = self.judge.select(query, shortlist)
+        return selected if selected else ranked
+
+# --- SÜREÇ GENELİ ÖRNEK ---
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def get_reranker():
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            primary = None
+            if get_setting("RERANKER", "cross_encoder") == "cross_encoder":
+                threshold = get_setting("RERANK_SCORE_THRESHOLD", 0.0, float)
+                primary = CrossEncoderReranker(
+                    model_name=get_setting("RERANKER_MODEL", DEFAULT_CROSS_ENCODER),
+                    runtime=get_setting("RERANKER_RUNTIME", "torch"),
+                    # İkinci tur açıksa hakemin seçebileceği kadar aday bırakılır
+                    top_n=max(get_setting("RERANK_TOP_N", 5, int),
+                              get_setting("RERANK_LLM_CANDIDATES", 8, int) if get_setting("RERANK_LLM_SECOND_PASS", False, bool) else 0),
+                    threshold=threshold if threshold > 0 else None,
+                    min_results=get_setting("RERANK_MIN_RESULTS", 2, int),
+                    batch_size=get_setting("RERANK_BATCH_SIZE", 16, int)
+                )
+            _pipeline = RerankPipeline(primary, llm_candidates=get_setting("RERANK_LLM_CANDIDATES", 8, int))
+        return _pipeline
+
+def rerank_documents(query, docs):
+    """generation.py'nin kullandığı tek giriş noktası."""
+    return get_reranker().rerank(query, docs, second_pass=get_setting("RERANK_LLM_SECOND_PASS", False, bool))
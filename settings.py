@@ -0,0 +1,23 @@
+import os
+import streamlit as st
+
+# --- AYAR OKUYUCU ---
+# Öncelik: Ortam değişkeni -> st.secrets -> varsayılan değer.
+# Ortam değişkeni desteği, Streamlit dışında çalışan betikler (worker, benchmark) içindir.
+def get_setting(name, default=None, cast=None):
+    value = os.environ.get(name)
+    if value is None:
+        try:
+            value = st.secrets.get(name)
+        except Exception:
+            value = None
+    if value is None:
+        return default
+    if cast is None:
+        return value
+    try:
+        if cast is bool and isinstance(value, str):
+            return value.strip().lower() in ("1", "true", "evet", "yes", "on")
+        return cast(value)
+    except (TypeError, ValueError):
+        return default
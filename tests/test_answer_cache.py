@@ -0,0 +1,63 @@
+from answer_cache import AnswerCache, normalize_question
+
+RESULT = {"answer": "Staj 20 iş günüdür.", "sources": ["staj.pdf"]}
+
+def _cache(**kwargs):
+    return AnswerCache(":memory:", **kwargs)
+
+def test_normalize_question_handles_turkish_case_and_punctuation():
+    assert normalize_question("  İTİRAZ   süresi ne?  ") == "itiraz süresi ne"
+    assert normalize_question("Staj NE ZAMAN?") == normalize_question("staj ne zaman")
+
+def test_exact_hit_without_embedding():
+    cache = _cache()
+    cache.put("Staj ne zaman?", RESULT, embedding=[1.0, 0.0])
+    assert cache.get_exact("staj ne zaman") == (RESULT, "exact")
+    assert cache.get_exact("burs ne zaman") == (None, None)
+    stats = cache.stats()
+    assert stats["hits_exact"] == 1 and stats["misses"] == 0
+
+def test_semantic_hit_above_threshold():
+    cache = _cache(similarity_threshold=0.9)
+    cache.put("staj ne zaman", RESULT, embedding=[1.0, 0.0])
+    assert cache.get("stajlar ne zaman yapılır", embedding=[0.99, 0.05]) == (RESULT, "semantic")
+    assert cache.get("burs ne zaman", embedding=[0.0, 1.0]) == (None, None)
+    assert cache.stats()["misses"] == 1
+
+def test_corpus_version_invalidates_and_rejects_stale_answers():
+    cache = _cache()
+    version = cache.corpus_version()
+    cache.put("staj ne zaman", RESULT, corpus_version=version)
+    cache.bump_corpus_version()
+    assert cache.get("staj ne zaman") == (None, None)
+    cache.put("staj ne zaman", RESULT, corpus_version=version) # Eski korpusla üretilmiş
+    assert cache.get_exact("staj ne zaman") == (None, None)
+
+def test_ttl_and_max_entries():
+    expired = _cache(ttl_seconds=-1)
+    expired.put("staj ne zaman", RESULT)
+    assert expired.get_exact("staj ne zaman") == (None, None)
+
+    small = _cache(max_entries=2)
+    for question in ("bir", "iki", "üç"): small.put(question, RESULT)
+    assert small.stats()["entries"] == 2
+
+def test_exact_lookup_does_not_embed_the_question(monkeypatch):
+    import answer_cache
+    import generation
+    cache = _cache()
+    cache.put("staj ne zaman", RESULT, embedding=[1.0, 0.0])
+    monkeypatch.setattr(answer_cache, "_cache", cache)
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "true")
+
+    class CountingEmbeddings:
+        calls = 0
+        def embed_query(self, text):
+            CountingEmbeddings.calls += 1
+            return [0.0, 1.0]
+
+    store = type("Store", (), {"embeddings": CountingEmbeddings()})()
+    _, _, _, cached = generation._cache_lookup("Staj ne zaman?", store)
+    assert cached["cache_hit"] == "exact" and CountingEmbeddings.calls == 0
+    _, embedding, _, cached = generation._cache_lookup("burs ne zaman", store)
+    assert cached is None and embedding == [0.0, 1.0] and CountingEmbeddings.calls == 1
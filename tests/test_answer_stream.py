@@ -0,0 +1,58 @@
+import time
+import pytest
+import generation
+
+class FakeGateway:
+    """Cevabı kelime kelime akıtır; fail_after verilirse o kadar parçadan sonra koparır."""
+    def __init__(self, answer, fail_after=None):
+        self.answer = answer
+        self.fail_after = fail_after
+        self.prompts = []
+
+    def stream(self, prompt, site, temperature):
+        self.prompts.append(prompt)
+        for i, word in enumerate(self.answer.split(" ")):
+            if i == self.fail_after: raise ConnectionError("bağlantı koptu")
+            yield word + " "
+
+@pytest.fixture
+def answering(monkeypatch):
+    monkeypatch.setenv("TRACING", "false")
+    monkeypatch.setattr(generation, "_cache_lookup", lambda question, vector_store: (None, None, None, None))
+    prepared = lambda question, vector_store, chat_history: {
+        "prompt": f"SORU: {question}", "sources": ["a.pdf"], "timings": {"retrieval": 1.0}, "started": time.perf_counter()
+    }
+    monkeypatch.setattr(generation, "prepare_answer", prepared)
+    def install(gateway):
+        monkeypatch.setattr(generation, "get_gateway", lambda: gateway)
+        return gateway
+    return install
+
+def test_tokens_arrive_before_result_is_filled(answering):
+    answering(FakeGateway("Staj 30 iş günüdür."))
+    tokens, result = generation.generate_answer_stream("staj süresi", None, [])
+    assert next(tokens) == "Staj " and result == {} # Sonuç akış bitince dolar
+    assert "Staj " + "".join(tokens) == "Staj 30 iş günüdür. "
+    assert result["answer"] == "Staj 30 iş günüdür. " and result["sources"] == ["a.pdf"]
+    assert {"first_token", "answer", "total"} <= set(result["timings"])
+    spans = [s["name"] for s in result["trace"]["spans"]]
+    assert spans == ["answer"] and result["trace"]["spans"][0]["attrs"] == {"tokens": 4}
+    assert [e["name"] for e in result["trace"]["events"]] == ["first_token"]
+
+def test_broken_stream_keeps_partial_answer_and_flags_error(answering):
+    answering(FakeGateway("Staj 30 iş günüdür.", fail_after=2))
+    tokens, result = generation.generate_answer_stream("staj süresi", None, [])
+    received = list(tokens)
+    assert received[:2] == ["Staj ", "30 "] and "yarıda kesildi" in received[-1]
+    assert result["error"] is True and result["sources"] == []
+    assert result["answer"] == "".join(received)
+    assert result["trace"]["spans"][0]["attrs"] == {"error": "ConnectionError", "tokens": 2}
+
+def test_cached_answer_is_yielded_at_once(answering, monkeypatch):
+    gateway = answering(FakeGateway("kullanılmamalı"))
+    cached = {"answer": "Önbellekten.", "sources": ["b.pdf"], "cache_hit": "exact", "timings": {"cache": 0.1, "total": 0.1}}
+    monkeypatch.setattr(generation, "_cache_lookup", lambda question, vector_store: (None, None, None, cached))
+    tokens, result = generation.generate_answer_stream("staj süresi", None, [])
+    assert list(tokens) == ["Önbellekten."]
+    assert result["cache_hit"] == "exact" and result["sources"] == ["b.pdf"]
+    assert gateway.prompts == []
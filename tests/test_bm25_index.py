@@ -0,0 +1,58 @@
+from langchain_core.documents import Document
+from bm25_index import BM25Index, index_terms, reciprocal_rank_fusion
+
+def _doc(text, source="a.pdf", **metadata):
+    return Document(page_content=text, metadata={"source": source, **metadata})
+
+def _index():
+    index = BM25Index(":memory:")
+    index.add([
+        ("a1", _doc("MADDE 14 – Ağırlıklı genel not ortalaması AA katsayısı 4,00 olarak hesaplanır.")),
+        ("a2", _doc("MADDE 15 – Staj süresi 20 iş günüdür.")),
+        ("b1", _doc("MADDE 3 – Yatay geçiş başvuruları 65 puan ve üzeri ile yapılır.", source="b.pdf")),
+    ])
+    return index
+
+def test_index_terms_drop_stopwords_keep_numbers():
+    assert index_terms("Madde 14 nedir ve AA katsayısı ne?") == index_terms("madde 14 AA katsayısı")
+    assert "14" in index_terms("Madde 14") and index_terms("ne nedir ve") == []
+
+def test_search_ranks_exact_tokens_first():
+    results = _index().search("AA katsayısı kaç?", k=2)
+    assert [d.id for d in results] == ["a1"]
+    assert results[0].metadata["source"] == "a.pdf" and results[0].metadata["bm25_score"] > 0
+    assert results[0].page_content.startswith("MADDE 14")
+    assert _index().search("65 puan")[0].id == "b1"
+    assert _index().search("ne nedir") == []
+
+def test_add_replaces_and_retain_removes_stale_chunks():
+    index = _index()
+    index.add([("a2", _doc("MADDE 15 – Staj defteri teslim edilir."))])
+    assert index.search("süresi") == []
+    assert index.retain("a.pdf", frozenset({"a1"})) == 1
+    assert index.stats() == {"chunks": 2, "sources": 2}
+    index.remove_source("b.pdf")
+    assert index.search("puan") == []
+
+def test_rrf_merges_duplicates_and_orders_by_rank():
+    dense = [_doc("x", chunk_id="x"), _doc("y", chunk_id="y")]
+    keyword = [_doc("y", chunk_id="y"), _doc("z", chunk_id="z")]
+    fused = reciprocal_rank_fusion([dense, keyword])
+    assert [d.metadata["chunk_id"] for d in fused] == ["y", "x", "z"]
+    assert len(reciprocal_rank_fusion([dense, keyword], limit=2)) == 2
+
+def test_rrf_falls_back_to_content_key_without_ids():
+    first = [_doc("aynı metin", page=1)]
+    second = [_doc("aynı metin", page=1), _doc("farklı", page=2)]
+    assert [d.page_content for d in reciprocal_rank_fusion([first, second])] == ["aynı metin", "farklı"]
+
+def test_empty_index_keeps_full_dense_limits(monkeypatch):
+    import generation
+    monkeypatch.delenv("DENSE_K", raising=False)
+    monkeypatch.delenv("DENSE_FETCH_K", raising=False)
+    empty = BM25Index(":memory:")
+    monkeypatch.setattr(generation, "get_bm25_index", lambda: empty)
+    assert empty.is_empty() and generation.dense_limits() == (30, 300)
+    assert generation.keyword_search("staj", "staj") is None
+    monkeypatch.setattr(generation, "get_bm25_index", _index)
+    assert generation.dense_limits() == (15, 80)
@@ -0,0 +1,35 @@
+from langchain_core.documents import Document
+from data_ingestion import assign_chunk_ids
+from legal_chunker import LegalChunker
+
+PAGES = [
+    "MADDE 1 – (1) Staj süresi en az 20 iş günüdür.\nMADDE 2 – (1) Staj defteri bölüme teslim edilir.\n",
+    "MADDE 3 – (1) İtiraz süresi beş iş günüdür.\n",
+]
+
+def _chunks(title):
+    chunker = LegalChunker(title)
+    chunks = []
+    for i, text in enumerate(PAGES):
+        chunks.extend(chunker.feed(Document(page_content=text, metadata={"source": "staj.pdf", "page": i + 1})))
+    return chunks + chunker.finish()
+
+def test_ids_do_not_depend_on_detected_title():
+    first = [chunk_id for chunk_id, _ in assign_chunk_ids(_chunks("Staj Yönetmeliği"))]
+    second = [chunk_id for chunk_id, _ in assign_chunk_ids(_chunks("Staj Uygulama Yönergesi"))]
+    assert len(first) == 3
+    assert first == second
+
+def test_ids_depend_on_source_page_and_body():
+    doc = lambda text, source="a.pdf", page=1: Document(page_content=text, metadata={"source": source, "page": page})
+    ids = [chunk_id for chunk_id, _ in assign_chunk_ids([
+        doc("MADDE 1 – metin"), doc("MADDE 1 – başka metin"), doc("MADDE 1 – metin", page=2), doc("MADDE 1 – metin", source="b.pdf"),
+    ])]
+    assert len(set(ids)) == 4
+
+def test_duplicate_chunks_are_dropped_across_calls():
+    seen = set()
+    first = assign_chunk_ids(_chunks("Staj Yönetmeliği"), seen)
+    again = assign_chunk_ids(_chunks("Başka Başlık"), seen)
+    assert len(first) == 3 and again == []
+    assert all(chunk.metadata["chunk_id"] == chunk_id for chunk_id, chunk in first)
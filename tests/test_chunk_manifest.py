@@ -0,0 +1,88 @@
+import collections
+import pytest
+from langchain_core.documents import Document
+import data_ingestion
+from chunk_manifest import LEGACY_VERSION, LocalManifestStore, VisibilityFilter
+from local_vector_store import LocalIndex
+
+def _doc(source, chunk_id=None):
+    metadata = {"source": source}
+    if chunk_id: metadata["chunk_id"] = chunk_id
+    return Document(page_content=chunk_id or "eski", metadata=metadata)
+
+def _visible(visibility, docs):
+    return [d.metadata.get("chunk_id", "legacy") for d in visibility.filter(docs)]
+
+def test_documents_without_manifest_stay_visible():
+    visibility = VisibilityFilter(LocalManifestStore(":memory:"))
+    assert _visible(visibility, [_doc("a.pdf"), _doc("a.pdf", "a-1")]) == ["legacy", "a-1"]
+
+def test_deleted_source_hides_everything():
+    store = LocalManifestStore(":memory:")
+    store.put("a.pdf", (), pending={"a-1"}, deleted=True)
+    assert _visible(VisibilityFilter(store), [_doc("a.pdf"), _doc("a.pdf", "a-1"), _doc("b.pdf")]) == ["legacy"]
+
+def test_reupload_of_legacy_source_switches_atomically(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_ingestion, "get_bm25_index", lambda: None)
+    monkeypatch.setattr(data_ingestion, "bump_corpus_version", lambda: None)
+    index = LocalIndex(str(tmp_path / "index"), initial_capacity=4)
+    index.upsert([("uuid-1", [1.0, 0.0], {"source": "a.pdf"}), ("uuid-2", [0.0, 1.0], {"source": "b.pdf"})])
+    store = LocalManifestStore(":memory:")
+    visibility = VisibilityFilter(store, ttl_seconds=0)
+    docs = [_doc("a.pdf"), _doc("a.pdf", "a-new"), _doc("b.pdf")]
+
+    # Yükleme başında açılan manifest: yeni parça yazılmış ama geçiş yapılmamış
+    store.put("a.pdf", (), version=LEGACY_VERSION)
+    index.upsert([("a-new", [1.0, 1.0], {"source": "a.pdf", "chunk_id": "a-new"})])
+    assert _visible(visibility, docs) == ["legacy", "legacy"]
+
+    stats = collections.Counter()
+    data_ingestion._finish_file(index, store, "a.pdf", frozenset(), frozenset({"a-new"}), True, stats, None, True)
+    assert _visible(visibility, docs) == ["a-new", "legacy"]
+    assert store.get("a.pdf").version == LEGACY_VERSION + 1
+    # Eski kayıt index'ten de silinir, başka belgenin eski kaydına dokunulmaz
+    assert sorted(index.fetch(["uuid-1", "uuid-2", "a-new"]).vectors) == ["a-new", "uuid-2"]
+
+class FilterlessIndex(LocalIndex):
+    """Pinecone serverless gibi metadata filtresiyle silmeyi desteklemeyen index."""
+    def delete(self, ids=None, filter=None, **kwargs):
+        if filter: raise RuntimeError("filter delete not supported")
+        return super().delete(ids=ids, **kwargs)
+
+def test_legacy_delete_falls_back_to_ids(tmp_path):
+    index = FilterlessIndex(str(tmp_path / "index"), initial_capacity=4)
+    index.upsert([
+        ("uuid-1", [1.0, 0.0], {"source": "a.pdf"}),
+        ("uuid-2", [0.0, 1.0], {"source": "b.pdf"}),
+        (data_ingestion.make_chunk_id("a.pdf", 1, "h"), [1.0, 1.0], {"source": "a.pdf", "chunk_id": "x"}),
+    ])
+    data_ingestion.delete_legacy_vectors(index, "a.pdf")
+    assert index.describe_index_stats()["total_vector_count"] == 2
+    assert index.fetch(["uuid-1"]).vectors == {}
+
+def test_legacy_delete_failure_reaches_the_caller(tmp_path):
+    class BrokenIndex(FilterlessIndex):
+        def list(self, **kwargs): raise RuntimeError("list not supported")
+    index = BrokenIndex(str(tmp_path / "index"), initial_capacity=4)
+    index.upsert([("uuid-1", [1.0, 0.0], {"source": "a.pdf"})])
+    with pytest.raises(RuntimeError, match="list"):
+        data_ingestion.delete_legacy_vectors(index, "a.pdf")
+
+class CountingStore(LocalManifestStore):
+    calls = 0
+    def versions(self, sources):
+        CountingStore.calls += 1
+        return super().versions(sources)
+
+def test_versions_are_cached_until_ttl_or_corpus_change():
+    store, now, corpus = CountingStore(":memory:"), [0.0], [1]
+    visibility = VisibilityFilter(store, ttl_seconds=30, corpus_version=lambda: corpus[0], clock=lambda: now[0])
+    docs = [_doc("a.pdf", "a-1"), _doc("b.pdf")]
+    assert _visible(visibility, docs) == ["a-1", "legacy"]
+    store.put("a.pdf", {"a-2"})
+    assert _visible(visibility, docs) == ["a-1", "legacy"] and CountingStore.calls == 1
+    corpus[0] = 2 # Yükleme sonrası korpus sürümü arttı
+    assert _visible(visibility, docs) == ["legacy"] and CountingStore.calls == 2
+    store.remove("a.pdf")
+    now[0] = 31
+    assert _visible(visibility, docs) == ["a-1", "legacy"] and CountingStore.calls == 3
@@ -0,0 +1,50 @@
+from langchain_core.documents import Document
+from context_builder import build_context, estimate_tokens, merge_overlap, strip_header
+
+def _doc(text, source="staj.pdf", page=1, page_end=None, score=None, title="Staj Yönetmeliği"):
+    metadata = {"source": source, "page": page, "page_end": page_end or page}
+    if score is not None: metadata["rerank_score"] = score
+    header = f"BELGE: {title}\nSAYFA: {page}\n---\n"
+    return Document(page_content=header + text, metadata=metadata)
+
+def test_strip_header_keeps_article_label_when_body_lacks_it():
+    text = "BELGE: Staj Yönetmeliği\nSAYFA: 2\nMADDE 5 (Süre)\n---\n(1) Staj 20 gündür."
+    assert strip_header(text) == "MADDE 5 (Süre) (1) Staj 20 gündür."
+    assert strip_header("BELGE: X\nSAYFA: 1\n---\nMADDE 5 – metin") == "MADDE 5 – metin"
+    assert strip_header("başlıksız metin") == "başlıksız metin"
+
+def test_merge_overlap():
+    assert merge_overlap("a" * 10 + "ortak kısım burada yer alıyor", "ortak kısım burada yer alıyor devam") == \
+        "a" * 10 + "ortak kısım burada yer alıyor devam"
+    assert merge_overlap("tamamen farklı bir metin", "başka bir metin parçası") is None
+
+def test_pages_are_rendered_one_based_as_stored():
+    context, sources = build_context([_doc("MADDE 1 – ilk.", page=1), _doc("MADDE 9 – son.", page=3, page_end=4)], token_budget=1000)
+    assert sources == ["staj.pdf"]
+    assert "(Sayfa 1, 3-4)" in context
+    assert "BELGE:" not in context
+
+def test_sources_ordered_by_rerank_score():
+    docs = [_doc("MADDE 1 – burs.", source="burs.pdf", score=0.2), _doc("MADDE 2 – staj.", source="staj.pdf", score=0.9)]
+    context, sources = build_context(docs, token_budget=1000)
+    assert sources == ["staj.pdf", "burs.pdf"]
+    assert context.index("staj.pdf") < context.index("burs.pdf")
+
+def test_budget_is_never_exceeded_after_trimming():
+    long_text = "MADDE 3 – " + " ".join(f"kelime{i}" for i in range(400))
+    # Uzun dosya adları başlık payını (30 token) aşar; kısaltılmış parça yine de sığmalı
+    docs = [_doc(long_text, source="b" * 150 + f"{i}.pdf", page=i + 1, score=1.0 - i * 0.1) for i in range(4)]
+    for budget in (100, 160, 200, 320, 500):
+        context, sources = build_context(docs, token_budget=budget, chars_per_token=3.5, min_tokens=20)
+        assert estimate_tokens(context, 3.5) <= budget
+
+def test_each_chunk_renders_only_its_own_source(monkeypatch):
+    import context_builder
+    rendered = []
+    render_group = context_builder._render_group
+    monkeypatch.setattr(context_builder, "_render_group", lambda source, blocks: rendered.append(source) or render_group(source, blocks))
+    docs = [_doc(f"MADDE {i} – kısa hüküm {i}.", source=f"belge{i}.pdf", score=1.0 - i / 100) for i in range(40)]
+    context, sources = build_context(docs, token_budget=100000)
+    assert len(sources) == 40 and context.count("--- KAYNAK:") == 40
+    # Parça başına bir ölçüm + en sonda bir kez oluşturma (eskiden her parçada tüm bağlam)
+    assert len(rendered) == 80
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from embedding_cache import CachedEmbeddings, EmbeddingCache, batch_embed_queries
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.documents = []
+        self.queries = []
+
+    def _vector(self, text):
+        return [float(len(text)), 1.0, 0.5]
+
+    def embed_documents(self, texts):
+        self.documents.extend(texts)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [0.0, 0.0, float(len(text))]
+
+def _cached(tmp_path, model=None):
+    return CachedEmbeddings(model or CountingEmbeddings(), EmbeddingCache(str(tmp_path / "cache")), "test-model")
+
+def test_documents_are_embedded_once_and_deduplicated(tmp_path):
+    cached = _cached(tmp_path)
+    first = cached.embed_documents(["staj süresi", "burs", "staj  süresi"])
+    assert cached.underlying.documents == ["staj süresi", "burs"] # Boşluk farkı aynı anahtar
+    assert first[0] == first[2] == [11.0, 1.0, 0.5]
+    cached.embed_documents(["burs", "staj süresi"])
+    assert cached.underlying.documents == ["staj süresi", "burs"]
+    stats = cached.stats()
+    assert (stats["hits"], stats["misses"], stats["vectors"]) == (3, 2, 2)
+
+def test_query_and_document_vectors_are_kept_apart(tmp_path):
+    cached = _cached(tmp_path)
+    cached.embed_documents(["staj"])
+    assert cached.embed_query("staj") == [0.0, 0.0, 4.0]
+    assert cached.underlying.queries == ["staj"]
+    assert cached.embed_query("staj") == [0.0, 0.0, 4.0]
+    assert cached.underlying.queries == ["staj"]
+
+def test_cache_persists_across_instances(tmp_path):
+    _cached(tmp_path).embed_documents(["kalıcı metin"])
+    reopened = _cached(tmp_path)
+    vector, missing = reopened.cached_document_vectors(["kalıcı metin", "yeni metin"])
+    np.testing.assert_allclose(vector, [12.0, 1.0, 0.5])
+    assert missing is None and reopened.underlying.documents == []
+
+def test_dimension_mismatch_is_rejected(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache"))
+    cache.put_many([("a", [1.0, 2.0])])
+    with pytest.raises(ValueError):
+        cache.put_many([("b", [1.0, 2.0, 3.0])])
+
+def test_batch_embed_queries_uses_cache_and_falls_back_per_query(tmp_path):
+    model = CountingEmbeddings()
+    assert batch_embed_queries(model, ["a", "bb"]) == [[0.0, 0.0, 1.0], [0.0, 0.0, 2.0]]
+    cached = _cached(tmp_path, model)
+    batch_embed_queries(cached, ["a", "ccc"])
+    batch_embed_queries(cached, ["ccc", "a"])
+    assert model.queries == ["a", "bb", "a", "ccc"]
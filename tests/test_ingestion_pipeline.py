@@ -0,0 +1,79 @@
+import threading
+import time
+from langchain_core.documents import Document
+from ingestion_pipeline import UploadPipeline
+
+class MemoryIndex:
+    def __init__(self):
+        self.stored = {}
+
+    def upsert(self, vectors):
+        for v in vectors: self.stored[v["id"]] = v
+
+class FakeEmbeddings:
+    """Her metne [uzunluk, 1] verir; fail_texts içeren batch hata verir, gate kapalıyken bekler."""
+    def __init__(self, fail_texts=()):
+        self.fail_texts = set(fail_texts)
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def embed_documents(self, texts):
+        self.gate.wait()
+        self.batches.append(list(texts))
+        if self.fail_texts & set(texts): raise ConnectionError("503")
+        return [[float(len(t)), 1.0] for t in texts]
+
+def _pipeline(embeddings, index, **kwargs):
+    options = {"batch_size": 2, "max_retries": 0, "embed_rpm": 1e6, "upsert_rpm": 1e6}
+    options.update(kwargs)
+    return UploadPipeline(embeddings, index, **options)
+
+def _doc(text):
+    return Document(page_content=text, metadata={"source": "a.pdf"})
+
+def test_chunks_are_embedded_in_batches_and_written_before_callback():
+    embeddings, index, uploaded, seen = FakeEmbeddings(), MemoryIndex(), [], []
+    pipeline = _pipeline(embeddings, index, on_uploaded=lambda records: uploaded.extend(r["id"] for r in records))
+    for i in range(5): pipeline.add(f"id-{i}", _doc("x" * (i + 1)))
+    pipeline.after_uploads(lambda ok: seen.append((ok, sorted(index.stored))))
+    pipeline.close()
+    assert embeddings.batches == [["x", "xx"], ["xxx", "xxxx"], ["xxxxx"]]
+    # Callback, kendisinden önce eklenen tüm parçalar yazıldıktan sonra çalışır
+    assert seen == [(True, [f"id-{i}" for i in range(5)])]
+    assert index.stored["id-2"]["values"] == [3.0, 1.0]
+    assert index.stored["id-2"]["metadata"] == {"source": "a.pdf", "text": "xxx"}
+    assert sorted(uploaded) == sorted(index.stored) and pipeline.uploaded == 5
+    assert not pipeline.is_alive() and pipeline.throughput() > 0
+
+def test_embedding_failure_marks_only_its_own_file():
+    embeddings, index, seen = FakeEmbeddings(fail_texts={"bozuk"}), MemoryIndex(), []
+    pipeline = _pipeline(embeddings, index)
+    pipeline.add("a-0", _doc("bozuk"))
+    pipeline.add("a-1", _doc("iyi"))
+    pipeline.after_uploads(lambda ok: seen.append(("a", ok)))
+    pipeline.add("b-0", _doc("iyi"))
+    pipeline.after_uploads(lambda ok: seen.append(("b", ok)))
+    pipeline.close()
+    assert seen == [("a", False), ("b", True)]
+    assert pipeline.failed == 2 and list(index.stored) == ["b-0"]
+    assert pipeline.error_messages() == ["Embedding Hatası: 503"]
+
+def test_add_blocks_when_embedding_falls_behind():
+    embeddings, index = FakeEmbeddings(), MemoryIndex()
+    embeddings.gate.clear()
+    pipeline = _pipeline(embeddings, index, batch_size=1, max_pending_batches=1)
+    added = []
+    def producer():
+        for i in range(6):
+            pipeline.add(f"id-{i}", _doc(f"parça {i}"))
+            added.append(i)
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    time.sleep(0.1)
+    # Embed thread'i ilk batch'te bekliyor: sadece sınırlı kuyruk kadar parça kabul edilir
+    assert thread.is_alive() and len(added) < 6
+    embeddings.gate.set()
+    thread.join(3)
+    pipeline.close()
+    assert added == list(range(6)) and len(index.stored) == 6
@@ -0,0 +1,95 @@
+import sqlite3
+import sys
+import types
+import pytest
+import ingest_worker
+import job_queue
+
+@pytest.fixture(autouse=True)
+def job_dirs(tmp_path, monkeypatch):
+    monkeypatch.setenv("JOB_DB_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setenv("JOB_FILES_DIR", str(tmp_path / "jobs"))
+
+def _claim(files=(("a.pdf", b"%PDF-a"), ("b.pdf", b"%PDF-b"))):
+    job_id = job_queue.enqueue_job(list(files), use_vision=True)
+    checkpoint = job_queue.claim_next_job("worker-1")
+    assert checkpoint.job_id == job_id
+    return checkpoint
+
+def test_claim_returns_files_in_order():
+    checkpoint = _claim()
+    assert checkpoint.use_vision
+    assert [(f.name, f.getvalue()) for f in checkpoint.files()] == [("a.pdf", b"%PDF-a"), ("b.pdf", b"%PDF-b")]
+    assert job_queue.claim_next_job("worker-2") is None # Sahipli iş tekrar alınmaz
+
+def test_stale_running_job_is_reclaimed(monkeypatch):
+    checkpoint = _claim()
+    monkeypatch.setattr(job_queue, "STALE_AFTER_SECONDS", -1)
+    assert job_queue.claim_next_job("worker-2").job_id == checkpoint.job_id
+
+def test_page_title_and_chunk_checkpoints():
+    checkpoint = _claim()
+    checkpoint.start_file("a.pdf", 3)
+    checkpoint.save_title("a.pdf", "Staj Yönetmeliği")
+    checkpoint.save_page("a.pdf", 0, "sayfa 1")
+    checkpoint.save_chunks("a.pdf", ["x", "y"])
+    checkpoint.save_chunks("a.pdf", ["y", "z"])
+
+    resumed = job_queue.JobCheckpoint(checkpoint.job_id)
+    assert resumed.saved_title("a.pdf") == "Staj Yönetmeliği"
+    assert resumed.saved_pages("a.pdf") == {0: "sayfa 1"}
+    assert resumed.uploaded_chunks("a.pdf") == {"x", "y", "z"}
+    assert resumed.uploaded_chunks("b.pdf") == set()
+    resumed.clear_chunks("a.pdf")
+    assert resumed.uploaded_chunks("a.pdf") == set()
+
+def test_finish_clears_checkpoints():
+    checkpoint = _claim()
+    checkpoint.save_page("a.pdf", 0, "sayfa 1")
+    checkpoint.save_chunks("a.pdf", ["x"])
+    checkpoint.finish(True, "Tamamlandı")
+    assert checkpoint.saved_pages("a.pdf") == {}
+    assert checkpoint.uploaded_chunks("a.pdf") == set()
+    assert job_queue.list_jobs()[0]["status"] == "done"
+
+def test_retry_requeues_only_failed_files():
+    checkpoint = _claim()
+    checkpoint.mark_file("a.pdf", "done")
+    checkpoint.mark_file("b.pdf", "failed", "Yükleme hatası")
+    checkpoint.finish(False, "1 dosya tamamlanamadı")
+    job_queue.retry_job(checkpoint.job_id)
+    assert checkpoint.file_statuses() == {"a.pdf": "done", "b.pdf": "pending"}
+    assert job_queue.claim_next_job("worker-2").job_id == checkpoint.job_id
+
+def _run_with(monkeypatch, checkpoint, result, statuses):
+    def process_pdfs(files, use_vision_mode, reporter, checkpoint):
+        for name, status in statuses.items(): checkpoint.mark_file(name, status)
+        return result
+    monkeypatch.setitem(sys.modules, "data_ingestion", types.SimpleNamespace(process_pdfs=process_pdfs))
+    ingest_worker.run_job(checkpoint)
+    return job_queue.list_jobs()[0]
+
+def test_run_job_without_chunks_is_not_a_failure(monkeypatch):
+    # Boş / sadece görsel PDF: dosya tamamlanır ama process_pdfs None döner
+    job = _run_with(monkeypatch, _claim(), None, {"a.pdf": "done", "b.pdf": "done"})
+    assert job["status"] == "done"
+
+def test_run_job_fails_when_a_file_is_not_done(monkeypatch):
+    job = _run_with(monkeypatch, _claim(), object(), {"a.pdf": "done", "b.pdf": "failed"})
+    assert job["status"] == "failed"
+    assert "b.pdf" in job["message"]
+
+def test_every_connection_is_closed(monkeypatch):
+    opened = []
+    connect = job_queue._connect
+    def tracking_connect():
+        conn = connect()
+        opened.append(conn)
+        return conn
+    monkeypatch.setattr(job_queue, "_connect", tracking_connect)
+    checkpoint = _claim()
+    checkpoint.save_page("a.pdf", 0, "sayfa 1")
+    job_queue.list_jobs()
+    assert opened
+    for conn in opened:
+        with pytest.raises(sqlite3.ProgrammingError): conn.execute("SELECT 1")
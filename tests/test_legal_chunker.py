@@ -0,0 +1,44 @@
+from langchain_core.documents import Document
+from legal_chunker import LegalChunker
+
+PAGES = [
+    "BİRİNCİ BÖLÜM\nGenel Hükümler\nAmaç\nMADDE 1 – (1) Bu yönetmeliğin amacı stajdır.\n"
+    "Kapsam\nMADDE 2 – (1) Kapsam lisans öğrencileridir ve\n",
+    "devamı ikinci sayfadadır.\nİKİNCİ BÖLÜM\nStaj Esasları\nSüre\nMADDE 3 – (1) Staj 20 gündür.\n"
+    "GEÇİCİ MADDE 1 – (1) Geçiş hükmü.\n",
+]
+
+def _chunk(pages, max_chars=4000):
+    chunker = LegalChunker("Staj Yönetmeliği", max_chars=max_chars)
+    chunks = []
+    for i, text in enumerate(pages):
+        chunks.extend(chunker.feed(Document(page_content=text, metadata={"source": "staj.pdf", "page": i + 1})))
+    return chunks + chunker.finish()
+
+def test_one_chunk_per_article_with_structure_metadata():
+    chunks = _chunk(PAGES)
+    assert [c.metadata["article"] for c in chunks] == ["1", "2", "3", "GEÇİCİ 1"]
+    first = chunks[0]
+    assert first.metadata["article_title"] == "Amaç"
+    assert first.metadata["section"] == "BİRİNCİ BÖLÜM - Genel Hükümler"
+    assert first.metadata["source"] == "staj.pdf"
+    assert chunks[2].metadata["section"] == "İKİNCİ BÖLÜM - Staj Esasları"
+
+def test_article_spanning_pages_is_merged_with_page_range():
+    article = _chunk(PAGES)[1]
+    assert (article.metadata["page"], article.metadata["page_end"]) == (1, 2)
+    assert "öğrencileridir ve\ndevamı ikinci sayfadadır." in article.page_content
+    assert article.page_content.startswith("BELGE: Staj Yönetmeliği\nSAYFA: 1-2\n")
+
+def test_long_article_is_split_by_paragraph():
+    paragraphs = "\n".join(f"({i}) " + "Bu fıkra uzun bir hüküm içerir. " * 8 for i in range(1, 7))
+    chunks = _chunk([f"Süre\nMADDE 7 – {paragraphs}\n"], max_chars=600)
+    assert len(chunks) > 1
+    assert {c.metadata["article"] for c in chunks} == {"7"}
+    assert [c.metadata["part"] for c in chunks] == list(range(1, len(chunks) + 1))
+    assert all(len(c.page_content.split("---\n", 1)[1]) <= 600 for c in chunks)
+
+def test_text_without_articles_is_kept():
+    chunks = _chunk(["EK-1 Başvuru Formu\nAd Soyad:\nÖğrenci No:\n"])
+    assert len(chunks) == 1 and "article" not in chunks[0].metadata
+    assert "Başvuru Formu" in chunks[0].page_content
@@ -0,0 +1,129 @@
+import pytest
+from llm_gateway import CircuitBreaker, CircuitOpenError, LLMGateway
+
+class ServiceError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+class Message:
+    def __init__(self, content):
+        self.content = content
+        self.usage_metadata = {"input_tokens": 3, "output_tokens": 2}
+
+class ScriptedClient:
+    """Sıradaki hatayı fırlatır, hatalar bitince cevap döner."""
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        if self.errors: raise self.errors.pop(0)
+        return Message("cevap")
+
+def _gateway(client, max_retries=3, threshold=5):
+    sleeps = []
+    gateway = LLMGateway(
+        "test", max_retries=max_retries, sleep=sleeps.append,
+        breaker_factory=lambda: CircuitBreaker(failure_threshold=threshold, reset_seconds=10)
+    )
+    gateway.chat_client = lambda model=None, temperature=0.0: client
+    return gateway, sleeps
+
+def test_breaker_closed_open_half_open_closed():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] = 10
+    assert breaker.state == "half-open"
+    assert breaker.allow() and not breaker.allow() # Tek deneme çağrısı geçer
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    now[0] = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+def test_retryable_errors_back_off_and_succeed():
+    client = ScriptedClient(ServiceError(503), ServiceError(429))
+    gateway, sleeps = _gateway(client)
+    assert gateway.invoke("soru", site="answer") == "cevap"
+    assert client.calls == 3 and len(sleeps) == 2
+    stats = gateway.stats()["answer"]
+    assert (stats["calls"], stats["retries"], stats["errors"]) == (1, 2, 0)
+
+def test_non_retryable_error_is_raised_immediately():
+    client = ScriptedClient(ServiceError(400))
+    gateway, sleeps = _gateway(client)
+    with pytest.raises(ServiceError):
+        gateway.invoke("soru", site="answer")
+    assert client.calls == 1 and sleeps == []
+    assert gateway.breaker("answer").state == "closed"
+
+def test_open_circuit_is_per_site():
+    client = ScriptedClient(ServiceError(429), ServiceError(429))
+    gateway, _ = _gateway(client, max_retries=0, threshold=2)
+    for _ in range(2):
+        with pytest.raises(ServiceError):
+            gateway.invoke("sayfa", site="vision")
+    with pytest.raises(CircuitOpenError):
+        gateway.invoke("sayfa", site="vision")
+    assert client.calls == 2
+    # Vision devresi açıkken kullanıcı cevapları etkilenmez
+    assert gateway.invoke("soru", site="answer") == "cevap"
+
+class Chunk:
+    def __init__(self, content, usage=None):
+        self.content = content
+        self.usage_metadata = usage
+
+class StreamingClient:
+    """Her çağrıda sıradaki senaryoyu akıtır; senaryodaki exception o noktada fırlatılır."""
+    def __init__(self, *scripts):
+        self.scripts = list(scripts)
+        self.calls = 0
+
+    def stream(self, prompt):
+        self.calls += 1
+        for item in self.scripts.pop(0):
+            if isinstance(item, Exception): raise item
+            yield item
+
+def _streaming_gateway(client):
+    gateway, sleeps = _gateway(None)
+    gateway.chat_client = lambda model=None, temperature=0.0: client
+    return gateway, sleeps
+
+def test_stream_retries_only_before_first_token():
+    client = StreamingClient(
+        [ServiceError(503)],
+        [Chunk("Mad"), Chunk([{"text": "de "}, "1"]), Chunk("", {"input_tokens": 7, "output_tokens": 3})]
+    )
+    gateway, sleeps = _streaming_gateway(client)
+    assert list(gateway.stream("soru", site="answer")) == ["Mad", "de 1"]
+    assert client.calls == 2 and len(sleeps) == 1
+    stats = gateway.stats()["answer"]
+    assert (stats["calls"], stats["retries"], stats["input_tokens"], stats["output_tokens"]) == (1, 1, 7, 3)
+
+def test_stream_failure_after_first_token_is_not_retried():
+    client = StreamingClient([Chunk("Madde"), ServiceError(503)], [Chunk("tekrar")])
+    gateway, sleeps = _streaming_gateway(client)
+    received = []
+    with pytest.raises(ServiceError):
+        for text in gateway.stream("soru", site="answer"): received.append(text)
+    # Cevap iki kez yazılmasın diye baştan denenmez
+    assert received == ["Madde"] and client.calls == 1 and sleeps == []
+    assert gateway.stats()["answer"]["errors"] == 1
+
+def test_abandoned_stream_is_not_an_error():
+    gateway, _ = _streaming_gateway(StreamingClient([Chunk("a"), Chunk("b")]))
+    stream = gateway.stream("soru", site="answer")
+    assert next(stream) == "a"
+    stream.close()
+    assert gateway.stats()["answer"]["errors"] == 0 and gateway.breaker("answer").state == "closed"
@@ -0,0 +1,61 @@
+import gc
+import numpy as np
+from local_mmr import VectorLRU, get_local_retriever, mmr_select
+from local_vector_store import LocalIndex, LocalVectorStore
+
+class AxisEmbeddings:
+    """Metindeki ilk kelime hangi eksense o eksene yakın birim vektör."""
+    AXES = {"staj": 0, "burs": 1, "sınav": 2}
+
+    def _vector(self, text):
+        vector = np.full(3, 0.05, dtype=np.float32)
+        vector[self.AXES.get(text.split()[0].lower(), 0)] = 1.0
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+def _store(tmp_path):
+    store = LocalVectorStore(LocalIndex(str(tmp_path / "index")), AxisEmbeddings())
+    store.add_texts(
+        ["staj süresi 20 gün", "staj defteri teslimi", "burs başvurusu", "sınav itirazı"],
+        metadatas=[{"source": "a.pdf"}, {"source": "a.pdf"}, {"source": "b.pdf"}, {"source": "c.pdf"}],
+        ids=["s1", "s2", "b1", "e1"]
+    )
+    return store
+
+def test_mmr_prefers_diverse_candidates():
+    query = [1.0, 0.0]
+    candidates = [[1.0, 0.0], [0.99, 0.01], [0.6, 0.8]]
+    assert mmr_select(query, candidates, k=2, lambda_mult=1.0) == [0, 1]
+    assert mmr_select(query, candidates, k=2, lambda_mult=0.3) == [0, 2]
+    assert mmr_select(query, np.zeros((0, 2)), k=3) == []
+
+def test_vector_lru_evicts_oldest():
+    cache = VectorLRU(max_items=2)
+    cache.put_many({"a": 1, "b": 2})
+    cache.get_many(["a"])
+    cache.put_many({"c": 3})
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+
+def test_candidates_are_merged_and_selected_per_query(tmp_path):
+    retriever = get_local_retriever(_store(tmp_path))
+    staj, burs = retriever.select([retriever.candidates("staj kuralları"), retriever.candidates("burs şartları")])
+    assert staj[0].metadata["source"] == "a.pdf" and staj[0].id in {"s1", "s2"}
+    assert burs[0].id == "b1" and burs[0].page_content == "burs başvurusu"
+
+def test_retriever_is_cached_per_store_without_keeping_it_alive(tmp_path):
+    store = _store(tmp_path)
+    retriever = get_local_retriever(store)
+    assert get_local_retriever(store) is retriever
+    other = LocalVectorStore(store._index, store.embeddings)
+    assert get_local_retriever(other) is not retriever
+
+    import local_mmr
+    count = len(local_mmr._retrievers)
+    del store, other
+    gc.collect()
+    assert len(local_mmr._retrievers) == count - 2
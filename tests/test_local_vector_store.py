@@ -0,0 +1,76 @@
+import pytest
+from local_vector_store import LocalIndex, matches_filter
+
+def _index(tmp_path):
+    index = LocalIndex(str(tmp_path / "index"), initial_capacity=4)
+    index.upsert([
+        ("a", [1.0, 0.0, 0.0], {"source": "a.pdf", "page": 1}),
+        ("b", [0.0, 1.0, 0.0], {"source": "b.pdf", "page": 2}),
+        ("c", [0.0, 0.0, 1.0], {"source": "b.pdf", "page": 3}),
+    ])
+    return index
+
+def test_query_returns_nearest_with_metadata(tmp_path):
+    index = _index(tmp_path)
+    matches = index.query([0.9, 0.1, 0.0], top_k=2, include_metadata=True).matches
+    assert [m.id for m in matches] == ["a", "b"]
+    assert matches[0].metadata == {"source": "a.pdf", "page": 1}
+
+def test_query_filter(tmp_path):
+    index = _index(tmp_path)
+    matches = index.query([1.0, 0.0, 0.0], top_k=5, filter={"source": "b.pdf"}).matches
+    assert {m.id for m in matches} == {"b", "c"}
+
+def test_delete_without_arguments_raises(tmp_path):
+    index = _index(tmp_path)
+    with pytest.raises(ValueError):
+        index.delete()
+    with pytest.raises(ValueError):
+        index.delete(ids=[], filter={})
+    assert index.describe_index_stats()["total_vector_count"] == 3
+
+def test_delete_all(tmp_path):
+    index = _index(tmp_path)
+    index.delete(delete_all=True)
+    assert index.describe_index_stats()["total_vector_count"] == 0
+    assert index.query([1.0, 0.0, 0.0]).matches == []
+
+def test_delete_by_ids_and_filter(tmp_path):
+    index = _index(tmp_path)
+    index.delete(ids=["a", "missing"])
+    assert set(index.fetch(["a", "b", "c"]).vectors) == {"b", "c"}
+    index.delete(filter={"page": {"$gte": 3}})
+    assert set(index.fetch(["a", "b", "c"]).vectors) == {"b"}
+
+def test_rows_are_reused_after_delete(tmp_path):
+    index = _index(tmp_path)
+    index.delete(ids=["b"])
+    index.upsert([("d", [1.0, 1.0, 0.0], {"source": "d.pdf"})])
+    assert index.describe_index_stats()["total_vector_count"] == 3
+    assert index.fetch(["d"]).vectors["d"].values == [1.0, 1.0, 0.0]
+
+def test_reopen_persists(tmp_path):
+    _index(tmp_path)
+    reopened = LocalIndex(str(tmp_path / "index"))
+    assert set(reopened.fetch(["a", "b", "c"]).vectors) == {"a", "b", "c"}
+
+def test_two_writers_do_not_overwrite_each_other(tmp_path):
+    # Ayrı bağlantılar = ayrı süreçler: her yazma diğerinin ayırdığı satırları görmeli
+    first = _index(tmp_path)
+    second = LocalIndex(str(tmp_path / "index"))
+    second.fetch(["a"]) # Görünüm yüklendi, sonra eskiyecek
+    first.upsert([("d", [1.0, 1.0, 0.0], {"source": "d.pdf"})])
+    second.upsert([("e", [0.0, 1.0, 1.0], {"source": "e.pdf"})])
+    first.upsert([("f", [1.0, 0.0, 1.0], {"source": "f.pdf"})])
+    ids = ["a", "b", "c", "d", "e", "f"]
+    for index in (first, second, LocalIndex(str(tmp_path / "index"))):
+        vectors = index.fetch(ids).vectors
+        assert set(vectors) == set(ids)
+        assert vectors["e"].values == [0.0, 1.0, 1.0]
+
+def test_matches_filter_operators():
+    metadata = {"source": "a.pdf", "page": 4}
+    assert matches_filter(metadata, None)
+    assert matches_filter(metadata, {"page": {"$in": [3, 4]}, "source": "a.pdf"})
+    assert not matches_filter(metadata, {"$or": [{"page": 1}, {"source": "b.pdf"}]})
+    assert matches_filter(metadata, {"chunk_id": {"$exists": False}})
@@ -0,0 +1,33 @@
+import datetime
+from bench.fakes import InMemorySupabase
+from log_analytics import LOG_TABLE, LogAnalytics
+
+def _ago(days):
+    return (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)).isoformat()
+
+def test_summary_reads_totals_row_and_windows_active_users():
+    db = InMemorySupabase()
+    db.tables["sorgu_toplam"] = [{"id": 1, "soru_sayisi": 1234}]
+    db.tables["sorgu_kullanicilari"] = [
+        {"kullanici_adi": "ayse", "soru_sayisi": 3, "son_soru": _ago(1)},
+        {"kullanici_adi": "mehmet", "soru_sayisi": 9, "son_soru": _ago(10)},
+        {"kullanici_adi": "eski", "soru_sayisi": 1, "son_soru": _ago(90)},
+    ]
+    assert LogAnalytics(db).summary(active_days=30) == {"total_questions": 1234, "active_users": 2, "active_days": 30}
+    assert LogAnalytics(db).summary(active_days=7)["active_users"] == 1
+
+def test_summary_falls_back_to_server_count_without_id_column():
+    class WithoutSummaryTables(InMemorySupabase):
+        def table(self, name):
+            if name != LOG_TABLE: raise RuntimeError(f"relation {name} does not exist")
+            query = super().table(name)
+            select = query.select
+            def strict_select(columns="*", **kwargs):
+                # Orijinal şema "id" sütununu garanti etmez
+                if columns != "*" and "id" in columns.split(","): raise RuntimeError("column sorgu_loglari.id does not exist")
+                return select(columns, **kwargs)
+            query.select = strict_select
+            return query
+    db = WithoutSummaryTables()
+    db.tables[LOG_TABLE] = [{"kullanici_adi": "ayse", "soru": "staj?"}, {"kullanici_adi": "ali", "soru": "burs?"}]
+    assert LogAnalytics(db).summary() == {"total_questions": 2, "active_users": None, "active_days": 30}
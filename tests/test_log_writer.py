@@ -0,0 +1,99 @@
+import json
+import time
+from log_writer import LogWriter
+
+class FakeSupabase:
+    """Sadece table(...).insert(rows).execute(). down=True iken bağlantı hatası verir."""
+    def __init__(self, down=False, without_trace=False):
+        self.down = down
+        self.without_trace = without_trace
+        self.batches = []
+        self.failures = 0
+
+    def table(self, name):
+        return _Insert(self)
+
+class _Insert:
+    def __init__(self, client):
+        self.client = client
+        self.rows = []
+
+    def insert(self, rows):
+        self.rows = rows
+        return self
+
+    def execute(self):
+        if self.client.down:
+            self.client.failures += 1
+            raise ConnectionError("Supabase erişilemiyor")
+        if self.client.without_trace and any("iz" in row for row in self.rows):
+            self.client.failures += 1
+            raise RuntimeError("Could not find the 'iz' column of 'sorgu_loglari' in the schema cache")
+        self.client.batches.append([dict(row) for row in self.rows])
+
+def _wait(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "zaman aşımı"
+        time.sleep(0.01)
+
+def _writer(tmp_path, client, **kwargs):
+    options = {"batch_size": 3, "flush_seconds": 60, "replay_seconds": 60}
+    options.update(kwargs)
+    return LogWriter(client, spool_path=str(tmp_path / "spool.jsonl"), **options)
+
+def test_full_batch_is_written_at_once_and_close_flushes_the_rest(tmp_path):
+    client = FakeSupabase()
+    writer = _writer(tmp_path, client)
+    for i in range(4): writer.write({"soru": f"s{i}"})
+    _wait(lambda: len(client.batches) == 1)
+    assert [row["soru"] for row in client.batches[0]] == ["s0", "s1", "s2"]
+    assert all("created_at" in row for row in client.batches[0])
+    writer.close()
+    assert [row["soru"] for row in client.batches[1]] == ["s3"]
+    assert writer.stats()["written"] == 4
+
+def test_partial_batch_is_flushed_by_timer(tmp_path):
+    client = FakeSupabase()
+    writer = _writer(tmp_path, client, batch_size=100, flush_seconds=0.05)
+    writer.write({"soru": "a"})
+    writer.write({"soru": "b"})
+    _wait(lambda: client.batches)
+    assert [row["soru"] for row in client.batches[0]] == ["a", "b"]
+    writer.close()
+
+def test_outage_spools_records_and_replays_after_recovery(tmp_path):
+    client = FakeSupabase(down=True)
+    writer = _writer(tmp_path, client, batch_size=2, replay_seconds=0.05)
+    writer.write({"soru": "a", "created_at": "2024-01-01T00:00:00+00:00"})
+    writer.write({"soru": "b"})
+    _wait(lambda: writer.stats()["spool_pending"] == 2)
+    with open(tmp_path / "spool.jsonl", encoding="utf-8") as f:
+        assert [json.loads(line)["soru"] for line in f] == ["a", "b"]
+    assert writer.stats()["spooled"] == 2 and client.batches == []
+
+    client.down = False
+    _wait(lambda: writer.stats()["replayed"] == 2)
+    writer.close()
+    assert [row["soru"] for row in client.batches[0]] == ["a", "b"]
+    assert client.batches[0][0]["created_at"] == "2024-01-01T00:00:00+00:00" # Geç yazılan kayıt kendi zamanını korur
+    assert writer.stats()["spool_pending"] == 0 and not (tmp_path / "spool.jsonl").exists()
+
+def test_records_written_after_close_go_to_spool(tmp_path):
+    client = FakeSupabase()
+    writer = _writer(tmp_path, client)
+    writer.close()
+    writer.write({"soru": "geç"})
+    assert writer.stats()["spool_pending"] == 1 and client.batches == []
+
+def test_missing_trace_column_is_learned_once(tmp_path):
+    client = FakeSupabase(without_trace=True)
+    writer = _writer(tmp_path, client, batch_size=1)
+    writer.write({"soru": "a", "iz": "t1"})
+    _wait(lambda: len(client.batches) == 1)
+    writer.write({"soru": "b", "iz": "t2"})
+    _wait(lambda: len(client.batches) == 2)
+    writer.close()
+    assert client.batches == [[{"soru": "a", "created_at": client.batches[0][0]["created_at"]}],
+                              [{"soru": "b", "created_at": client.batches[1][0]["created_at"]}]]
+    assert client.failures == 1 and writer.stats()["spooled"] == 0
@@ -0,0 +1,41 @@
+import json
+from query_expansion import CorpusVocabulary, QueryExpander, TermCollector, fold, stem, tokenize
+
+def test_fold_and_stem_turkish():
+    assert fold("ŞARTLARI Işık İzni") == "sartlari isik izni"
+    assert stem("stajlari") == "staj"
+    assert [s for _, s in tokenize("Stajların koşulları?")] == ["staj", "kosul"]
+
+def test_term_collector_learns_definitions_and_acronyms():
+    collector = TermCollector()
+    collector.add("b) AKTS: Avrupa Kredi Transfer Sistemini,\nYükseköğretim Kurulu (YÖK) kararı")
+    assert ["akts", "avrupa kredi transfer sistemini"] in collector.groups
+    assert ["yök", "yükseköğretim kurulu"] in collector.groups
+    assert {"akts", "kurul", "karar"} <= collector.stems
+
+def _expander(tmp_path, groups=(("staj", "işletmede mesleki eğitim"),)):
+    thesaurus = tmp_path / "thesaurus.json"
+    thesaurus.write_text(json.dumps({"groups": [list(g) for g in groups]}, ensure_ascii=False), encoding="utf-8")
+    vocabulary = CorpusVocabulary(str(tmp_path / "vocabulary.json"))
+    return QueryExpander(str(thesaurus), vocabulary), vocabulary
+
+def test_expand_drops_filler_and_adds_synonyms(tmp_path):
+    expander, _ = _expander(tmp_path)
+    expansion = expander.expand("Hocam lütfen stajlar ne zaman başlıyor acaba?")
+    assert expansion.terms == ["stajlar", "zaman", "başlıyor"]
+    assert expansion.synonyms == ["staj", "işletmede mesleki eğitim"]
+    assert expansion.query == "stajlar zaman başlıyor / staj / işletmede mesleki eğitim"
+
+def test_confidence_follows_corpus_vocabulary(tmp_path):
+    expander, vocabulary = _expander(tmp_path)
+    collector = TermCollector()
+    collector.add("MADDE 5 – Staj başvurusu bölüm başkanlığına yapılır.\na) AKTS: Avrupa Kredi Transfer Sistemi,")
+    vocabulary.update_source("staj.pdf", collector)
+
+    assert expander.expand("staj başvurusu").confidence == 1.0
+    assert expander.expand("yemekhane menüsü").confidence == 0.0
+    # Korpustan öğrenilen tanım eş anlamlı olarak kullanılır
+    assert "avrupa kredi transfer sistemi" in expander.expand("AKTS nedir").synonyms
+
+    vocabulary.remove_source("staj.pdf")
+    assert vocabulary.snapshot()[0] == frozenset()
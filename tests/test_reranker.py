@@ -0,0 +1,72 @@
+import types
+from langchain_core.documents import Document
+import reranker
+from reranker import CrossEncoderReranker, LLMJudgeReranker, RerankPipeline
+
+def _docs(*texts):
+    return [Document(page_content=text, metadata={"source": "a.pdf"}) for text in texts]
+
+class FakeModel:
+    """Her metne sabit logit verir; predict çağrılarını kaydeder."""
+    def __init__(self, logits):
+        self.logits = logits
+        self.calls = []
+
+    def predict(self, pairs, batch_size, show_progress_bar):
+        self.calls.append((len(pairs), batch_size))
+        return [self.logits[text] for _, text in pairs]
+
+def _cross_encoder(logits, **kwargs):
+    ranker = CrossEncoderReranker(**kwargs)
+    ranker._model = FakeModel(logits)
+    return ranker
+
+def _gateway(monkeypatch, reply):
+    prompts = []
+    def invoke(prompt, site, temperature):
+        prompts.append(prompt)
+        if isinstance(reply, Exception): raise reply
+        return reply
+    monkeypatch.setattr(reranker, "get_gateway", lambda: types.SimpleNamespace(invoke=invoke))
+    return prompts
+
+def test_cross_encoder_orders_by_score_in_one_batch_call():
+    ranker = _cross_encoder({"a": -2.0, "b": 3.0, "c": 0.0}, top_n=2, batch_size=8)
+    kept = ranker.rerank("soru", _docs("a", "b", "c"))
+    assert [d.page_content for d in kept] == ["b", "c"]
+    assert ranker._model.calls == [(3, 8)]
+    assert kept[1].metadata["rerank_score"] == 0.5 # Logit 0 -> olasılık 0.5
+
+def test_threshold_keeps_at_least_min_results():
+    ranker = _cross_encoder({"a": 4.0, "b": -3.0, "c": -4.0}, top_n=3, threshold=0.5, min_results=2)
+    assert [d.page_content for d in ranker.rerank("soru", _docs("a", "b", "c"))] == ["a", "b"]
+
+def test_llm_judge_parses_fenced_json_and_drops_bad_indices(monkeypatch):
+    prompts = _gateway(monkeypatch, '```json\n{"selected_indices": [2, 9, 2, "x", 0]}\n```')
+    selected = LLMJudgeReranker().rerank("soru", _docs("a", "b", "c"))
+    assert [d.page_content for d in selected] == ["c", "a"]
+    assert [d.metadata["rerank_score"] for d in selected] == [1.0, 0.5]
+    assert "[ID: 2] (Kaynak: a.pdf) -> c" in prompts[0]
+
+def test_llm_judge_falls_back_to_first_candidates(monkeypatch):
+    _gateway(monkeypatch, ConnectionError("503"))
+    docs = _docs(*"abcdefg")
+    assert LLMJudgeReranker(fallback_n=3).rerank("soru", docs) == docs[:3]
+
+def test_pipeline_uses_judge_when_model_is_missing_or_fails(monkeypatch):
+    _gateway(monkeypatch, '{"selected_indices": [1]}')
+    missing = CrossEncoderReranker()
+    missing._failed = True # Paket/model yok
+    assert [d.page_content for d in RerankPipeline(missing).rerank("soru", _docs("a", "b"))] == ["b"]
+    broken = _cross_encoder({})
+    assert [d.page_content for d in RerankPipeline(broken).rerank("soru", _docs("a", "b"))] == ["b"]
+
+def test_second_pass_reads_only_the_shortlist(monkeypatch):
+    prompts = _gateway(monkeypatch, '{"selected_indices": [1]}')
+    ranker = _cross_encoder({"a": 1.0, "b": 3.0, "c": 2.0}, top_n=3)
+    pipeline = RerankPipeline(ranker, llm_candidates=2)
+    assert [d.page_content for d in pipeline.rerank("soru", _docs("a", "b", "c"), second_pass=True)] == ["c"]
+    assert "[ID: 2]" not in prompts[0]
+    # Hakem cevap vermezse birinci tur sonucu kalır
+    _gateway(monkeypatch, "anlamsız")
+    assert [d.page_content for d in pipeline.rerank("soru", _docs("a", "b", "c"), second_pass=True)] == ["b", "c", "a"]
@@ -0,0 +1,76 @@
+import threading
+import pytest
+from langchain_core.documents import Document
+import generation
+from local_mmr import CandidateSet
+
+def _doc(text, page=1):
+    return Document(page_content=text, metadata={"source": "a.pdf", "page": page})
+
+class FakeStore:
+    """MMR araması sorguya göre sabit belgeler döndürür; ham soru araması başladığında raw_started açılır."""
+    def __init__(self, results):
+        self.results = results
+        self.raw_started = threading.Event()
+        self.expanded = threading.Event()
+        self.searches = []
+        self.article_filters = []
+
+    def max_marginal_relevance_search(self, query, k, fetch_k, lambda_mult):
+        self.searches.append((query, self.expanded.is_set()))
+        if query == "ham soru madde 3": self.raw_started.set()
+        return list(self.results[query])
+
+    def similarity_search(self, query, k, filter):
+        self.article_filters.append(filter)
+        return [_doc("MADDE 3 metni", page=2)]
+
+@pytest.fixture
+def patched(monkeypatch):
+    monkeypatch.setattr(generation, "get_local_retriever", lambda vector_store: None)
+    monkeypatch.setattr(generation, "hybrid_index", lambda: None)
+    monkeypatch.setattr(generation, "filter_visible", lambda docs: docs)
+    return monkeypatch
+
+def _expander(store, query):
+    def optimize(question, gateway):
+        # Ham soru araması başlamadan zenginleştirme bitmez
+        assert store.raw_started.wait(2), "ham arama zenginleştirmeyi bekledi"
+        store.expanded.set()
+        return query
+    return optimize
+
+def test_raw_search_overlaps_query_expansion(patched):
+    store = FakeStore({"ham soru madde 3": [_doc("ortak"), _doc("ham")], "temiz sorgu": [_doc("temiz"), _doc("ortak")]})
+    patched.setattr(generation, "optimize_query", _expander(store, "temiz sorgu"))
+    timings = {}
+    query, docs = generation.retrieve_documents("ham soru madde 3", store, None, timings)
+    assert query == "temiz sorgu"
+    assert store.searches == [("ham soru madde 3", False), ("temiz sorgu", True)]
+    assert store.article_filters == [{"article": {"$in": ["3"]}}]
+    # Madde atfı önce, sonra temiz + ham sonuçlar; tekrarlar bir kez
+    assert [d.page_content for d in docs] == ["MADDE 3 metni", "temiz", "ortak", "ham"]
+    assert {"search_raw", "search_article", "expand", "search_clean", "mmr", "retrieval"} <= set(timings)
+
+def test_unchanged_query_skips_clean_search(patched):
+    store = FakeStore({"ham soru madde 3": [_doc("ham")]})
+    patched.setattr(generation, "optimize_query", _expander(store, "ham soru madde 3"))
+    _, docs = generation.retrieve_documents("ham soru madde 3", store, None, {})
+    assert [q for q, _ in store.searches] == ["ham soru madde 3"]
+    assert [d.page_content for d in docs] == ["MADDE 3 metni", "ham"]
+
+class FakeRetriever:
+    def __init__(self):
+        self.select_calls = []
+
+    def select(self, candidate_sets, k):
+        self.select_calls.append(len(candidate_sets))
+        return [[_doc(f"mmr {s.query_vector}")] for s in candidate_sets]
+
+def test_candidate_sets_share_one_mmr_pass(patched):
+    retriever = FakeRetriever()
+    patched.setattr(generation, "get_local_retriever", lambda vector_store: retriever)
+    stages = [CandidateSet("ham", []), [_doc("pinecone")], CandidateSet("temiz", [])]
+    results = generation.finish_search(object(), stages)
+    assert retriever.select_calls == [2]
+    assert [[d.page_content for d in docs] for docs in results] == [["mmr ham"], ["pinecone"], ["mmr temiz"]]
@@ -0,0 +1,71 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import tracing
+from tracing import TraceRecorder, bind, current_trace, event, record_span, span, start_trace
+
+@pytest.fixture
+def recorder(tmp_path, monkeypatch):
+    recorder = TraceRecorder(str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(tracing, "get_trace_recorder", lambda: recorder)
+    return recorder
+
+def test_spans_and_events_are_recorded_in_current_trace(recorder):
+    with start_trace("answer", question_chars=5) as trace:
+        with span("search", k=3) as attrs:
+            time.sleep(0.01)
+            attrs["count"] = 7
+        with pytest.raises(ValueError):
+            with span("rerank"): raise ValueError("bozuk")
+        record_span("answer", time.perf_counter() - 0.02, tokens=4)
+        event("first_token")
+    assert current_trace() is None
+    spans = {s["name"]: s for s in trace.spans}
+    assert spans["search"]["attrs"] == {"k": 3, "count": 7} and spans["search"]["duration_ms"] >= 10
+    assert spans["rerank"]["attrs"] == {"error": "ValueError"}
+    assert spans["answer"]["duration_ms"] >= 20
+    assert [e["name"] for e in trace.events] == ["first_token"]
+    assert trace.duration_ms is not None
+    [exported] = recorder.recent()
+    assert exported["trace_id"] == trace.trace_id and exported["attrs"] == {"question_chars": 5}
+
+def test_without_trace_nothing_is_recorded():
+    with span("search") as attrs: attrs["count"] = 1
+    record_span("answer", time.perf_counter())
+    event("first_token")
+    assert current_trace() is None
+
+def test_bound_work_in_thread_pool_reports_to_caller_trace(recorder):
+    with start_trace("answer") as trace, ThreadPoolExecutor(2) as pool:
+        def search(name):
+            with span(name): pass
+        pool.submit(bind(search), "search_raw").result()
+        pool.submit(search, "unbound").result() # bind olmadan iz thread'e taşınmaz
+    assert [s["name"] for s in trace.spans] == ["search_raw"]
+
+def test_events_are_capped_per_trace(recorder, monkeypatch):
+    monkeypatch.setattr(tracing, "MAX_EVENTS", 3)
+    with start_trace("ingest") as trace:
+        for i in range(5): event("llm", n=i)
+    assert [e["n"] for e in trace.events] == [0, 1, 2] and trace.dropped_events == 2
+
+def test_recorder_reads_tail_by_kind_and_computes_stage_stats(tmp_path):
+    recorder = TraceRecorder(str(tmp_path / "traces.jsonl"))
+    for i in range(10):
+        kind = "answer" if i % 2 == 0 else "ingest"
+        recorder.record({"kind": kind, "duration_ms": 100.0 * i, "spans": [{"name": "search", "duration_ms": float(i)}]})
+    with open(recorder.path, "a", encoding="utf-8") as f: f.write("{yarım satır\n")
+    answers = recorder.recent(kind="answer")
+    assert [t["duration_ms"] for t in answers] == [0.0, 200.0, 400.0, 600.0, 800.0]
+    assert [t["duration_ms"] for t in recorder.recent(limit=2)] == [800.0, 900.0]
+    stats = recorder.stage_stats(kind="answer")
+    assert stats["search"] == {"count": 5, "p50_ms": 4.0, "p95_ms": 8.0}
+    assert stats["total"]["p95_ms"] == 800.0
+
+def test_recorder_rotates_full_file(tmp_path):
+    recorder = TraceRecorder(str(tmp_path / "traces.jsonl"), max_bytes=50)
+    for i in range(3): recorder.record({"kind": "answer", "n": i, "pad": "x" * 40})
+    assert [t["n"] for t in recorder.recent()] == [2]
+    with open(recorder.path + ".1", encoding="utf-8") as f:
+        assert [json.loads(line)["n"] for line in f] == [1]
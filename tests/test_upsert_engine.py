@@ -0,0 +1,37 @@
+from upsert_engine import UpsertEngine, pack_batches
+
+class SplittingIndex:
+    """max_count'tan büyük istekleri 413 ile reddeder; fail_ids içeren istek kalıcı hata verir."""
+    def __init__(self, max_count, fail_ids=()):
+        self.max_count = max_count
+        self.fail_ids = set(fail_ids)
+        self.stored = {}
+
+    def upsert(self, vectors):
+        if len(vectors) > self.max_count: raise ValueError("413 Request Entity Too Large")
+        if any(v["id"] in self.fail_ids for v in vectors): raise ValueError("invalid metadata")
+        for v in vectors: self.stored[v["id"]] = v
+
+def _records(n):
+    return [{"id": f"id-{i}", "values": [0.0, 1.0], "metadata": {"n": i}} for i in range(n)]
+
+def test_pack_batches_respects_count():
+    assert [len(b) for b in pack_batches(_records(5), max_count=2)] == [2, 2, 1]
+
+def test_oversized_batch_is_split():
+    index = SplittingIndex(max_count=2)
+    engine = UpsertEngine(index, max_retries=0)
+    engine.submit(_records(8))
+    engine.close()
+    assert engine.upserted == 8 and engine.failed == 0
+    assert len(index.stored) == 8
+
+def test_split_halves_are_counted_separately():
+    index = SplittingIndex(max_count=2, fail_ids={"id-0"})
+    engine = UpsertEngine(index, max_retries=0)
+    engine.submit(_records(4))
+    engine.close()
+    assert engine.upserted == 2 and engine.failed == 2
+    assert set(index.stored) == {"id-2", "id-3"}
+    [failed] = engine.failed_batches()
+    assert failed.count == 2 and failed.first_id == "id-0"
@@ -0,0 +1,32 @@
+import itertools
+import types
+import vision_cache
+from vision_cache import VisionCache
+
+def test_key_depends_on_image_prompt_and_model():
+    key = VisionCache.make_key(b"png", "v1", "gemini")
+    assert key == VisionCache.make_key(b"png", "v1", "gemini")
+    assert len({key, VisionCache.make_key(b"jpg", "v1", "gemini"),
+                VisionCache.make_key(b"png", "v2", "gemini"), VisionCache.make_key(b"png", "v1", "pro")}) == 4
+
+def test_hit_miss_and_counters():
+    cache = VisionCache(":memory:")
+    assert cache.get("a") is None
+    cache.put("a", "| tablo |")
+    cache.put("boş", "") # Boş cevap saklanmaz
+    assert cache.get("a") == "| tablo |" and cache.get("boş") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 1)
+    assert stats["hit_rate"] == 1 / 3 and stats["bytes"] == len("| tablo |")
+
+def test_least_recently_used_is_evicted_at_size_limit(monkeypatch):
+    ticks = itertools.count()
+    monkeypatch.setattr(vision_cache, "time", types.SimpleNamespace(time=lambda: next(ticks)))
+    cache = VisionCache(":memory:", max_bytes=10)
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    cache.get("a") # a yeniden kullanıldı, en eski b
+    cache.put("c", "cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa" and cache.get("c") == "cccc"
+    assert cache.stats()["bytes"] <= 10
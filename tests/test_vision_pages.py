@@ -0,0 +1,76 @@
+import threading
+import time
+import fitz
+import pytest
+import data_ingestion
+from vision_cache import VisionCache
+
+class FakeVision:
+    """Görseli sayfasına eşler; ilk sayfalar en geç biter, fail_pages hata verir."""
+    def __init__(self, doc, fail_pages=()):
+        self.pages = {data_ingestion.render_page_image(page): page.number for page in doc}
+        self.fail_pages = set(fail_pages)
+        self.total = len(doc)
+        self.calls = []
+        self.active = self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, image_bytes, prompt=None, max_retries=0, bucket=None):
+        number = self.pages[image_bytes]
+        with self.lock:
+            self.calls.append(number)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.02 * (self.total - number))
+        with self.lock: self.active -= 1
+        if number in self.fail_pages: raise ConnectionError("503")
+        return f"VISION {number + 1}"
+
+def _doc(pages):
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"Sayfa {i + 1}")
+    return doc
+
+@pytest.fixture
+def vision_env(monkeypatch):
+    cache = VisionCache(":memory:")
+    monkeypatch.setattr(data_ingestion, "get_vision_cache", lambda: cache)
+    monkeypatch.setenv("VISION_CONCURRENCY", "2")
+    monkeypatch.setenv("VISION_RPM", "100000")
+    monkeypatch.setenv("VISION_MAX_RETRIES", "0")
+    return cache
+
+def _install(monkeypatch, doc, **kwargs):
+    fake = FakeVision(doc, **kwargs)
+    monkeypatch.setattr(data_ingestion, "transcribe_page_image", fake)
+    return fake
+
+def test_pages_are_yielded_in_order_with_per_page_fallback(vision_env, monkeypatch):
+    doc = _doc(5)
+    fake = _install(monkeypatch, doc, fail_pages={2})
+    progress = []
+    results = list(data_ingestion.process_pages_vision(doc, on_progress=lambda done, total: progress.append((done, total))))
+    assert [i for i, _ in results] == [0, 1, 2, 3, 4]
+    # Başarısız sayfa kendi get_text() çıktısıyla gelir, diğerleri etkilenmez
+    assert results[2][1] == "Sayfa 3"
+    assert [text for i, text in results if i != 2] == ["VISION 1", "VISION 2", "VISION 4", "VISION 5"]
+    assert sorted(fake.calls) == [0, 1, 2, 3, 4] and fake.max_active <= 2
+    assert progress[-1] == (5, 5)
+
+def test_cached_pages_are_not_sent_again(vision_env, monkeypatch):
+    doc = _doc(3)
+    _install(monkeypatch, doc)
+    list(data_ingestion.process_pages_vision(doc, [0, 2]))
+    fake = _install(monkeypatch, doc)
+    results = list(data_ingestion.process_pages_vision(doc))
+    assert results == [(0, "VISION 1"), (1, "VISION 2"), (2, "VISION 3")]
+    assert fake.calls == [1]
+
+def test_iter_page_texts_mixes_vision_saved_and_text_pages(vision_env, monkeypatch):
+    doc = _doc(4)
+    _install(monkeypatch, doc)
+    saved = []
+    texts = list(data_ingestion.iter_page_texts(doc, [1, 3], saved_pages={3: "KAYITLI"}, on_page=lambda i, t: saved.append(i)))
+    assert [text.strip() for _, text in texts] == ["Sayfa 1", "VISION 2", "Sayfa 3", "KAYITLI"]
+    assert saved == [0, 1, 2] # Kayıtlı sayfa tekrar kaydedilmez
@@ -0,0 +1,59 @@
+import fitz
+from data_ingestion import _merge_rects, find_vision_regions, plan_vision_page
+
+FIRST = "MADDE 1 - (1) Ucretler asagidaki tabloya gore odenir ve her yil guncellenir."
+LAST = "MADDE 2 - (1) Bu yonetmelik yayimi tarihinde yururluge girer ve uygulanir."
+
+def _pixmap():
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 20, 20), False)
+    pix.clear_with(200)
+    return pix
+
+def _page(table=False, image=None, text=True):
+    page = fitz.open().new_page()
+    if text: page.insert_text((72, 72), FIRST)
+    if table:
+        xs, ys = [72, 250, 430], [150, 180, 210, 240]
+        for x in xs: page.draw_line((x, ys[0]), (x, ys[-1]))
+        for y in ys: page.draw_line((xs[0], y), (xs[-1], y))
+        for r in range(3):
+            for c in range(2): page.insert_text((xs[c] + 5, ys[r] + 20), f"H{r}{c}")
+    if image: page.insert_image(fitz.Rect(*image), pixmap=_pixmap())
+    if text: page.insert_text((72, 500), LAST)
+    return page
+
+def _kinds(segments):
+    return [(kind, fallback.strip()) for kind, _, fallback in segments]
+
+def test_merge_rects_joins_overlaps_and_sorts_by_reading_order():
+    rects = [fitz.Rect(0, 100, 50, 150), fitz.Rect(40, 140, 90, 190), fitz.Rect(0, 0, 20, 20)]
+    merged = _merge_rects(rects, padding=0)
+    assert merged == [fitz.Rect(0, 0, 20, 20), fitz.Rect(0, 100, 90, 190)]
+    # Kenar payı, birbirine çok yakın bölgeleri de tek kırpıma indirir
+    assert len(_merge_rects([fitz.Rect(0, 0, 10, 10), fitz.Rect(15, 0, 25, 10)], padding=3)) == 1
+
+def test_table_is_cropped_and_surrounding_text_is_read_directly():
+    page = _page(table=True)
+    [region] = find_vision_regions(page)
+    assert region.contains(fitz.Rect(72, 150, 430, 240))
+    segments = plan_vision_page(page)
+    assert _kinds(segments) == [("text", FIRST), ("region", "H00\nH01\nH10\nH11\nH20\nH21"), ("text", LAST)]
+    assert segments[1][1][:2] == b"\xff\xd8" # Kırpılmış JPEG
+
+def test_figure_is_cropped_but_small_logo_is_ignored():
+    page = _page(image=(72, 200, 400, 400))
+    page.insert_image(fitz.Rect(500, 20, 520, 40), pixmap=_pixmap())
+    [region] = find_vision_regions(page)
+    assert region.contains(fitz.Rect(72, 200, 400, 400)) and region.y1 < 500
+    assert [kind for kind, _, _ in plan_vision_page(page)] == ["text", "region", "text"]
+
+def test_whole_page_is_sent_when_cropping_does_not_help(monkeypatch):
+    # Metin katmanı yok (taranmış sayfa)
+    assert [k for k, _, _ in plan_vision_page(_page(image=(0, 0, 595, 842), text=False))] == ["page"]
+    # Metin var ama tablo/şekil yok
+    assert [k for k, _, _ in plan_vision_page(_page())] == ["page"]
+    # Kırpma kapalı
+    assert [k for k, _, _ in plan_vision_page(_page(table=True), crop_regions=False)] == ["page"]
+    # Bölgeler sayfanın çoğunu kaplıyor
+    monkeypatch.setenv("VISION_MAX_CROP_COVERAGE", "0.05")
+    assert [k for k, _, _ in plan_vision_page(_page(table=True))] == ["page"]
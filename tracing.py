@@ -0,0 +1,201 @@
+import collections
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from settings import get_setting
+
+# --- HAFİF İZLEME (TRACING) ---
+# "Yavaş" şikayetinde sürenin nereye gittiğini (zenginleştirme, arama, hakem, cevap...) görmek için.
+#   - Her generate_answer / process_pdfs çağrısı bir iz (trace) açar; aşamalar bu izde span olur
+#     (süre + aday sayısı gibi nitelikler), LLM çağrıları / tekrar denemeler / önbellek isabetleri olay (event) olur.
+#   - Geçerli iz contextvars ile taşınır; thread havuzuna giden işler bind() ile sarılır.
+#   - Biten izler TRACE_EXPORT_PATH'e JSONL olarak eklenir (app ve ingest_worker aynı dosyaya yazar),
+#     admin paneli aşama bazlı p50/p95'i bu dosyanın son kayıtlarından hesaplar.
+#   - Cevap izi ayrıca sorgu_loglari satırına yazılır:
+#       alter table sorgu_loglari add column iz jsonb;
+# Metrikler komut satırından: python tracing.py [answer|ingest]
+
+MAX_EVENTS = 500 # İz başına; Vision ağırlıklı büyük yüklemelerde iz şişmesin
+
+_current = contextvars.ContextVar("trace", default=None)
+
+class Trace:
+    def __init__(self, kind, **attrs):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.kind = kind
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.duration_ms = None
+        self.spans = []
+        self.events = []
+        self.dropped_events = 0
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _offset(self, at=None):
+        return ((time.perf_counter() if at is None else at) - self._t0) * 1000
+
+    def add_span(self, name, started, attrs=None):
+        """started: time.perf_counter() değeri; süre şimdiye kadar ölçülür."""
+        span = {"name": name, "start_ms": round(self._offset(started), 1), "duration_ms": round(self._offset() - self._offset(started), 1)}
+        if attrs: span["attrs"] = attrs
+        with self._lock: self.spans.append(span)
+
+    def event(self, name, **attrs):
+        with self._lock:
+            if len(self.events) >= MAX_EVENTS:
+                self.dropped_events += 1
+                return
+            self.events.append({"name": name, "at_ms": round(self._offset(), 1), **attrs})
+
+    def finish(self):
+        if self.duration_ms is None: self.duration_ms = round(self._offset(), 1)
+        return self.to_dict()
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "trace_id": self.trace_id, "kind": self.kind, "attrs": self.attrs,
+                "started_at": self.started_at, "duration_ms": self.duration_ms,
+                "spans": list(self.spans), "events": list(self.events), "dropped_events": self.dropped_events,
+            }
+
+# --- GEÇERLİ İZ ---
+def current_trace():
+    return _current.get()
+
+@contextlib.contextmanager
+def start_trace(kind, **attrs):
+    """Yeni iz açar; çıkışta izi bitirip dışa aktarır. İzleme kapalıysa da Trace döner (kaydedilmez)."""
+    trace = Trace(kind, **attrs)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        try: _current.reset(token)
+        except ValueError: pass # Akış başka bir bağlamda kapatıldı (ör. terk edilmiş üreteç)
+        trace.finish()
+        recorder = get_trace_recorder()
+        if recorder:
+            try: recorder.record(trace.to_dict())
+            except Exception as e: print(f"İz Yazma Hatası: {e}")
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """Geçerli izde span; blok içinde dönen sözlüğe nitelik eklenebilir. İz yoksa kayıt yapılmaz."""
+    trace = _current.get()
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except Exception as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        if trace is not None: trace.add_span(name, started, attrs)
+
+def record_span(name, started, **attrs):
+    """Blok olarak sarılamayan aşamalar için (ör. üreteç içindeki akış): started = time.perf_counter()."""
+    trace = _current.get()
+    if trace is not None: trace.add_span(name, started, attrs)
+
+def event(name, **attrs):
+    trace = _current.get()
+    if trace is not None: trace.event(name, **attrs)
+
+def bind(fn):
+    """fn'i geçerli bağlamla (iz dahil) çalışacak şekilde sarar; thread havuzuna gönderilen işler için."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+# --- DIŞA AKTARMA (JSONL) ---
+def percentile(values, p):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+class TraceRecorder:
+    def __init__(self, path, max_bytes=20 * 1024 * 1024):
+        folder = os.path.dirname(path)
+        if folder: os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+
+    def record(self, trace):
+        line = json.dumps(trace, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            try:
+                if os.path.getsize(self.path) > self.max_bytes: os.replace(self.path, self.path + ".1")
+            except OSError: pass
+            # Tek write çağrısı: O_APPEND ile diğer süreçlerin satırlarıyla karışmaz
+            with open(self.path, "a", encoding="utf-8") as f: f.write(line)
+
+    def recent(self, limit=500, kind=None):
+        """Dosyanın sonundan en fazla limit iz (yeniden eskiye değil, dosya sırasıyla)."""
+        try: f = open(self.path, "rb")
+        except FileNotFoundError: return []
+        traces = []
+        with f:
+            f.seek(0, os.SEEK_END)
+            position, buffer = f.tell(), b""
+            while position > 0 and len(traces) < limit:
+                size = min(64 * 1024, position)
+                position -= size
+                f.seek(position)
+                buffer = f.read(size) + buffer
+                lines = buffer.split(b"\n")
+                buffer = lines.pop(0) if position > 0 else b"" # Yarım kalmış ilk satır sonraki okumaya
+                for line in reversed(lines):
+                    if len(traces) >= limit: break
+                    trace = self._parse(line, kind)
+                    if trace: traces.append(trace)
+        return traces[::-1]
+
+    @staticmethod
+    def _parse(line, kind):
+        if not line.strip(): return None
+        try: trace = json.loads(line)
+        except ValueError: return None
+        if kind and trace.get("kind") != kind: return None
+        return trace
+
+    def stage_stats(self, kind=None, limit=500):
+        """Aşama -> {"count", "p50_ms", "p95_ms"}; "total" izin toplam süresidir."""
+        durations = collections.defaultdict(list)
+        for trace in self.recent(limit, kind):
+            for s in trace.get("spans", []): durations[s["name"]].append(s["duration_ms"])
+            if trace.get("duration_ms") is not None: durations["total"].append(trace["duration_ms"])
+        return {
+            name: {"count": len(values), "p50_ms": percentile(values, 0.50), "p95_ms": percentile(values, 0.95)}
+            for name, values in durations.items()
+        }
+
+# --- SÜREÇ GENELİ ÖRNEK ---
+_recorder = None
+_recorder_lock = threading.Lock()
+
+def get_trace_recorder():
+    """TRACING=false ise None (izler yine sonuca eklenir, dosyaya yazılmaz)."""
+    global _recorder
+    if not get_setting("TRACING", True, bool): return None
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = TraceRecorder(
+                get_setting("TRACE_EXPORT_PATH", os.path.join(".cache", "traces.jsonl")),
+                max_bytes=get_setting("TRACE_EXPORT_MAX_MB", 20, float) * 1024 * 1024
+            )
+        return _recorder
+
+def stage_stats(kind=None, limit=None):
+    """Admin paneli için: izleme kapalıysa boş sözlük."""
+    recorder = get_trace_recorder()
+    if recorder is None: return {}
+    return recorder.stage_stats(kind, limit or get_setting("TRACE_STATS_WINDOW", 500, int))
+
+if __name__ == "__main__":
+    import sys
+    print(json.dumps(stage_stats(sys.argv[1] if len(sys.argv) > 1 else None), ensure_ascii=False, indent=2))
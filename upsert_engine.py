@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from rate_limit import TokenBucket, call_with_retry
+
+# --- ADAPTİF, EŞZAMANLI UPSERT MOTORU ---
+# Sabit "20'lik batch + sleep(0.5)" yerine:
+# - Batch boyutu, istek gövdesinin tahmini boyutuna göre belirlenir (Pinecone ~2MB sınırı).
+# - Batch'ler eşzamanlı isteklerle gönderilir, hız limiti token-bucket ile uygulanır.
+# - 429 / 5xx hatalarında üstel bekleme + jitter ile tekrar denenir.
+# - Bir batch'in hatası sadece o batch'i etkiler, sonuçlar batch bazında raporlanır.
+
+MAX_REQUEST_BYTES = 1_500_000   # Pinecone sınırı 2MB, güvenlik payı bırakıldı
+MAX_BATCH_COUNT = 200
+
+def estimate_record_bytes(record):
+    """JSON gövdesindeki yaklaşık boyut: float başına ~20 karakter + metadata."""
+    metadata = json.dumps(record.get("metadata", {}), ensure_ascii=False)
+    return len(record["id"]) + len(record["values"]) * 20 + len(metadata.encode("utf-8")) + 64
+
+def pack_batches(records, max_bytes=MAX_REQUEST_BYTES, max_count=MAX_BATCH_COUNT):
+    """Kayıtları, boyut ve adet sınırını aşmayacak batch'lere böler."""
+    batch, batch_bytes = [], 0
+    for record in records:
+        size = estimate_record_bytes(record)
+        if batch and (batch_bytes + size > max_bytes or len(batch) >= max_count):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(record)
+        batch_bytes += size
+    if batch: yield batch
+
+def _is_too_large(error):
+    message = str(error).lower()
+    return "413" in message or "too large" in message or "exceeds" in message
+
+class BatchResult:
+    def __init__(self, count, ok, error=None, first_id=None):
+        self.count = count
+        self.ok = ok
+        self.error = error
+        self.first_id = first_id
+
+class UpsertEngine:
+    """
+    index.upsert çağrılarını eşzamanlı yürütür.
+    submit() eşzamanlılık sınırının iki katı kadar bekleyen batch'e izin verir, sonra bekler.
+    drain() o ana kadar gönderilen tüm batch'lerin bitmesini bekler.
+    on_written(records): her başarılı yazımdan sonra upsert thread'inde çağrılır (ilerleme kaydı için).
+    """
+    def __init__(self, index, concurrency=4, requests_per_minute=1200, max_retries=5,
+                 max_batch_bytes=MAX_REQUEST_BYTES, max_batch_count=MAX_BATCH_COUNT, on_written=None):
+        self.index = index
+        self.on_written = on_written
+        self.max_retries = max_retries
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_count = max_batch_count
+        self.bucket = TokenBucket.per_minute(requests_per_minute, burst=concurrency)
+
+        self.upserted = 0
+        self.failed = 0
+        self.results = []
+        self.started_at = None
+        self.finished_at = None
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(concurrency * 2)
+        self._futures = []
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="upsert")
+
+    def submit(self, records):
+        if self.started_at is None: self.started_at = time.monotonic()
+        for batch in pack_batches(records, self.max_batch_bytes, self.max_batch_count):
+            self._slots.acquire()
+            future = self._pool.submit(self._run, batch)
+            future.add_done_callback(lambda _: self._slots.release())
+            self._futures.append(future)
+
+    def drain(self):
+        futures, self._futures = self._futures, []
+        if futures: wait(futures)
+        self.finished_at = time.monotonic()
+
+    def close(self):
+        self.drain()
+        self._pool.shutdown(wait=True)
+
+    def _run(self, batch):
+        written, failures = self._upsert(batch)
+        results = []
+        if written: results.append(BatchResult(len(written), True, first_id=written[0]["id"]))
+        for records, error in failures:
+            print(f"Pinecone Batch Hatası ({len(records)} parça, ilk ID {records[0]['id']}): {error}")
+            results.append(BatchResult(len(records), False, error=str(error), first_id=records[0]["id"]))
+        with self._lock:
+            self.upserted += len(written)
+            self.failed += sum(len(records) for records, _ in failures)
+            self.results.extend(results)
+        if written and self.on_written:
+            try: self.on_written(written)
+            except Exception as e: print(f"Yükleme İlerleme Kaydı Hatası: {e}")
+        return results
+
+    def _upsert(self, batch):
+        """
+        (yazılan kayıtlar, [(yazılamayan kayıtlar, hata)]) döndürür.
+        Bölünen batch'te her yarının sonucu ayrı sayılır: bir yarının hatası diğerini başarısız yapmaz.
+        """
+        try:
+            call_with_retry(lambda: self.index.upsert(vectors=batch), self.max_retries, self.bucket)
+            return batch, []
+        except Exception as e:
+            # İstek gövdesi tahminden büyük çıktıysa batch'i ikiye bölüp tekrar dene
+            if len(batch) > 1 and _is_too_large(e):
+                half = len(batch) // 2
+                left_written, left_failures = self._upsert(batch[:half])
+                right_written, right_failures = self._upsert(batch[half:])
+                return left_written + right_written, left_failures + right_failures
+            return [], [(batch, e)]
+
+    def failed_batches(self):
+        with self._lock: return [r for r in self.results if not r.ok]
+
+    def throughput(self):
+        """Parça/saniye (ilk submit'ten son drain'e kadar)."""
+        if self.started_at is None: return 0.0
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return self.upserted / elapsed if elapsed > 0 else 0.0
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from settings import get_setting
+
+# --- VISION SAYFA ÖNBELLEĞİ ---
+# Anahtar: render edilmiş sayfa görüntüsünün hash'i + prompt sürümü + model adı.
+# Değer: Gemini'nin döndürdüğü Markdown metni.
+# Aynı PDF tekrar işlendiğinde (hata sonrası, chunking değişikliği, yeniden indeksleme)
+# sadece yerel render maliyeti ödenir.
+class VisionCache:
+    """
+    SQLite tabanlı, boyutu sınırlı (LRU) Vision önbelleği. Thread-safe.
+    path=":memory:" ile ağ/disk olmadan testlerde kullanılabilir.
+    """
+    def __init__(self, path, max_bytes=200 * 1024 * 1024):
+        if path != ":memory:":
+            folder = os.path.dirname(path)
+            if folder: os.makedirs(folder, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS vision_cache (
+                key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_vision_last_access ON vision_cache(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(image_bytes, prompt_version, model_name):
+        h = hashlib.sha256(image_bytes)
+        h.update(f"|{prompt_version}|{model_name}".encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM vision_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE vision_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key, text):
+        if not text: return
+        size = len(text.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO vision_cache (key, text, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, text, size, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Toplam boyut sınırı aşıldıysa en eski erişilenleri siler (LRU)."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM vision_cache").fetchone()[0]
+        if total <= self.max_bytes: return
+        rows = self._conn.execute("SELECT key, size FROM vision_cache ORDER BY last_access ASC").fetchall()
+        to_delete = []
+        for key, size in rows:
+            if total <= self.max_bytes: break
+            to_delete.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM vision_cache WHERE key = ?", to_delete)
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM vision_cache"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": total,
+        }
+
+# --- SÜREÇ GENELİ ÖRNEK ---
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_vision_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = VisionCache(
+                get_setting("VISION_CACHE_PATH", os.path.join(".cache", "vision_cache.sqlite3")),
+                max_bytes=get_setting("VISION_CACHE_MAX_MB", 200, float) * 1024 * 1024
+            )
+        return _cache